@@ -6,24 +6,54 @@ from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 
 from .const import (
+    CONF_BUFFER_MEMORY_MB,
+    CONF_DB_CACHE_MB,
+    CONF_DB_MMAP_MB,
+    CONF_DB_SYNCHRONOUS,
+    CONF_EXPORT_MEMORY_MB,
     CONF_EXPORT_PATH,
     CONF_GLOBAL_INTERVAL,
+    CONF_RECORDER_DB_PATH,
+    DATA_ARCHIVE,
+    DATA_AUTO_ADD,
     DATA_DB,
     DATA_ENTITY_MANAGER,
     DATA_EXPORT_ENGINE,
+    DATA_EXPORT_QUEUE,
+    DATA_INGEST_STATS,
+    DATA_MAINTENANCE,
+    DATA_PARTIALS,
     DATA_PROFILE_MANAGER,
+    DATA_RECORDER_IMPORT,
+    DATA_SAMPLE_BUFFER,
     DATA_SCHEDULER,
+    DATA_STREAM_VIEW,
+    DEFAULT_BUFFER_MEMORY_MB,
+    DEFAULT_DB_CACHE_MB,
+    DEFAULT_DB_MMAP_MB,
+    DEFAULT_DB_SYNCHRONOUS,
+    DEFAULT_EXPORT_MEMORY_MB,
     DEFAULT_EXPORT_PATH,
     DEFAULT_GLOBAL_INTERVAL,
+    DEFAULT_RECORDER_DB_PATH,
     DOMAIN,
 )
+from .archive_tier import ArchiveTier
+from .auto_add import AutoAddEngine
 from .database import Database
 from .entity_manager import EntityManager
-from .export_engine import ExportEngine
+from .export_loader import ExportEngineLoader
+from .export_queue import ExportQueue
+from .ingest_stats import IngestStats
+from .maintenance import DatabaseMaintenance
 from .manual_export import ManualExportEngine
+from .partial_store import PartialResultStore
 from .predefined_export import PredefinedExportEngine
 from .profile_manager import ProfileManager
+from .recorder_import import RecorderImporter
+from .sample_buffer import SampleBuffer
 from .scheduler import Scheduler
+from .stream_view import HistoryStreamView
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -40,27 +70,87 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         CONF_EXPORT_PATH,
         entry.data.get(CONF_EXPORT_PATH, DEFAULT_EXPORT_PATH),
     )
+    buffer_memory_mb = entry.options.get(CONF_BUFFER_MEMORY_MB, DEFAULT_BUFFER_MEMORY_MB)
 
-    db = Database(hass)
+    db = Database(
+        hass,
+        synchronous=entry.options.get(CONF_DB_SYNCHRONOUS, DEFAULT_DB_SYNCHRONOUS),
+        cache_mb=entry.options.get(CONF_DB_CACHE_MB, DEFAULT_DB_CACHE_MB),
+        mmap_mb=entry.options.get(CONF_DB_MMAP_MB, DEFAULT_DB_MMAP_MB),
+    )
     await db.async_initialize()
-
-    entity_manager = EntityManager(hass, db)
+    maintenance = DatabaseMaintenance(hass, db)
+    stats = IngestStats(hass, db)
+    await stats.async_load()
+    db.add_restore_listener(stats.async_invalidate)
+
+    sample_buffer = None
+    if buffer_memory_mb > 0:
+        sample_buffer = SampleBuffer(buffer_memory_mb * 1024 * 1024)
+        db.add_restore_listener(sample_buffer.clear)
+
+    entity_manager = EntityManager(hass, db, sample_buffer, stats)
+    await entity_manager.async_load()
+    db.add_restore_listener(entity_manager.async_invalidate)
     profile_manager = ProfileManager(hass, db)
-    export_engine = ExportEngine(hass, db, export_path)
+    await profile_manager.async_load()
+    auto_add = AutoAddEngine(hass, profile_manager)
+    archive = ArchiveTier(hass, db, stats)
+    db.add_restore_listener(archive.async_invalidate)
+    partials = PartialResultStore(hass)
+    db.add_restore_listener(partials.async_clear)
+    export_engine = ExportEngineLoader(
+        hass,
+        db,
+        export_path,
+        archive,
+        sample_buffer,
+        partials,
+        entry.options.get(CONF_EXPORT_MEMORY_MB, DEFAULT_EXPORT_MEMORY_MB),
+    )
+    export_queue = ExportQueue(hass, db, export_engine)
+    recorder_import = RecorderImporter(
+        hass,
+        db,
+        partials,
+        archive,
+        entry.options.get(CONF_RECORDER_DB_PATH, DEFAULT_RECORDER_DB_PATH),
+        stats,
+    )
     scheduler = Scheduler(hass, db, entity_manager, global_interval)
 
     manual_export = ManualExportEngine(hass, db, profile_manager, export_engine)
     predefined_export = PredefinedExportEngine(hass, db, profile_manager, export_engine)
 
     hass.data[DOMAIN][DATA_DB] = db
+    hass.data[DOMAIN][DATA_MAINTENANCE] = maintenance
+    hass.data[DOMAIN][DATA_INGEST_STATS] = stats
     hass.data[DOMAIN][DATA_ENTITY_MANAGER] = entity_manager
     hass.data[DOMAIN][DATA_PROFILE_MANAGER] = profile_manager
+    hass.data[DOMAIN][DATA_AUTO_ADD] = auto_add
     hass.data[DOMAIN][DATA_EXPORT_ENGINE] = export_engine
+    hass.data[DOMAIN][DATA_EXPORT_QUEUE] = export_queue
+    hass.data[DOMAIN][DATA_RECORDER_IMPORT] = recorder_import
+    hass.data[DOMAIN][DATA_ARCHIVE] = archive
+    hass.data[DOMAIN][DATA_SAMPLE_BUFFER] = sample_buffer
+    hass.data[DOMAIN][DATA_PARTIALS] = partials
     hass.data[DOMAIN][DATA_SCHEDULER] = scheduler
     hass.data[DOMAIN]["manual_export"] = manual_export
     hass.data[DOMAIN]["predefined_export"] = predefined_export
 
+    await stats.async_start()
+    await entity_manager.async_start()
+    await auto_add.async_start()
     await scheduler.async_start()
+    db.async_start_migrations()
+    await archive.async_start()
+    await partials.async_start()
+    await export_queue.async_start()
+    await maintenance.async_start()
+
+    if not hass.data.get(DATA_STREAM_VIEW):
+        hass.http.register_view(HistoryStreamView(hass))
+        hass.data[DATA_STREAM_VIEW] = True
 
     entry.async_on_unload(entry.add_update_listener(async_update_options))
 
@@ -72,6 +162,27 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     scheduler: Scheduler = hass.data[DOMAIN][DATA_SCHEDULER]
     await scheduler.async_stop()
 
+    auto_add: AutoAddEngine = hass.data[DOMAIN][DATA_AUTO_ADD]
+    await auto_add.async_stop()
+
+    entity_manager: EntityManager = hass.data[DOMAIN][DATA_ENTITY_MANAGER]
+    await entity_manager.async_stop()
+
+    archive: ArchiveTier = hass.data[DOMAIN][DATA_ARCHIVE]
+    await archive.async_stop()
+
+    partials: PartialResultStore = hass.data[DOMAIN][DATA_PARTIALS]
+    await partials.async_stop()
+
+    export_queue: ExportQueue = hass.data[DOMAIN][DATA_EXPORT_QUEUE]
+    await export_queue.async_stop()
+
+    maintenance: DatabaseMaintenance = hass.data[DOMAIN][DATA_MAINTENANCE]
+    await maintenance.async_stop()
+
+    stats: IngestStats = hass.data[DOMAIN][DATA_INGEST_STATS]
+    await stats.async_stop()
+
     db: Database = hass.data[DOMAIN][DATA_DB]
     await db.async_close()
 
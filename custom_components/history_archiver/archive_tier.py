@@ -0,0 +1,325 @@
+from __future__ import annotations
+
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import (
+    ARCHIVE_COMPRESSION,
+    ARCHIVE_FOLDER,
+    ARCHIVE_INTERVAL,
+    ARCHIVE_ROW_GROUP_SIZE,
+    DOMAIN,
+)
+from .database import Database
+from .downsampling import parse_iso_us
+from .ingest_stats import SAMPLE_VALUE_BYTES, IngestStats, row_bytes
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+_LOGGER = logging.getLogger(__name__)
+
+
+# pyarrow is only imported in the executor, when files are written or read
+@lru_cache(maxsize=None)
+def _archive_schema() -> pa.Schema:
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            ("ts", pa.timestamp("us", tz="UTC")),
+            ("value", pa.float64()),
+        ]
+    )
+
+
+@lru_cache(maxsize=None)
+def _partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    return ds.partitioning(
+        pa.schema(
+            [
+                ("entity_id", pa.string()),
+                ("year", pa.int16()),
+                ("month", pa.int8()),
+            ]
+        ),
+        flavor="hive",
+    )
+
+
+def _to_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _naive_utc(value: datetime) -> datetime:
+    return _to_utc(value).replace(tzinfo=None)
+
+
+def _month_bounds(year: int, month: int) -> tuple[str, str]:
+    start = f"{year:04d}-{month:02d}-01"
+    if month == 12:
+        end = f"{year + 1:04d}-01-01"
+    else:
+        end = f"{year:04d}-{month + 1:02d}-01"
+    return start, end
+
+
+class ArchiveTier:
+    """Moves closed months of samples into a hive-partitioned Parquet dataset.
+
+    Layout: ``archive/entity_id=<id>/year=<yyyy>/month=<m>/part-<n>.parquet``.
+    Only files recorded in ``archive_files`` are ever read, so a crash between
+    writing a file and committing the move leaves no duplicate data behind.
+    Non-numeric states (``state_coded_samples``, one small code per row) are
+    not tiered and stay in SQLite.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, db: Database, stats: IngestStats | None = None
+    ) -> None:
+        self._hass = hass
+        self._db = db
+        self._stats = stats
+        self._root = hass.config.path(DOMAIN, ARCHIVE_FOLDER)
+        # entity_id -> [(min_ts, max_ts, path)]
+        self._files: dict[str, list[tuple[datetime, datetime, str]]] = {}
+        self._unsub = None
+        self._running = False
+
+    @property
+    def root(self) -> str:
+        return self._root
+
+    async def async_start(self) -> None:
+        await self._async_load_index()
+        await self._hass.async_add_executor_job(self._prepare_root)
+        self._unsub = async_track_time_interval(
+            self._hass, self._async_scheduled_run, timedelta(seconds=ARCHIVE_INTERVAL)
+        )
+        self._hass.async_create_background_task(
+            self.async_run_tiering(), f"{DOMAIN}_archive_tiering"
+        )
+
+    async def async_stop(self) -> None:
+        if self._unsub:
+            self._unsub()
+            self._unsub = None
+
+    @callback
+    def async_invalidate(self) -> None:
+        """Reload the file index of a restored database."""
+        self._hass.async_create_task(self._async_load_index())
+
+    async def _async_load_index(self) -> None:
+        rows = await self._db.async_fetchall(
+            "SELECT entity_id, min_ts, max_ts, path FROM archive_files ORDER BY min_ts"
+        )
+        self._files = {}
+        for entity_id, min_ts, max_ts, path in rows:
+            self._files.setdefault(entity_id, []).append(
+                (datetime.fromisoformat(min_ts), datetime.fromisoformat(max_ts), path)
+            )
+
+    def _prepare_root(self) -> None:
+        """Create the archive folder and drop files a crash left unrecorded."""
+        os.makedirs(self._root, exist_ok=True)
+        known = {
+            os.path.join(self._root, path)
+            for files in self._files.values()
+            for _, _, path in files
+        }
+        for dirpath, _, filenames in os.walk(self._root):
+            for filename in filenames:
+                full = os.path.join(dirpath, filename)
+                if filename.endswith(".parquet") and full not in known:
+                    _LOGGER.warning("Removing unrecorded archive file %s", full)
+                    os.remove(full)
+
+    async def _async_scheduled_run(self, now: datetime) -> None:
+        await self.async_run_tiering()
+
+    async def async_run_tiering(self) -> int:
+        """Archive every closed month still held in SQLite; return rows moved."""
+        if self._running:
+            return 0
+        if self._db.migrations_pending:
+            _LOGGER.debug("Skipping archive tiering while a migration is copying samples")
+            return 0
+
+        self._running = True
+        moved = 0
+        try:
+            now = datetime.utcnow()
+            cutoff = f"{now.year:04d}-{now.month:02d}-01"
+            # One primary key seek per entity instead of a scan of old rows
+            for (entity_id,) in await self._db.async_fetchall(
+                "SELECT entity_id FROM entities"
+            ):
+                while True:
+                    (oldest,) = await self._db.async_fetchone(
+                        "SELECT MIN(ts) FROM state_samples WHERE entity_id = ?",
+                        (entity_id,),
+                    )
+                    if oldest is None or oldest >= cutoff:
+                        break
+                    archived = await self._async_archive_month(
+                        entity_id, int(oldest[:4]), int(oldest[5:7])
+                    )
+                    if not archived:
+                        break
+                    moved += archived
+        finally:
+            self._running = False
+
+        if moved:
+            _LOGGER.info("Archived %s samples to Parquet", moved)
+        return moved
+
+    async def _async_archive_month(self, entity_id: str, year: int, month: int) -> int:
+        lower, upper = _month_bounds(year, month)
+        rows = await self._db.async_fetchall(
+            """
+            SELECT ts, value FROM state_samples
+            WHERE entity_id = ? AND ts >= ? AND ts < ?
+            ORDER BY ts
+            """,
+            (entity_id, lower, upper),
+        )
+        if not rows:
+            return 0
+
+        partition = os.path.join(
+            f"entity_id={entity_id}", f"year={year}", f"month={month}"
+        )
+        existing = sum(
+            1
+            for _, _, path in self._files.get(entity_id, ())
+            if path.startswith(partition + os.sep)
+        )
+        rel_path = os.path.join(partition, f"part-{existing}.parquet")
+
+        await self._hass.async_add_executor_job(self._write_file, rel_path, rows)
+
+        min_ts = rows[0][0]
+        max_ts = rows[-1][0]
+        await self._db.async_execute_batch(
+            [
+                (
+                    # The span just read, not the whole month: a recorder
+                    # backfill may have added older rows since
+                    """
+                    DELETE FROM state_samples
+                    WHERE entity_id = ? AND ts >= ? AND ts <= ?
+                    """,
+                    (entity_id, min_ts, max_ts),
+                ),
+                (
+                    """
+                    INSERT INTO archive_files (
+                        path, entity_id, year, month, row_count,
+                        min_ts, max_ts, archived_at
+                    )
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        rel_path,
+                        entity_id,
+                        year,
+                        month,
+                        len(rows),
+                        min_ts,
+                        max_ts,
+                        datetime.utcnow().isoformat(),
+                    ),
+                ),
+            ]
+        )
+        self._files.setdefault(entity_id, []).append(
+            (datetime.fromisoformat(min_ts), datetime.fromisoformat(max_ts), rel_path)
+        )
+        if self._stats is not None:
+            self._stats.record_archived(
+                entity_id,
+                len(rows),
+                sum(row_bytes(entity_id, ts, SAMPLE_VALUE_BYTES) for ts, _ in rows),
+            )
+        return len(rows)
+
+    def _write_file(self, rel_path: str, rows: list[tuple[str, float]]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        path = os.path.join(self._root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        schema = _archive_schema()
+        table = pa.table(
+            {
+                "ts": pa.array(
+                    parse_iso_us([ts for ts, _ in rows]), type=pa.int64()
+                ).cast(schema.field("ts").type),
+                "value": pa.array([value for _, value in rows], type=pa.float64()),
+            },
+            schema=schema,
+        )
+        pq.write_table(
+            table,
+            path,
+            compression=ARCHIVE_COMPRESSION,
+            row_group_size=ARCHIVE_ROW_GROUP_SIZE,
+            write_statistics=True,
+        )
+
+    def has_data(self, entity_id: str, start_ts: datetime, end_ts: datetime) -> bool:
+        return bool(self._files_for(entity_id, start_ts, end_ts))
+
+    def _files_for(self, entity_id: str, start_ts: datetime, end_ts: datetime) -> list[str]:
+        start = _naive_utc(start_ts)
+        end = _naive_utc(end_ts)
+        return [
+            os.path.join(self._root, path)
+            for min_ts, max_ts, path in self._files.get(entity_id, ())
+            if min_ts <= end and max_ts >= start
+        ]
+
+    def read_table(
+        self,
+        entity_id: str,
+        start_ts: datetime,
+        end_ts: datetime,
+        columns: list[str] | None = None,
+    ) -> pa.Table | None:
+        """Read archived samples with column and predicate pushdown.
+
+        Runs in the executor. Returns None when no archive file overlaps.
+        """
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        paths = self._files_for(entity_id, start_ts, end_ts)
+        if not paths:
+            return None
+        dataset = ds.dataset(
+            paths,
+            format="parquet",
+            partitioning=_partitioning(),
+            partition_base_dir=self._root,
+        )
+        ts_type = _archive_schema().field("ts").type
+        predicate = (
+            (ds.field("entity_id") == entity_id)
+            & (ds.field("ts") >= pa.scalar(_to_utc(start_ts), type=ts_type))
+            & (ds.field("ts") <= pa.scalar(_to_utc(end_ts), type=ts_type))
+        )
+        table = dataset.to_table(columns=columns or ["ts", "value"], filter=predicate)
+        return table.sort_by("ts")
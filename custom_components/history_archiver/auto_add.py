@@ -0,0 +1,260 @@
+import fnmatch
+import logging
+import re
+from typing import Any
+
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers.area_registry import async_get as async_get_area_registry
+from homeassistant.helpers.device_registry import (
+    EVENT_DEVICE_REGISTRY_UPDATED,
+    async_get as async_get_device_registry,
+)
+from homeassistant.helpers.entity_registry import (
+    EVENT_ENTITY_REGISTRY_UPDATED,
+    async_entries_for_device,
+    async_get as async_get_entity_registry,
+)
+from homeassistant.helpers.event import async_call_later
+
+from .const import (
+    AUTO_ADD_DEBOUNCE_SECONDS,
+    RULE_AREA,
+    RULE_DEVICE_CLASS,
+    RULE_DOMAIN,
+    RULE_ENTITY_GLOB,
+    RULE_ENTITY_REGEX,
+    RULE_INTEGRATION,
+)
+from .profile_manager import ProfileManager
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _as_set(value: Any) -> frozenset[str] | None:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return frozenset([value.lower()])
+    return frozenset(str(v).lower() for v in value)
+
+
+def _as_patterns(value: Any) -> list[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [str(v) for v in value]
+
+
+class _CompiledRule:
+    """One profile rule with its patterns compiled once."""
+
+    __slots__ = ("profile_id", "domains", "device_classes", "integrations", "areas", "pattern")
+
+    def __init__(self, profile_id: int, rule: dict[str, Any]) -> None:
+        self.profile_id = profile_id
+        self.domains = _as_set(rule.get(RULE_DOMAIN))
+        self.device_classes = _as_set(rule.get(RULE_DEVICE_CLASS))
+        self.integrations = _as_set(rule.get(RULE_INTEGRATION))
+        self.areas = _as_set(rule.get(RULE_AREA))
+
+        # Globs and regexes are folded into a single alternation so each rule
+        # costs one regex match at most.
+        parts = [
+            fnmatch.translate(glob) for glob in _as_patterns(rule.get(RULE_ENTITY_GLOB))
+        ]
+        parts.extend(
+            f"(?:{regex})\\Z" for regex in _as_patterns(rule.get(RULE_ENTITY_REGEX))
+        )
+        self.pattern = re.compile("|".join(parts)) if parts else None
+
+    def matches(self, info: dict[str, Any]) -> bool:
+        if self.domains is not None and info["domain"] not in self.domains:
+            return False
+        if self.device_classes is not None and info["device_class"] not in self.device_classes:
+            return False
+        if self.integrations is not None and info["integration"] not in self.integrations:
+            return False
+        if self.areas is not None and self.areas.isdisjoint(info["areas"]):
+            return False
+        if self.pattern is not None and self.pattern.match(info["entity_id"]) is None:
+            return False
+        return True
+
+
+class AutoAddEngine:
+    """Adds entities to auto-add profiles based on their match rules.
+
+    Rules are compiled into a domain-keyed index whenever profiles change.
+    Registry events only evaluate the entities they touch against the rules
+    that can apply to that domain; matches are flushed in one transaction.
+    """
+
+    def __init__(self, hass: HomeAssistant, profile_manager: ProfileManager) -> None:
+        self._hass = hass
+        self._profiles = profile_manager
+        self._by_domain: dict[str, list[_CompiledRule]] = {}
+        self._any_domain: list[_CompiledRule] = []
+        self._pending: set[tuple[int, str]] = set()
+        self._unsub: list = []
+        self._cancel_flush = None
+
+    async def async_start(self) -> None:
+        self._compile()
+        self._unsub.append(self._profiles.add_listener(self._handle_profile_changed))
+        self._unsub.append(
+            self._hass.bus.async_listen(
+                EVENT_ENTITY_REGISTRY_UPDATED, self._handle_entity_registry_event
+            )
+        )
+        self._unsub.append(
+            self._hass.bus.async_listen(
+                EVENT_DEVICE_REGISTRY_UPDATED, self._handle_device_registry_event
+            )
+        )
+        # Catch up on anything registered while we were not running.
+        self._evaluate_entities(list(async_get_entity_registry(self._hass).entities))
+        await self.async_flush()
+
+    async def async_stop(self) -> None:
+        for unsub in self._unsub:
+            unsub()
+        self._unsub = []
+        if self._cancel_flush is not None:
+            self._cancel_flush()
+            self._cancel_flush = None
+        await self.async_flush()
+
+    def _iter_rules(self):
+        for rules in self._by_domain.values():
+            yield from rules
+        yield from self._any_domain
+
+    def _compile(self) -> None:
+        by_domain: dict[str, list[_CompiledRule]] = {}
+        any_domain: list[_CompiledRule] = []
+
+        for profile in self._profiles_with_auto_add():
+            for rule in self._profiles.get_profile_rules(profile["id"]):
+                try:
+                    compiled = _CompiledRule(profile["id"], rule)
+                except re.error as err:
+                    _LOGGER.warning(
+                        "Ignoring invalid auto-add rule %s on profile %s: %s",
+                        rule,
+                        profile["id"],
+                        err,
+                    )
+                    continue
+                if compiled.domains is None:
+                    any_domain.append(compiled)
+                else:
+                    for domain in compiled.domains:
+                        by_domain.setdefault(domain, []).append(compiled)
+
+        self._by_domain = by_domain
+        self._any_domain = any_domain
+
+    def _profiles_with_auto_add(self):
+        for profile in self._profiles.iter_profiles():
+            if profile["auto_add_entities"] and profile["active"] and not profile["archived"]:
+                yield profile
+
+    def _entity_info(self, entry, dev_reg, area_reg) -> dict[str, Any]:
+        device = dev_reg.devices.get(entry.device_id) if entry.device_id else None
+        area_id = entry.area_id or (device.area_id if device else None)
+        areas: set[str] = set()
+        if area_id:
+            areas.add(area_id.lower())
+            area = area_reg.areas.get(area_id)
+            if area is not None:
+                areas.add(area.name.lower())
+        device_class = entry.device_class or entry.original_device_class
+        return {
+            "entity_id": entry.entity_id,
+            "domain": entry.domain,
+            "device_class": str(device_class).lower() if device_class else None,
+            "integration": entry.platform.lower() if entry.platform else None,
+            "areas": areas,
+        }
+
+    def _match_entity(self, info: dict[str, Any]) -> None:
+        entity_id = info["entity_id"]
+        existing = self._profiles.get_entity_profiles(entity_id)
+        for rules in (self._by_domain.get(info["domain"], ()), self._any_domain):
+            for rule in rules:
+                if rule.profile_id in existing:
+                    continue
+                if rule.matches(info):
+                    existing.add(rule.profile_id)
+                    self._pending.add((rule.profile_id, entity_id))
+
+    def _evaluate_entities(self, entity_ids) -> None:
+        ent_reg = async_get_entity_registry(self._hass)
+        dev_reg = async_get_device_registry(self._hass)
+        area_reg = async_get_area_registry(self._hass)
+        for entity_id in entity_ids:
+            entry = ent_reg.entities.get(entity_id)
+            if entry is None:
+                continue
+            self._match_entity(self._entity_info(entry, dev_reg, area_reg))
+        self._schedule_flush()
+
+    def _evaluate_profile(self, profile_id: int) -> None:
+        """Evaluate one profile's rules against every registered entity."""
+        rules = [rule for rule in self._iter_rules() if rule.profile_id == profile_id]
+        if not rules:
+            return
+        ent_reg = async_get_entity_registry(self._hass)
+        dev_reg = async_get_device_registry(self._hass)
+        area_reg = async_get_area_registry(self._hass)
+        for entry in ent_reg.entities.values():
+            if profile_id in self._profiles.get_entity_profiles(entry.entity_id):
+                continue
+            info = self._entity_info(entry, dev_reg, area_reg)
+            if any(rule.matches(info) for rule in rules):
+                self._pending.add((profile_id, entry.entity_id))
+        self._schedule_flush()
+
+    @callback
+    def _handle_profile_changed(self, profile_id: int) -> None:
+        self._compile()
+        self._evaluate_profile(profile_id)
+
+    @callback
+    def _handle_entity_registry_event(self, event: Event) -> None:
+        if event.data.get("action") not in ("create", "update"):
+            return
+        self._evaluate_entities([event.data["entity_id"]])
+
+    @callback
+    def _handle_device_registry_event(self, event: Event) -> None:
+        if event.data.get("action") != "update":
+            return
+        if "area_id" not in event.data.get("changes", {}):
+            return
+        ent_reg = async_get_entity_registry(self._hass)
+        entries = async_entries_for_device(ent_reg, event.data["device_id"])
+        self._evaluate_entities([entry.entity_id for entry in entries])
+
+    @callback
+    def _schedule_flush(self) -> None:
+        if not self._pending or self._cancel_flush is not None:
+            return
+
+        @callback
+        def _flush(_now) -> None:
+            self._cancel_flush = None
+            self._hass.async_create_task(self.async_flush())
+
+        self._cancel_flush = async_call_later(self._hass, AUTO_ADD_DEBOUNCE_SECONDS, _flush)
+
+    async def async_flush(self) -> None:
+        """Persist pending matches in one bulk transaction."""
+        if not self._pending:
+            return
+        matches = sorted(self._pending)
+        self._pending = set()
+        added = await self._profiles.async_add_auto_entities(matches)
+        if added:
+            _LOGGER.info("Auto-added %s entities to profiles", added)
@@ -8,9 +8,22 @@ from homeassistant import config_entries
 from homeassistant.core import callback
 
 from .const import (
+    CONF_BUFFER_MEMORY_MB,
+    CONF_DB_CACHE_MB,
+    CONF_DB_MMAP_MB,
+    CONF_DB_SYNCHRONOUS,
+    CONF_EXPORT_MEMORY_MB,
     CONF_EXPORT_PATH,
     CONF_GLOBAL_INTERVAL,
+    CONF_RECORDER_DB_PATH,
+    DB_SYNCHRONOUS_MODES,
+    DEFAULT_BUFFER_MEMORY_MB,
+    DEFAULT_DB_CACHE_MB,
+    DEFAULT_DB_MMAP_MB,
+    DEFAULT_DB_SYNCHRONOUS,
+    DEFAULT_EXPORT_MEMORY_MB,
     DEFAULT_GLOBAL_INTERVAL,
+    DEFAULT_RECORDER_DB_PATH,
     DOMAIN,
 )
 
@@ -88,6 +101,18 @@ class HistoryArchiverOptionsFlow(config_entries.OptionsFlow):
             interval = user_input.get(CONF_GLOBAL_INTERVAL)
             if not isinstance(interval, int) or interval < 1:
                 errors[CONF_GLOBAL_INTERVAL] = "invalid_interval"
+            buffer_memory = user_input.get(CONF_BUFFER_MEMORY_MB, DEFAULT_BUFFER_MEMORY_MB)
+            if not isinstance(buffer_memory, int) or buffer_memory < 0:
+                errors[CONF_BUFFER_MEMORY_MB] = "invalid_buffer_memory"
+            cache_mb = user_input.get(CONF_DB_CACHE_MB, DEFAULT_DB_CACHE_MB)
+            if not isinstance(cache_mb, int) or cache_mb < 1:
+                errors[CONF_DB_CACHE_MB] = "invalid_db_cache"
+            mmap_mb = user_input.get(CONF_DB_MMAP_MB, DEFAULT_DB_MMAP_MB)
+            if not isinstance(mmap_mb, int) or mmap_mb < 0:
+                errors[CONF_DB_MMAP_MB] = "invalid_db_mmap"
+            export_memory = user_input.get(CONF_EXPORT_MEMORY_MB, DEFAULT_EXPORT_MEMORY_MB)
+            if not isinstance(export_memory, int) or export_memory < 16:
+                errors[CONF_EXPORT_MEMORY_MB] = "invalid_export_memory"
 
             if not errors:
                 return self.async_create_entry(
@@ -100,6 +125,16 @@ class HistoryArchiverOptionsFlow(config_entries.OptionsFlow):
                                 CONF_EXPORT_PATH, DEFAULT_UI_EXPORT_PATH
                             ),
                         ),
+                        CONF_BUFFER_MEMORY_MB: buffer_memory,
+                        CONF_DB_SYNCHRONOUS: user_input.get(
+                            CONF_DB_SYNCHRONOUS, DEFAULT_DB_SYNCHRONOUS
+                        ),
+                        CONF_DB_CACHE_MB: cache_mb,
+                        CONF_DB_MMAP_MB: mmap_mb,
+                        CONF_EXPORT_MEMORY_MB: export_memory,
+                        CONF_RECORDER_DB_PATH: user_input.get(
+                            CONF_RECORDER_DB_PATH, DEFAULT_RECORDER_DB_PATH
+                        ),
                     },
                 )
 
@@ -113,6 +148,10 @@ class HistoryArchiverOptionsFlow(config_entries.OptionsFlow):
             CONF_EXPORT_PATH,
             self._config_entry.data.get(CONF_EXPORT_PATH, DEFAULT_UI_EXPORT_PATH),
         )
+        current_buffer_memory = self._config_entry.options.get(
+            CONF_BUFFER_MEMORY_MB, DEFAULT_BUFFER_MEMORY_MB
+        )
+        options = self._config_entry.options
 
         data_schema = vol.Schema(
             {
@@ -124,6 +163,30 @@ class HistoryArchiverOptionsFlow(config_entries.OptionsFlow):
                     CONF_EXPORT_PATH,
                     default=current_export_path,
                 ): str,
+                vol.Optional(
+                    CONF_BUFFER_MEMORY_MB,
+                    default=current_buffer_memory,
+                ): vol.Coerce(int),
+                vol.Optional(
+                    CONF_DB_SYNCHRONOUS,
+                    default=options.get(CONF_DB_SYNCHRONOUS, DEFAULT_DB_SYNCHRONOUS),
+                ): vol.In(DB_SYNCHRONOUS_MODES),
+                vol.Optional(
+                    CONF_DB_CACHE_MB,
+                    default=options.get(CONF_DB_CACHE_MB, DEFAULT_DB_CACHE_MB),
+                ): vol.Coerce(int),
+                vol.Optional(
+                    CONF_DB_MMAP_MB,
+                    default=options.get(CONF_DB_MMAP_MB, DEFAULT_DB_MMAP_MB),
+                ): vol.Coerce(int),
+                vol.Optional(
+                    CONF_EXPORT_MEMORY_MB,
+                    default=options.get(CONF_EXPORT_MEMORY_MB, DEFAULT_EXPORT_MEMORY_MB),
+                ): vol.Coerce(int),
+                vol.Optional(
+                    CONF_RECORDER_DB_PATH,
+                    default=options.get(CONF_RECORDER_DB_PATH, DEFAULT_RECORDER_DB_PATH),
+                ): str,
             }
         )
 
@@ -2,15 +2,50 @@ DOMAIN = "history_archiver"
 
 CONF_GLOBAL_INTERVAL = "global_interval"
 CONF_EXPORT_PATH = "export_path"
+CONF_BUFFER_MEMORY_MB = "buffer_memory_mb"
+CONF_DB_SYNCHRONOUS = "db_synchronous"
+CONF_DB_CACHE_MB = "db_cache_mb"
+CONF_DB_MMAP_MB = "db_mmap_mb"
+CONF_EXPORT_MEMORY_MB = "export_memory_mb"
+CONF_RECORDER_DB_PATH = "recorder_db_path"
 
 DEFAULT_GLOBAL_INTERVAL = 10  # seconds
 DEFAULT_EXPORT_PATH = "history_archiver_exports"
+DEFAULT_BUFFER_MEMORY_MB = 16  # recent samples kept in memory for exports
+DEFAULT_DB_SYNCHRONOUS = "normal"  # durable enough in WAL mode, far fewer fsyncs
+DEFAULT_DB_CACHE_MB = 16
+DEFAULT_DB_MMAP_MB = 64
+DEFAULT_EXPORT_MEMORY_MB = 256  # working memory one export may plan for
+DEFAULT_RECORDER_DB_PATH = "home-assistant_v2.db"  # relative to /config
 
 DATA_DB = f"{DOMAIN}_db"
 DATA_PROFILE_MANAGER = f"{DOMAIN}_profile_manager"
 DATA_ENTITY_MANAGER = f"{DOMAIN}_entity_manager"
 DATA_SCHEDULER = f"{DOMAIN}_scheduler"
 DATA_EXPORT_ENGINE = f"{DOMAIN}_export_engine"
+DATA_AUTO_ADD = f"{DOMAIN}_auto_add"
+DATA_ARCHIVE = f"{DOMAIN}_archive"
+DATA_SAMPLE_BUFFER = f"{DOMAIN}_sample_buffer"
+DATA_PARTIALS = f"{DOMAIN}_partials"
+DATA_EXPORT_QUEUE = f"{DOMAIN}_export_queue"
+DATA_MAINTENANCE = f"{DOMAIN}_maintenance"
+DATA_RECORDER_IMPORT = f"{DOMAIN}_recorder_import"
+DATA_INGEST_STATS = f"{DOMAIN}_ingest_stats"
+# Top level of hass.data: views cannot be removed, so it outlives unloads
+DATA_STREAM_VIEW = f"{DOMAIN}_stream_view"
+
+# Per-entity storage modes (entities.stats_mode). "change" only stores a
+# sample when the value moves by more than the entity's change_epsilon, or
+# when the last stored sample is older than its heartbeat.
+STATS_MODE_RAW = "raw"
+STATS_MODE_CHANGE = "change"
+SUPPORTED_STATS_MODES = [STATS_MODE_RAW, STATS_MODE_CHANGE]
+DEFAULT_HEARTBEAT_SECONDS = 3600
+# Distinct non-numeric states kept per entity; free-text or timestamp states
+# past this are not recorded.
+MAX_STATE_CODES = 256
+
+ENTITY_TREE_PAGE_SIZE = 50  # devices per page of the UI entity tree
 
 ATTR_PROFILE_ID = "profile_id"
 ATTR_PROFILE_NAME = "profile_name"
@@ -28,8 +63,30 @@ METADATA_FIELDS = [
     "entity_name",
 ]
 
+# Auto-add rule keys. Every key present in a rule must match (AND), a profile
+# matches an entity when any of its rules match (OR). Values may be a string
+# or a list of strings.
+RULE_DOMAIN = "domain"
+RULE_DEVICE_CLASS = "device_class"
+RULE_INTEGRATION = "integration"
+RULE_AREA = "area"
+RULE_ENTITY_GLOB = "entity_glob"
+RULE_ENTITY_REGEX = "entity_regex"
+
+RULE_KEYS = [
+    RULE_DOMAIN,
+    RULE_DEVICE_CLASS,
+    RULE_INTEGRATION,
+    RULE_AREA,
+    RULE_ENTITY_GLOB,
+    RULE_ENTITY_REGEX,
+]
+
+AUTO_ADD_DEBOUNCE_SECONDS = 1.0
+
 EXPORT_FORMAT_CSV = "csv"
 EXPORT_FORMAT_JSON = "json"
+EXPORT_FORMAT_NDJSON = "ndjson"
 EXPORT_FORMAT_HTML = "html"
 EXPORT_FORMAT_XLSX = "xlsx"
 EXPORT_FORMAT_SQLITE = "sqlite"
@@ -40,6 +97,7 @@ EXPORT_FORMAT_ARROW = "arrow"
 SUPPORTED_EXPORT_FORMATS = [
     EXPORT_FORMAT_CSV,
     EXPORT_FORMAT_JSON,
+    EXPORT_FORMAT_NDJSON,
     EXPORT_FORMAT_HTML,
     EXPORT_FORMAT_XLSX,
     EXPORT_FORMAT_SQLITE,
@@ -51,11 +109,117 @@ SUPPORTED_EXPORT_FORMATS = [
 DATA_ACCURACY_RAW = "raw"
 DATA_ACCURACY_MEAN = "mean"
 DATA_ACCURACY_WEIGHTED_MEAN = "weighted_mean"
+DATA_ACCURACY_HOLD = "hold"  # last stored value carried forward
+DATA_ACCURACY_MODE = "mode"  # most frequent state within the bucket
+
+# Dictionary of the data_accuracy column in columnar exports; append only.
+DATA_ACCURACY_LEVELS = [
+    DATA_ACCURACY_RAW,
+    DATA_ACCURACY_MEAN,
+    DATA_ACCURACY_WEIGHTED_MEAN,
+    DATA_ACCURACY_HOLD,
+    DATA_ACCURACY_MODE,
+]
+
+# Downsampling of non-numeric states onto the grid. Each grid point closes
+# the bucket (t - resolution, t]: "last" takes the state in effect at t,
+# "mode" the most frequent state stored within the bucket.
+STATE_AGGREGATION_LAST = "last"
+STATE_AGGREGATION_MODE = "mode"
+SUPPORTED_STATE_AGGREGATIONS = [STATE_AGGREGATION_LAST, STATE_AGGREGATION_MODE]
+
+EXPORT_PARQUET_COMPRESSION = "zstd"
+
+# Stream compression for the text formats (csv, ndjson, json)
+EXPORT_COMPRESSION_GZIP = "gzip"
+EXPORT_COMPRESSION_ZSTD = "zstd"
+SUPPORTED_EXPORT_COMPRESSIONS = [
+    EXPORT_COMPRESSION_GZIP,
+    EXPORT_COMPRESSION_ZSTD,
+]
+
+# Per-entity writes one file per entity and format; consolidated writes one
+# file per format holding every entity, keyed by an entity_id column; wide
+# writes one file per format with a column per entity on a shared time grid.
+EXPORT_LAYOUT_PER_ENTITY = "per_entity"
+EXPORT_LAYOUT_CONSOLIDATED = "consolidated"
+EXPORT_LAYOUT_WIDE = "wide"
+SUPPORTED_EXPORT_LAYOUTS = [
+    EXPORT_LAYOUT_PER_ENTITY,
+    EXPORT_LAYOUT_CONSOLIDATED,
+    EXPORT_LAYOUT_WIDE,
+]
+
+WIDE_ACCURACY_SUFFIX = "__accuracy"
+
+EXPORT_HTML_PAGE_ROWS = 5000  # rows per paginated HTML page
+XLSX_MAX_ROWS = 1_048_576  # per sheet, header row included
+
+EXPORT_CHUNK_ROWS = 64 * 1024  # rows per record batch handed to writers
+EXPORT_MIN_CHUNK_ROWS = 1024
+
+# Export memory budget: downsampled tables above EXPORT_SPILL_SHARE of the
+# budget are spilled to memory-mapped Arrow IPC files before writing, and
+# writer chunks are sized so their Python row objects fit EXPORT_CHUNK_SHARE
+# of what the estimated tables leave of it.
+EXPORT_SPILL_SHARE = 0.5
+EXPORT_CHUNK_SHARE = 0.25
+EXPORT_ROW_BYTES = 24  # Arrow bytes per downsampled row (ts, value, code)
+EXPORT_CELL_OBJECT_BYTES = 64  # Python object bytes per cell in text writers
+EXPORT_SPILL_FOLDER = "spill"  # under /config/history_archiver
+
+# Ranges longer than EXPORT_SPLIT_MIN_DAYS are exported as day sub-ranges
+# (month sub-ranges past EXPORT_SPLIT_MONTHLY_DAYS), processed concurrently.
+EXPORT_SPLIT_MIN_DAYS = 2
+EXPORT_SPLIT_MONTHLY_DAYS = 62
+EXPORT_PARALLEL_WORKERS = 4
+EXPORT_PARTIALS_FOLDER = "partials"  # under /config/history_archiver
+EXPORT_PARTIALS_MAX_AGE_DAYS = 90
+
+# Export job queue (export_runs.status)
+EXPORT_STATUS_QUEUED = "queued"
+EXPORT_STATUS_RUNNING = "running"
+EXPORT_STATUS_COMPLETED = "completed"
+EXPORT_STATUS_FAILED = "failed"
+EXPORT_STATUS_CANCELLED = "cancelled"
+EXPORT_RUNS_FOLDER = "runs"  # staged per-entity tables, under /config/history_archiver
+EVENT_EXPORT_PROGRESS = f"{DOMAIN}_export_progress"
+EXPORT_METADATA_KEY = b"history_archiver.metadata"
+
+# Read-only HTTP streaming of the consolidated layout for external tools
+STREAM_URL = f"/api/{DOMAIN}/stream"
+SUPPORTED_STREAM_FORMATS = [EXPORT_FORMAT_ARROW, EXPORT_FORMAT_NDJSON]
 
 DB_FILENAME = "history.db"
-DB_SCHEMA_VERSION = 1
+DB_SCHEMA_VERSION = 8
+
+MIGRATION_BATCH_SIZE = 5000  # rows copied per background transaction
+MIGRATION_BATCH_DELAY = 0.05  # seconds yielded to ingestion between batches
+
+DB_SYNCHRONOUS_MODES = ["normal", "full"]
+DB_MAINTENANCE_INTERVAL = 15 * 60  # seconds between idle-window checks
+DB_IDLE_SECONDS = 2.0  # no DB activity for this long counts as idle
+DB_VACUUM_MIN_FREE_PAGES = 256  # below this, freelist pages are left for reuse
+DB_VACUUM_MAX_PAGES = 2048  # pages released per idle window, bounds lock time
+DB_OPTIMIZE_HOUR = 3  # local time of the daily optimize run
+DB_OPTIMIZE_MINUTE = 40
+DB_ANALYSIS_LIMIT = 400  # rows sampled per index by ANALYZE, bounds optimize
+
+# Backfill from the recorder DB: rows read and inserted per transaction, and
+# the pause after each one so live sampling gets the database lock.
+RECORDER_IMPORT_BATCH_SIZE = 5000
+RECORDER_IMPORT_BATCH_DELAY = 0.05
+
+INGEST_STATS_FLUSH_INTERVAL = 5 * 60  # seconds between writes of changed counters
+INGEST_STATS_ROW_OVERHEAD = 8  # record header, cell size and cell pointer bytes
+INGEST_STATS_DIAGNOSTICS_TOP = 50  # entities listed in diagnostics
 
 BACKUP_FOLDER = "history_archiver_backups"
 
+ARCHIVE_FOLDER = "archive"  # under /config/history_archiver
+ARCHIVE_INTERVAL = 6 * 3600  # seconds between tiering runs
+ARCHIVE_ROW_GROUP_SIZE = 64 * 1024
+ARCHIVE_COMPRESSION = "zstd"
+
 SERVICE_BACKUP_DB = "backup_db"
 SERVICE_RESTORE_DB = "restore_db"
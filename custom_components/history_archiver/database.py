@@ -1,13 +1,27 @@
 import asyncio
 import logging
 import os
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
 from shutil import copy2
+from typing import Callable
 
 import aiosqlite
 from homeassistant.core import HomeAssistant
 
-from .const import DB_FILENAME, DB_SCHEMA_VERSION, DOMAIN
+from .const import (
+    DB_ANALYSIS_LIMIT,
+    DB_FILENAME,
+    DB_SCHEMA_VERSION,
+    DEFAULT_DB_CACHE_MB,
+    DEFAULT_DB_MMAP_MB,
+    DEFAULT_DB_SYNCHRONOUS,
+    DOMAIN,
+    MIGRATION_BATCH_DELAY,
+    MIGRATION_BATCH_SIZE,
+)
+from .migrations import MIGRATIONS, Migration, get_migration
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -15,23 +29,86 @@ _LOGGER = logging.getLogger(__name__)
 class Database:
     """SQLite database wrapper for History Archiver."""
 
-    def __init__(self, hass: HomeAssistant) -> None:
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        synchronous: str = DEFAULT_DB_SYNCHRONOUS,
+        cache_mb: int = DEFAULT_DB_CACHE_MB,
+        mmap_mb: int = DEFAULT_DB_MMAP_MB,
+    ) -> None:
         self._hass = hass
         self._db_path = hass.config.path(DOMAIN, DB_FILENAME)
+        self._synchronous = synchronous
+        self._cache_mb = cache_mb
+        self._mmap_mb = mmap_mb
         self._conn: aiosqlite.Connection | None = None
         self._lock = asyncio.Lock()
+        self._last_activity = time.monotonic()
+        # version -> [checkpoint, target] for background copies still running
+        self._pending_copies: dict[int, list[int]] = {}
+        # logical table -> SQL to read it from while a copy is running
+        self._read_sources: dict[str, str] = {}
+        self._migration_task: asyncio.Task | None = None
+        self._restore_listeners: list[Callable[[], None]] = []
 
     @property
     def path(self) -> str:
         return self._db_path
 
+    def add_restore_listener(self, listener: Callable[[], None]) -> None:
+        """Call ``listener`` after a restore replaced the database contents."""
+        self._restore_listeners.append(listener)
+
+    def read_source(self, table: str) -> str:
+        """Return the FROM clause to read a table, dual-reading during a migration."""
+        source = self._read_sources.get(table)
+        return f"{source} AS {table}" if source else table
+
+    @property
+    def migrations_pending(self) -> bool:
+        return bool(self._pending_copies)
+
+    @property
+    def idle_seconds(self) -> float:
+        """Seconds since the last statement finished, 0 while one is running."""
+        if self._lock.locked():
+            return 0.0
+        return time.monotonic() - self._last_activity
+
+    @asynccontextmanager
+    async def _locked(self):
+        async with self._lock:
+            try:
+                yield
+            finally:
+                self._last_activity = time.monotonic()
+
     async def async_initialize(self) -> None:
         os.makedirs(os.path.dirname(self._db_path), exist_ok=True)
         self._conn = await aiosqlite.connect(self._db_path)
+        try:
+            await self._configure_connection()
+            await self._ensure_schema()
+        except Exception:
+            # Don't leave the file open (and possibly locked) until HA exits
+            await self._conn.close()
+            self._conn = None
+            raise
+        _LOGGER.info("History Archiver DB initialized at %s", self._db_path)
+
+    async def _configure_connection(self) -> None:
+        # auto_vacuum only takes effect before the first table is created (or
+        # after a VACUUM, see DatabaseMaintenance), and must precede WAL.
+        await self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
         await self._conn.execute("PRAGMA journal_mode=WAL;")
         await self._conn.execute("PRAGMA foreign_keys=ON;")
-        await self._ensure_schema()
-        _LOGGER.info("History Archiver DB initialized at %s", self._db_path)
+        await self._conn.execute(f"PRAGMA synchronous={self._synchronous.upper()};")
+        # Negative cache_size is in KiB rather than pages
+        await self._conn.execute(f"PRAGMA cache_size=-{self._cache_mb * 1024};")
+        await self._conn.execute(f"PRAGMA mmap_size={self._mmap_mb * 1024 * 1024};")
+        await self._conn.execute("PRAGMA temp_store=MEMORY;")
+        # Keeps the ANALYZE run by PRAGMA optimize short on large databases
+        await self._conn.execute(f"PRAGMA analysis_limit={DB_ANALYSIS_LIMIT};")
 
     async def _ensure_schema(self) -> None:
         async with self._conn.execute("PRAGMA user_version;") as cursor:
@@ -39,13 +116,150 @@ class Database:
             version = row[0] if row else 0
 
         if version == 0:
+            # Fresh DBs and DBs created before user_version was maintained
+            # both get the (idempotent) v1 layout.
             await self._create_schema()
-        elif version != DB_SCHEMA_VERSION:
+            version = 1
+
+        if version > DB_SCHEMA_VERSION:
             _LOGGER.warning(
-                "DB schema version mismatch: %s != %s",
+                "DB schema version %s is newer than supported %s",
                 version,
                 DB_SCHEMA_VERSION,
             )
+        else:
+            for migration in MIGRATIONS:
+                if migration.version > version:
+                    await self._apply_migration(migration)
+                    version = migration.version
+
+        await self._load_pending_copies()
+
+    async def _apply_migration(self, migration: Migration) -> None:
+        _LOGGER.info(
+            "Migrating History Archiver DB to v%s: %s",
+            migration.version,
+            migration.description,
+        )
+        now = datetime.utcnow().isoformat()
+        try:
+            # executescript commits anything pending first; the explicit BEGIN
+            # keeps the DDL, bookkeeping and version bump in one transaction.
+            await self._conn.executescript(f"BEGIN;\n{migration.upgrade_sql}")
+            if migration.copy is not None:
+                await self._conn.execute(
+                    f"""
+                    INSERT OR REPLACE INTO schema_migrations
+                        (version, description, status, checkpoint, target, started_at)
+                    SELECT ?, ?, 'copying', 0, COALESCE(MAX(rowid), 0), ?
+                    FROM {migration.copy.source}
+                    """,
+                    (migration.version, migration.description, now),
+                )
+            else:
+                await self._conn.execute(
+                    """
+                    INSERT OR REPLACE INTO schema_migrations
+                        (version, description, status, checkpoint, target,
+                         started_at, finished_at)
+                    VALUES (?, ?, 'done', 0, 0, ?, ?)
+                    """,
+                    (migration.version, migration.description, now, now),
+                )
+            await self._conn.execute(
+                "UPDATE schema_version SET version = ? WHERE id = 1", (migration.version,)
+            )
+            # PRAGMA takes no bound parameters; version is an int from MIGRATIONS
+            await self._conn.execute(f"PRAGMA user_version = {int(migration.version)};")
+            await self._conn.commit()
+        except Exception:
+            # Also ends the BEGIN above, which would otherwise hold the write lock
+            await self._conn.rollback()
+            raise
+
+    async def _load_pending_copies(self) -> None:
+        self._pending_copies = {}
+        self._read_sources = {}
+        async with self._conn.execute(
+            """
+            SELECT version, checkpoint, target FROM schema_migrations
+            WHERE status = 'copying' ORDER BY version
+            """
+        ) as cursor:
+            rows = await cursor.fetchall()
+        for version, checkpoint, target in rows:
+            self._pending_copies[version] = [checkpoint, target]
+            self._update_read_source(version)
+
+    def _update_read_source(self, version: int) -> None:
+        copy = get_migration(version).copy
+        state = self._pending_copies.get(version)
+        if state is None:
+            self._read_sources.pop(copy.table, None)
+        else:
+            self._read_sources[copy.table] = copy.dual_read_sql.format(checkpoint=state[0])
+
+    def async_start_migrations(self) -> None:
+        """Start copying migrated rows in the background, if any are pending."""
+        if not self._pending_copies:
+            return
+        if self._migration_task is not None and not self._migration_task.done():
+            return
+        self._migration_task = self._hass.async_create_background_task(
+            self._async_run_migrations(), f"{DOMAIN}_schema_migration"
+        )
+
+    async def _async_run_migrations(self) -> None:
+        while self._pending_copies:
+            version = min(self._pending_copies)
+            try:
+                await self._async_copy_batch(version)
+            except Exception:  # noqa: BLE001
+                _LOGGER.exception(
+                    "Background migration to v%s failed, will resume on next start",
+                    version,
+                )
+                return
+            await asyncio.sleep(MIGRATION_BATCH_DELAY)
+
+    async def _async_copy_batch(self, version: int) -> None:
+        copy = get_migration(version).copy
+        async with self._locked():
+            state = self._pending_copies.get(version)
+            if state is None or self._conn is None:
+                return
+            checkpoint, target = state
+            upper = min(checkpoint + MIGRATION_BATCH_SIZE, target)
+            done = upper >= target
+            try:
+                await self._conn.execute(copy.copy_sql, (checkpoint, upper))
+                if done:
+                    for statement in copy.finalize_statements:
+                        await self._conn.execute(statement)
+                    await self._conn.execute(
+                        """
+                        UPDATE schema_migrations
+                        SET checkpoint = ?, status = 'done', finished_at = ?
+                        WHERE version = ?
+                        """,
+                        (upper, datetime.utcnow().isoformat(), version),
+                    )
+                else:
+                    await self._conn.execute(
+                        "UPDATE schema_migrations SET checkpoint = ? WHERE version = ?",
+                        (upper, version),
+                    )
+            except Exception:
+                await self._conn.rollback()
+                raise
+            await self._conn.commit()
+
+            if done:
+                del self._pending_copies[version]
+                _LOGGER.info("Background migration to v%s finished", version)
+            else:
+                state[0] = upper
+            self._update_read_source(version)
 
     async def _create_schema(self) -> None:
         _LOGGER.info("Creating History Archiver DB schema")
@@ -57,6 +271,16 @@ class Database:
                 version INTEGER NOT NULL
             );
 
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                status TEXT NOT NULL,
+                checkpoint INTEGER NOT NULL DEFAULT 0,
+                target INTEGER NOT NULL DEFAULT 0,
+                started_at TEXT,
+                finished_at TEXT
+            );
+
             CREATE TABLE IF NOT EXISTS entities (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 entity_id TEXT NOT NULL UNIQUE,
@@ -100,6 +324,25 @@ class Database:
                 FOREIGN KEY(profile_id) REFERENCES profiles(id) ON DELETE CASCADE
             );
 
+            DELETE FROM profile_entities
+            WHERE id NOT IN (
+                SELECT MAX(id) FROM profile_entities
+                GROUP BY profile_id, entity_id
+            );
+
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_profile_entities_profile_entity
+                ON profile_entities(profile_id, entity_id);
+
+            CREATE TABLE IF NOT EXISTS profile_rules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                profile_id INTEGER NOT NULL,
+                rule_json TEXT NOT NULL,
+                FOREIGN KEY(profile_id) REFERENCES profiles(id) ON DELETE CASCADE
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_profile_rules_profile
+                ON profile_rules(profile_id);
+
             CREATE TABLE IF NOT EXISTS state_samples (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 entity_id TEXT NOT NULL,
@@ -134,34 +377,79 @@ class Database:
             """
         )
 
-        # FIXED: Insert schema version correctly
         await self._conn.execute(
-            "INSERT OR REPLACE INTO schema_version (id, version) VALUES (1, ?)",
-            (DB_SCHEMA_VERSION,)
+            "INSERT OR REPLACE INTO schema_version (id, version) VALUES (1, 1)"
         )
+        await self._conn.execute("PRAGMA user_version = 1;")
 
         await self._conn.commit()
 
     async def async_execute(self, query: str, params: tuple | dict | None = None):
-        async with self._lock:
-            await self._conn.execute(query, params or ())
+        async with self._locked():
+            cursor = await self._conn.execute(query, params or ())
+            await self._conn.commit()
+        return cursor.lastrowid
+
+    async def async_executemany(self, query: str, params_seq) -> int:
+        """Run one statement for many parameter sets in a single transaction.
+
+        Returns the number of rows changed.
+        """
+        params_seq = list(params_seq)
+        if not params_seq:
+            return 0
+        async with self._locked():
+            try:
+                cursor = await self._conn.executemany(query, params_seq)
+            except Exception:
+                await self._conn.rollback()
+                raise
+            await self._conn.commit()
+        return cursor.rowcount
+
+    async def async_execute_batch(
+        self, statements: list[tuple[str, tuple | dict | list | None]]
+    ) -> None:
+        """Run several statements in a single transaction.
+
+        A list of parameter tuples runs that statement once per tuple.
+        """
+        async with self._locked():
+            try:
+                for query, params in statements:
+                    if isinstance(params, list):
+                        await self._conn.executemany(query, params)
+                    else:
+                        await self._conn.execute(query, params or ())
+            except Exception:
+                await self._conn.rollback()
+                raise
             await self._conn.commit()
 
     async def async_fetchall(self, query: str, params: tuple | dict | None = None):
-        async with self._lock:
+        async with self._locked():
             async with self._conn.execute(query, params or ()) as cursor:
                 rows = await cursor.fetchall()
         return rows
 
     async def async_fetchone(self, query: str, params: tuple | dict | None = None):
-        async with self._lock:
+        async with self._locked():
             async with self._conn.execute(query, params or ()) as cursor:
                 row = await cursor.fetchone()
         return row
 
+    async def async_executescript(self, script: str) -> None:
+        """Run a script to completion, e.g. maintenance pragmas and VACUUM.
+
+        Unlike ``execute``, this steps statements until done, which
+        ``PRAGMA incremental_vacuum`` needs to free more than one page.
+        """
+        async with self._locked():
+            await self._conn.executescript(script)
+
     async def async_backup(self, backup_path: str) -> None:
         _LOGGER.info("Creating DB backup at %s", backup_path)
-        async with self._lock:
+        async with self._locked():
             async with aiosqlite.connect(backup_path) as backup_conn:
                 await self._conn.backup(backup_conn)
         stat = os.stat(backup_path)
@@ -179,18 +467,23 @@ class Database:
 
     async def async_restore(self, source_path: str) -> None:
         _LOGGER.warning("Restoring History Archiver DB from %s", source_path)
-        async with self._lock:
+        async with self._locked():
             if self._conn is not None:
                 await self._conn.close()
                 self._conn = None
             copy2(source_path, self._db_path)
             self._conn = await aiosqlite.connect(self._db_path)
-            await self._conn.execute("PRAGMA journal_mode=WAL;")
-            await self._conn.execute("PRAGMA foreign_keys=ON;")
+            await self._configure_connection()
             await self._ensure_schema()
+        for listener in self._restore_listeners:
+            listener()
+        self.async_start_migrations()
         _LOGGER.info("History Archiver DB restored from %s", source_path)
 
     async def async_close(self) -> None:
+        if self._migration_task is not None:
+            self._migration_task.cancel()
+            self._migration_task = None
         if self._conn is not None:
             await self._conn.close()
             self._conn = None
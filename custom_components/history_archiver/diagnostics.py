@@ -0,0 +1,33 @@
+"""Diagnostics for History Archiver: database health and per-entity storage."""
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    DATA_INGEST_STATS,
+    DATA_MAINTENANCE,
+    DATA_SAMPLE_BUFFER,
+    DOMAIN,
+    INGEST_STATS_DIAGNOSTICS_TOP,
+)
+from .ingest_stats import IngestStats
+from .maintenance import DatabaseMaintenance
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return the entities taking the most space first, to target retention."""
+    data = hass.data[DOMAIN]
+    stats: IngestStats = data[DATA_INGEST_STATS]
+    maintenance: DatabaseMaintenance = data[DATA_MAINTENANCE]
+    sample_buffer = data[DATA_SAMPLE_BUFFER]
+    return {
+        "options": dict(entry.options),
+        "database": await maintenance.async_report(),
+        "sample_buffer_bytes": sample_buffer.memory_bytes if sample_buffer else 0,
+        "storage": stats.totals(),
+        "top_entities": stats.report(INGEST_STATS_DIAGNOSTICS_TOP),
+    }
@@ -0,0 +1,155 @@
+"""Vectorized time-grid construction and downsampling.
+
+Timestamps are int64 microseconds since the Unix epoch (UTC); stored ISO
+strings are parsed and grids built as whole arrays, never per datetime.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from .const import (
+    DATA_ACCURACY_HOLD,
+    DATA_ACCURACY_LEVELS,
+    DATA_ACCURACY_MEAN,
+    DATA_ACCURACY_MODE,
+    DATA_ACCURACY_RAW,
+    DATA_ACCURACY_WEIGHTED_MEAN,
+    STATE_AGGREGATION_MODE,
+)
+
+_EPOCH = datetime(1970, 1, 1)
+_US = timedelta(microseconds=1)
+
+CODE_RAW = DATA_ACCURACY_LEVELS.index(DATA_ACCURACY_RAW)
+CODE_MEAN = DATA_ACCURACY_LEVELS.index(DATA_ACCURACY_MEAN)
+CODE_WEIGHTED_MEAN = DATA_ACCURACY_LEVELS.index(DATA_ACCURACY_WEIGHTED_MEAN)
+CODE_HOLD = DATA_ACCURACY_LEVELS.index(DATA_ACCURACY_HOLD)
+CODE_MODE = DATA_ACCURACY_LEVELS.index(DATA_ACCURACY_MODE)
+
+
+def to_epoch_us(value: datetime) -> int:
+    """Convert a datetime (naive values are UTC) to epoch microseconds."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _US
+
+
+def parse_iso_us(values: list[str]) -> np.ndarray:
+    """Parse naive ISO-8601 strings into epoch microseconds in one pass."""
+    return np.array(values, dtype="datetime64[us]").astype(np.int64)
+
+
+def format_iso_us(values: np.ndarray) -> list[str]:
+    """Format epoch microseconds like ``datetime.isoformat()`` on naive UTC values."""
+    stamps = values.astype("datetime64[us]")
+    text = np.datetime_as_string(stamps, unit="us")
+    whole = values % 1_000_000 == 0
+    if whole.any():
+        # isoformat() drops the fraction when it is zero
+        text = np.where(whole, np.datetime_as_string(stamps, unit="s"), text)
+    return text.tolist()
+
+
+def build_grid(start_ts: datetime, end_ts: datetime, resolution_seconds: int) -> np.ndarray:
+    """Return the inclusive target grid from start to end as epoch microseconds."""
+    return np.arange(
+        to_epoch_us(start_ts),
+        to_epoch_us(end_ts) + 1,
+        int(resolution_seconds) * 1_000_000,
+        dtype=np.int64,
+    )
+
+
+def downsample(
+    sample_us: np.ndarray,
+    values: np.ndarray,
+    grid_us: np.ndarray,
+    hold: bool = False,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Align sorted samples onto a grid.
+
+    Returns float64 values and int8 data_accuracy codes (indexes into
+    ``DATA_ACCURACY_LEVELS``). Exact hits and points past the last sample are
+    raw, the midpoint between two samples is their mean, anything else is
+    linearly weighted between the surrounding samples.
+
+    With ``hold`` (change-only entities) every point takes the last sample at
+    or before it and is marked hold unless it is an exact hit.
+    """
+    n = len(sample_us)
+    if n == 0:
+        return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.int8)
+
+    idx = np.searchsorted(sample_us, grid_us, side="right") - 1
+    np.maximum(idx, 0, out=idx)
+
+    if hold:
+        codes = np.where(sample_us[idx] == grid_us, CODE_RAW, CODE_HOLD).astype(np.int8)
+        return values[idx].astype(np.float64), codes
+    nxt = np.minimum(idx + 1, n - 1)
+
+    t1 = sample_us[idx]
+    t2 = sample_us[nxt]
+    v1 = values[idx]
+    v2 = values[nxt]
+
+    total = (t2 - t1).astype(np.float64)
+    interpolate = (t1 != grid_us) & (idx + 1 < n) & (total > 0)
+
+    ratio = np.zeros(len(grid_us), dtype=np.float64)
+    np.divide((grid_us - t1).astype(np.float64), total, out=ratio, where=interpolate)
+    midpoint = interpolate & (np.abs(ratio - 0.5) < 1e-9)
+
+    out = np.where(interpolate, v1 + (v2 - v1) * ratio, v1)
+    out[midpoint] = ((v1 + v2) / 2.0)[midpoint]
+
+    codes = np.full(len(grid_us), CODE_RAW, dtype=np.int8)
+    codes[interpolate] = CODE_WEIGHTED_MEAN
+    codes[midpoint] = CODE_MEAN
+    return out, codes
+
+
+def downsample_states(
+    sample_us: np.ndarray,
+    states: np.ndarray,
+    grid_us: np.ndarray,
+    resolution_seconds: int,
+    aggregation: str,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Align sorted integer state codes onto a grid.
+
+    Returns the chosen state codes and int8 data_accuracy codes. "last" takes
+    the state in effect at each point (raw on an exact hit, hold otherwise).
+    "mode" takes the most frequent state in (t - resolution, t], ties going to
+    the lowest code, and falls back to "last" marked hold for empty buckets.
+    """
+    n = len(sample_us)
+    if n == 0:
+        return np.empty(0, dtype=states.dtype), np.empty(0, dtype=np.int8)
+
+    hi = np.searchsorted(sample_us, grid_us, side="right")
+    idx = np.maximum(hi - 1, 0)
+    out = states[idx]
+    codes = np.where(sample_us[idx] == grid_us, CODE_RAW, CODE_HOLD).astype(np.int8)
+    if aggregation != STATE_AGGREGATION_MODE:
+        return out, codes
+
+    lo = np.searchsorted(
+        sample_us, grid_us - int(resolution_seconds) * 1_000_000, side="right"
+    )
+    filled = hi > lo
+    # Count each distinct state per bucket via its sorted sample positions;
+    # state sets are small, so this stays O(states * grid).
+    best = np.full(len(grid_us), -1, dtype=np.int64)
+    best_count = np.zeros(len(grid_us), dtype=np.int64)
+    for state in np.unique(states):
+        positions = np.flatnonzero(states == state)
+        count = np.searchsorted(positions, hi) - np.searchsorted(positions, lo)
+        better = count > best_count
+        best[better] = state
+        best_count[better] = count[better]
+
+    out = np.where(filled, best, out).astype(states.dtype)
+    codes[filled] = CODE_MODE
+    return out, codes
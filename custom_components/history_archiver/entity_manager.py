@@ -1,13 +1,30 @@
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Any
 
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.device_registry import async_get as async_get_device_registry
-from homeassistant.helpers.entity_registry import async_get as async_get_entity_registry
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers.device_registry import (
+    EVENT_DEVICE_REGISTRY_UPDATED,
+    async_get as async_get_device_registry,
+)
+from homeassistant.helpers.entity_registry import (
+    EVENT_ENTITY_REGISTRY_UPDATED,
+    async_get as async_get_entity_registry,
+)
 
-from .const import METADATA_FIELDS
+from .const import (
+    DEFAULT_HEARTBEAT_SECONDS,
+    ENTITY_TREE_PAGE_SIZE,
+    MAX_STATE_CODES,
+    METADATA_FIELDS,
+    STATS_MODE_CHANGE,
+    STATS_MODE_RAW,
+    SUPPORTED_STATS_MODES,
+)
 from .database import Database
+from .entity_tree import EntityTreeIndex
+from .ingest_stats import SAMPLE_VALUE_BYTES, STATE_CODE_BYTES, IngestStats
+from .sample_buffer import SampleBuffer
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -15,9 +32,121 @@ _LOGGER = logging.getLogger(__name__)
 class EntityManager:
     """Tracks entities, their metadata, and metadata selection."""
 
-    def __init__(self, hass: HomeAssistant, db: Database) -> None:
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        db: Database,
+        sample_buffer: SampleBuffer | None = None,
+        stats: IngestStats | None = None,
+    ) -> None:
         self._hass = hass
         self._db = db
+        self._sample_buffer = sample_buffer
+        self._stats = stats
+        # entity_id -> (change_epsilon, heartbeat) for change-only entities
+        self._change_only: dict[str, tuple[float, timedelta]] = {}
+        # entity_id -> (ts, value) of the last stored sample, change-only entities
+        self._last_stored: dict[str, tuple[datetime, float]] = {}
+        # entity_id -> (ts, code) of the last stored state, change-only entities
+        self._last_stored_state: dict[str, tuple[datetime, int]] = {}
+        # entity_id -> {state text: code}, mirrors state_values
+        self._state_codes: dict[str, dict[str, int]] = {}
+        # (entity_id, state) whose code is reserved but not yet in state_values
+        self._unsaved_states: set[tuple[str, str]] = set()
+        # Entities whose dictionary reached MAX_STATE_CODES, logged once
+        self._state_codes_full: set[str] = set()
+        self._loaded = False
+        self._tree = EntityTreeIndex()
+        self._unsub: list = []
+
+    async def async_start(self) -> None:
+        """Keep the cached entity tree in step with the registries."""
+        for event_type in (EVENT_ENTITY_REGISTRY_UPDATED, EVENT_DEVICE_REGISTRY_UPDATED):
+            self._unsub.append(
+                self._hass.bus.async_listen(event_type, self._handle_registry_event)
+            )
+
+    async def async_stop(self) -> None:
+        for unsub in self._unsub:
+            unsub()
+        self._unsub = []
+
+    @callback
+    def _handle_registry_event(self, event: Event) -> None:
+        self._tree.invalidate()
+
+    async def async_load(self) -> None:
+        """Load per-entity storage modes and interned state values."""
+        rows = await self._db.async_fetchall(
+            """
+            SELECT entity_id, change_epsilon, heartbeat_seconds
+            FROM entities
+            WHERE stats_mode = ?
+            """,
+            (STATS_MODE_CHANGE,),
+        )
+        self._change_only = {
+            entity_id: (
+                float(epsilon or 0.0),
+                timedelta(seconds=heartbeat or DEFAULT_HEARTBEAT_SECONDS),
+            )
+            for entity_id, epsilon, heartbeat in rows
+        }
+        self._last_stored = {}
+        self._last_stored_state = {}
+
+        self._state_codes = {}
+        self._unsaved_states = set()
+        for entity_id, code, value in await self._db.async_fetchall(
+            "SELECT entity_id, code, value FROM state_values"
+        ):
+            self._state_codes.setdefault(entity_id, {})[value] = code
+        self._loaded = True
+
+    @callback
+    def async_invalidate(self) -> None:
+        """Reload cached settings on next use, e.g. after a DB restore."""
+        self._loaded = False
+        self._tree.invalidate()
+
+    async def async_set_storage_mode(
+        self,
+        entity_id: str,
+        mode: str,
+        change_epsilon: float = 0.0,
+        heartbeat_seconds: int | None = None,
+    ) -> None:
+        """Store every sample ("raw") or only changes plus a heartbeat ("change")."""
+        if mode not in SUPPORTED_STATS_MODES:
+            raise ValueError(f"Unsupported storage mode: {mode}")
+        if change_epsilon < 0:
+            raise ValueError("change_epsilon must not be negative")
+        if heartbeat_seconds is not None and heartbeat_seconds < 1:
+            raise ValueError("heartbeat_seconds must be positive")
+
+        await self._db.async_execute(
+            """
+            UPDATE entities
+            SET stats_mode = ?, change_epsilon = ?, heartbeat_seconds = ?, updated_at = ?
+            WHERE entity_id = ?
+            """,
+            (
+                mode,
+                change_epsilon,
+                heartbeat_seconds,
+                datetime.utcnow().isoformat(),
+                entity_id,
+            ),
+        )
+        self._last_stored.pop(entity_id, None)
+        self._last_stored_state.pop(entity_id, None)
+        if mode == STATS_MODE_CHANGE:
+            self._change_only[entity_id] = (
+                change_epsilon,
+                timedelta(seconds=heartbeat_seconds or DEFAULT_HEARTBEAT_SECONDS),
+            )
+        else:
+            self._change_only.pop(entity_id, None)
 
     async def async_sync_entities(self) -> None:
         """Sync entities from HA registries into our DB."""
@@ -41,7 +170,7 @@ class EntityManager:
                     INSERT INTO entities (entity_id, device_id, area_id, stats_mode, created_at, updated_at)
                     VALUES (?, ?, ?, ?, ?, ?)
                     """,
-                    (entity_id, device_id, area_id, "raw", now, now),
+                    (entity_id, device_id, area_id, STATS_MODE_RAW, now, now),
                 )
             else:
                 await self._db.async_execute(
@@ -63,55 +192,44 @@ class EntityManager:
                     (entity_id, field),
                 )
 
+    async def _async_ensure_tree(self) -> None:
+        while not self._tree.valid:
+            generation = self._tree.generation
+            rows = await self._db.async_fetchall(
+                """
+                SELECT entity_id, field_name
+                FROM entity_metadata_selection
+                WHERE selected = 1
+                """
+            )
+            if generation != self._tree.generation:
+                # Changed while we were reading; start over
+                continue
+            selected: dict[str, set[str]] = {}
+            for entity_id, field_name in rows:
+                selected.setdefault(entity_id, set()).add(field_name)
+            self._tree.build(
+                async_get_entity_registry(self._hass),
+                async_get_device_registry(self._hass),
+                selected,
+            )
+
     async def async_get_entity_tree(self) -> dict[str, Any]:
         """Return entities grouped by device for UI."""
-        dev_reg = async_get_device_registry(self._hass)
-        ent_reg = async_get_entity_registry(self._hass)
+        await self._async_ensure_tree()
+        return self._tree.as_tree()
 
-        rows = await self._db.async_fetchall(
-            """
-            SELECT e.entity_id, e.device_id, e.area_id,
-                   ms.field_name, ms.selected
-            FROM entities e
-            LEFT JOIN entity_metadata_selection ms
-                ON e.entity_id = ms.entity_id
-            ORDER BY e.entity_id, ms.field_name
-            """
-        )
-
-        tree: dict[str, Any] = {}
-
-        # Build metadata selection map
-        meta_map: dict[str, dict[str, bool]] = {}
-        for entity_id, device_id, area_id, field_name, selected in rows:
-            meta_map.setdefault(entity_id, {})[field_name] = bool(selected)
-
-        for entity in ent_reg.entities.values():
-            entity_id = entity.entity_id
-            device_id = entity.device_id
-            dev = dev_reg.devices.get(device_id) if device_id else None
-
-            device_key = device_id or f"no_device::{entity_id}"
-
-            if device_key not in tree:
-                tree[device_key] = {
-                    "device_id": device_id,
-                    "device_name": dev.name if dev else "Unassigned device",
-                    "manufacturer": dev.manufacturer if dev else None,
-                    "model": dev.model if dev else None,
-                    "entities": [],
-                }
-
-            tree[device_key]["entities"].append(
-                {
-                    "entity_id": entity_id,
-                    "friendly_name": entity.original_name or entity_id,
-                    "domain": entity.domain,
-                    "selected_metadata": meta_map.get(entity_id, {}),
-                }
-            )
-
-        return tree
+    async def async_query_entity_tree(
+        self,
+        device_id: str | None = None,
+        domain: str | None = None,
+        search: str | None = None,
+        offset: int = 0,
+        limit: int | None = ENTITY_TREE_PAGE_SIZE,
+    ) -> dict[str, Any]:
+        """Return one page of the entity tree, filtered by device, domain and search text."""
+        await self._async_ensure_tree()
+        return self._tree.query(device_id, domain, search, offset, limit)
 
     async def async_set_metadata_selection(
         self, entity_id: str, field_name: str, selected: bool
@@ -125,13 +243,104 @@ class EntityManager:
             """,
             (entity_id, field_name, int(selected)),
         )
+        if self._tree.valid:
+            self._tree.set_selection(entity_id, field_name, selected)
+        else:
+            # A rebuild may be reading the old selection right now
+            self._tree.invalidate()
+
+    def _should_store(self, entity_id: str, now: datetime, value: float) -> bool:
+        change_only = self._change_only.get(entity_id)
+        if change_only is None:
+            return True
+        last = self._last_stored.get(entity_id)
+        if last is None:
+            return True
+        epsilon, heartbeat = change_only
+        last_ts, last_value = last
+        return abs(value - last_value) > epsilon or now - last_ts >= heartbeat
 
     async def async_record_sample(self, entity_id: str, value: float) -> None:
-        now = datetime.utcnow().isoformat()
+        if not self._loaded:
+            await self.async_load()
+        now = datetime.utcnow()
+        ts = now.isoformat()
+        store = self._should_store(entity_id, now, value)
+        if self._stats is not None:
+            self._stats.record(entity_id, now, ts, value, store, SAMPLE_VALUE_BYTES)
+        if not store:
+            return
         await self._db.async_execute(
             """
-            INSERT INTO state_samples (entity_id, ts, value, created_at)
-            VALUES (?, ?, ?, ?)
+            INSERT OR IGNORE INTO state_samples (entity_id, ts, value)
+            VALUES (?, ?, ?)
             """,
-            (entity_id, now, value, now),
+            (entity_id, ts, value),
+        )
+        if entity_id in self._change_only:
+            self._last_stored[entity_id] = (now, value)
+        if self._sample_buffer is not None:
+            self._sample_buffer.append(entity_id, now, value)
+
+    async def async_record_state(self, entity_id: str, state: str) -> None:
+        """Store a non-numeric state as a code from the entity's value dictionary."""
+        if not self._loaded:
+            await self.async_load()
+        now = datetime.utcnow()
+
+        codes = self._state_codes.setdefault(entity_id, {})
+        code = codes.get(state)
+        statements: list[tuple[str, Any]] = []
+        if code is None:
+            if len(codes) >= MAX_STATE_CODES:
+                if entity_id not in self._state_codes_full:
+                    self._state_codes_full.add(entity_id)
+                    _LOGGER.warning(
+                        "%s has more than %s distinct states, likely free text or a "
+                        "timestamp; its new states are not recorded",
+                        entity_id,
+                        MAX_STATE_CODES,
+                    )
+                return
+            # Reserved before awaiting the write, so overlapping calls agree on it
+            code = codes[state] = len(codes)
+            self._unsaved_states.add((entity_id, state))
+        if (entity_id, state) in self._unsaved_states:
+            statements.append(
+                (
+                    """
+                    INSERT OR IGNORE INTO state_values (entity_id, code, value)
+                    VALUES (?, ?, ?)
+                    """,
+                    (entity_id, code, state),
+                )
+            )
+
+        change_only = self._change_only.get(entity_id)
+        last = self._last_stored_state.get(entity_id)
+        store = not (
+            change_only is not None
+            and last is not None
+            and last[1] == code
+            and now - last[0] < change_only[1]
+        )
+        ts = now.isoformat()
+        if self._stats is not None:
+            self._stats.record(entity_id, now, ts, code, store, STATE_CODE_BYTES)
+        if not store:
+            return
+
+        statements.append(
+            (
+                """
+                INSERT OR IGNORE INTO state_coded_samples (entity_id, ts, code)
+                VALUES (?, ?, ?)
+                """,
+                (entity_id, ts, code),
+            )
         )
+        await self._db.async_execute_batch(statements)
+        # A failed write keeps the reservation and retries with the next sample
+        self._unsaved_states.discard((entity_id, state))
+        if change_only is not None:
+            self._last_stored_state[entity_id] = (now, code)
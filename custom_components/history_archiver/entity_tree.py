@@ -0,0 +1,178 @@
+"""In-memory index of the device/entity tree shown in the UI."""
+
+import re
+from bisect import bisect_left
+from typing import Any
+
+from .const import METADATA_FIELDS
+
+_TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+
+
+def _tokens(*texts: str | None) -> set[str]:
+    tokens: set[str] = set()
+    for text in texts:
+        if text:
+            tokens.update(token for token in _TOKEN_SPLIT.split(text.lower()) if token)
+    return tokens
+
+
+class EntityTreeIndex:
+    """Prebuilt device/entity tree with domain, device and token indexes.
+
+    The tree is rebuilt lazily after ``invalidate``; metadata selection
+    changes are applied in place with ``set_selection``.
+    """
+
+    def __init__(self) -> None:
+        self.valid = False
+        # Bumped on every invalidation so a rebuild racing a change is redone
+        self.generation = 0
+        self._devices: dict[str, dict[str, Any]] = {}
+        self._device_order: list[str] = []
+        self._entities: dict[str, dict[str, Any]] = {}
+        self._entity_device: dict[str, str] = {}
+        self._by_domain: dict[str, set[str]] = {}
+        self._sorted_tokens: list[str] = []
+        self._by_token: dict[str, set[str]] = {}
+
+    def invalidate(self) -> None:
+        self.valid = False
+        self.generation += 1
+
+    def build(self, ent_reg, dev_reg, selected: dict[str, set[str]]) -> None:
+        """Index every registry entity; ``selected`` maps entity_id -> selected fields."""
+        devices: dict[str, dict[str, Any]] = {}
+        entities: dict[str, dict[str, Any]] = {}
+        entity_device: dict[str, str] = {}
+        by_domain: dict[str, set[str]] = {}
+        by_token: dict[str, set[str]] = {}
+
+        for entity in ent_reg.entities.values():
+            entity_id = entity.entity_id
+            device_id = entity.device_id
+            dev = dev_reg.devices.get(device_id) if device_id else None
+            device_key = device_id or f"no_device::{entity_id}"
+
+            if device_key not in devices:
+                devices[device_key] = {
+                    "device_id": device_id,
+                    "device_name": dev.name if dev else "Unassigned device",
+                    "manufacturer": dev.manufacturer if dev else None,
+                    "model": dev.model if dev else None,
+                    "entities": [],
+                }
+
+            fields = selected.get(entity_id, ())
+            node = {
+                "entity_id": entity_id,
+                "friendly_name": entity.original_name or entity_id,
+                "domain": entity.domain,
+                "selected_metadata": {field: field in fields for field in METADATA_FIELDS},
+            }
+            devices[device_key]["entities"].append(node)
+            entities[entity_id] = node
+            entity_device[entity_id] = device_key
+            by_domain.setdefault(entity.domain, set()).add(entity_id)
+
+            for token in _tokens(
+                entity_id,
+                entity.original_name,
+                dev.name if dev else None,
+                dev.manufacturer if dev else None,
+                dev.model if dev else None,
+            ):
+                by_token.setdefault(token, set()).add(entity_id)
+
+        for device in devices.values():
+            device["entities"].sort(key=lambda node: node["entity_id"])
+
+        self._devices = devices
+        self._device_order = sorted(
+            devices, key=lambda key: ((devices[key]["device_name"] or "").lower(), key)
+        )
+        self._entities = entities
+        self._entity_device = entity_device
+        self._by_domain = by_domain
+        self._by_token = by_token
+        self._sorted_tokens = sorted(by_token)
+        self.valid = True
+
+    def set_selection(self, entity_id: str, field_name: str, selected: bool) -> None:
+        node = self._entities.get(entity_id)
+        if node is not None:
+            node["selected_metadata"][field_name] = selected
+
+    def _search(self, text: str) -> set[str]:
+        """Entities matching every term of ``text`` as a token prefix."""
+        matches: set[str] | None = None
+        for term in _tokens(text):
+            found: set[str] = set()
+            index = bisect_left(self._sorted_tokens, term)
+            while index < len(self._sorted_tokens) and self._sorted_tokens[index].startswith(term):
+                found |= self._by_token[self._sorted_tokens[index]]
+                index += 1
+            matches = found if matches is None else matches & found
+            if not matches:
+                return set()
+        return matches if matches is not None else set(self._entities)
+
+    @staticmethod
+    def _copy_device(device: dict[str, Any], entities: list[dict[str, Any]]) -> dict[str, Any]:
+        return {
+            **device,
+            "entities": [
+                {**node, "selected_metadata": dict(node["selected_metadata"])}
+                for node in entities
+            ],
+        }
+
+    def as_tree(self) -> dict[str, Any]:
+        """Return the whole tree keyed by device, as a copy."""
+        return {
+            key: self._copy_device(self._devices[key], self._devices[key]["entities"])
+            for key in self._device_order
+        }
+
+    def query(
+        self,
+        device_id: str | None = None,
+        domain: str | None = None,
+        search: str | None = None,
+        offset: int = 0,
+        limit: int | None = None,
+    ) -> dict[str, Any]:
+        """Return one page of devices whose entities match all given filters."""
+        candidates: set[str] | None = None
+        if domain:
+            candidates = set(self._by_domain.get(domain, ()))
+        if search:
+            found = self._search(search)
+            candidates = found if candidates is None else candidates & found
+
+        if device_id:
+            device_keys = [device_id] if device_id in self._devices else []
+        elif candidates is None:
+            device_keys = self._device_order
+        else:
+            keys = {self._entity_device[entity_id] for entity_id in candidates}
+            device_keys = [key for key in self._device_order if key in keys]
+
+        matched: list[tuple[str, list[dict[str, Any]]]] = []
+        for key in device_keys:
+            nodes = self._devices[key]["entities"]
+            if candidates is not None:
+                nodes = [node for node in nodes if node["entity_id"] in candidates]
+            if nodes:
+                matched.append((key, nodes))
+
+        end = None if limit is None else offset + limit
+        return {
+            "total": len(matched),
+            "offset": offset,
+            "limit": limit,
+            "devices": [
+                {"device_key": key, **self._copy_device(self._devices[key], nodes)}
+                for key, nodes in matched[offset:end]
+            ],
+        }
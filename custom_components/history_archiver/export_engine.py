@@ -1,37 +1,152 @@
-import csv
-import json
+import asyncio
 import logging
 import os
-from datetime import datetime
-from typing import Any
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator
 
-import pandas as pd
+import numpy as np
 import pyarrow as pa
 
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.device_registry import async_get as async_get_device_registry
 from homeassistant.helpers.entity_registry import async_get as async_get_entity_registry
 
+from .archive_tier import ArchiveTier
 from .const import (
-    DATA_ACCURACY_MEAN,
-    DATA_ACCURACY_RAW,
-    DATA_ACCURACY_WEIGHTED_MEAN,
+    DATA_ACCURACY_LEVELS,
+    DEFAULT_EXPORT_MEMORY_MB,
+    DEFAULT_HEARTBEAT_SECONDS,
+    DOMAIN,
+    EXPORT_CHUNK_ROWS,
+    EXPORT_LAYOUT_CONSOLIDATED,
+    EXPORT_LAYOUT_PER_ENTITY,
+    EXPORT_LAYOUT_WIDE,
+    EXPORT_PARALLEL_WORKERS,
+    EXPORT_SPILL_FOLDER,
+    EXPORT_SPLIT_MIN_DAYS,
+    EXPORT_SPLIT_MONTHLY_DAYS,
     METADATA_FIELDS,
+    SUPPORTED_EXPORT_COMPRESSIONS,
     SUPPORTED_EXPORT_FORMATS,
+    SUPPORTED_EXPORT_LAYOUTS,
+    SUPPORTED_STATE_AGGREGATIONS,
+    STATE_AGGREGATION_LAST,
+    STATS_MODE_CHANGE,
+    WIDE_ACCURACY_SUFFIX,
 )
 from .database import Database
+from .downsampling import (
+    build_grid,
+    downsample,
+    downsample_states,
+    parse_iso_us,
+    to_epoch_us,
+)
+from .export_memory import ExportMemoryPlan, PeakRssMonitor, SpillArea, chunk_rows
+from .export_planner import ExportJob, plan_units
+from .export_writers import ExportWriter, open_writer
+from .partial_store import PartialResult, PartialResultStore
+from .sample_buffer import SampleBuffer
 
 _LOGGER = logging.getLogger(__name__)
 
+_ACCURACY_DICTIONARY = pa.array(DATA_ACCURACY_LEVELS, type=pa.string())
+_EPOCH = datetime(1970, 1, 1)
+
+EXPORT_SCHEMA = pa.schema(
+    [
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("value", pa.float64()),
+        ("data_accuracy", pa.dictionary(pa.int8(), pa.string())),
+    ]
+)
+
+# Non-numeric entities export their decoded state instead of a value.
+STATE_EXPORT_SCHEMA = pa.schema(
+    [
+        EXPORT_SCHEMA.field("timestamp"),
+        ("state", pa.string()),
+        EXPORT_SCHEMA.field("data_accuracy"),
+    ]
+)
+
+# entity_id and state stay plain strings: IPC files cannot swap dictionaries
+# between batches, and Parquet dictionary-encodes the columns on its own.
+CONSOLIDATED_SCHEMA = pa.schema(
+    [
+        ("entity_id", pa.string()),
+        EXPORT_SCHEMA.field("timestamp"),
+        EXPORT_SCHEMA.field("value"),
+        STATE_EXPORT_SCHEMA.field("state"),
+        EXPORT_SCHEMA.field("data_accuracy"),
+    ]
+)
+
+
+def _from_epoch_us(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def _write_ipc(path: str, table: pa.Table) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def _read_ipc(path: str) -> pa.Table:
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def _interior_part(
+    sample_us: np.ndarray, values: np.ndarray, grid_us: np.ndarray, hold: bool
+) -> PartialResult:
+    """Downsample the grid points between the first and last sample of a sub-range."""
+    if not len(sample_us):
+        empty = np.empty(0, dtype=np.int64)
+        return PartialResult(
+            None, None, None, empty, empty.astype(np.float64), empty.astype(np.int8)
+        )
+    lo = np.searchsorted(grid_us, sample_us[0], side="left")
+    hi = np.searchsorted(grid_us, sample_us[-1], side="right")
+    interior = grid_us[lo:hi]
+    part_values, part_codes = downsample(sample_us, values, interior, hold=hold)
+    return PartialResult(
+        (int(sample_us[0]), float(values[0])),
+        (int(sample_us[1]), float(values[1])) if len(sample_us) > 1 else None,
+        (int(sample_us[-1]), float(values[-1])),
+        interior,
+        part_values,
+        part_codes,
+    )
+
 
 class ExportEngine:
     """Handles downsampling and multi-format export."""
 
-    def __init__(self, hass: HomeAssistant, db: Database, export_path: str) -> None:
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        db: Database,
+        export_path: str,
+        archive: ArchiveTier | None = None,
+        sample_buffer: SampleBuffer | None = None,
+        partials: PartialResultStore | None = None,
+        memory_budget_mb: int = DEFAULT_EXPORT_MEMORY_MB,
+    ) -> None:
         self._hass = hass
         self._db = db
+        self._archive = archive
+        self._sample_buffer = sample_buffer
+        self._partials = partials
+        self._memory_budget = memory_budget_mb * 1024 * 1024
+        self._spill = SpillArea(hass.config.path(DOMAIN, EXPORT_SPILL_FOLDER))
         self._export_path = hass.config.path(export_path)
         os.makedirs(self._export_path, exist_ok=True)
+        self._spill.clear()
 
     async def async_export(
         self,
@@ -41,123 +156,1140 @@ class ExportEngine:
         resolution_seconds: int,
         formats: list[str],
         label: str,
+        compression: str | None = None,
+        layout: str = EXPORT_LAYOUT_PER_ENTITY,
+        state_aggregation: str = STATE_AGGREGATION_LAST,
     ) -> dict[str, Any]:
-        """Export data for given entities and time range."""
+        """Export data for given entities and time range.
+
+        ``compression`` (gzip/zstd) applies to the csv, ndjson and json formats.
+        ``state_aggregation`` (last/mode) downsamples non-numeric entities.
+        """
+        formats = self.validate_options(formats, compression, layout, state_aggregation)
+        plan = self._memory_plan(
+            start_ts,
+            end_ts,
+            resolution_seconds,
+            len(entities) if layout == EXPORT_LAYOUT_WIDE else 1,
+        )
+
+        async with PeakRssMonitor(self._hass) as rss:
+            if layout == EXPORT_LAYOUT_CONSOLIDATED:
+                results = await self._async_export_consolidated(
+                    entities,
+                    start_ts,
+                    end_ts,
+                    resolution_seconds,
+                    formats,
+                    label,
+                    compression,
+                    state_aggregation,
+                    plan,
+                )
+            elif layout == EXPORT_LAYOUT_WIDE:
+                results = await self._async_export_wide(
+                    entities,
+                    start_ts,
+                    end_ts,
+                    resolution_seconds,
+                    formats,
+                    label,
+                    compression,
+                    state_aggregation,
+                    plan,
+                )
+            else:
+                results = {}
+                for entity_id in entities:
+                    paths = await self.async_export_entity(
+                        entity_id,
+                        start_ts,
+                        end_ts,
+                        resolution_seconds,
+                        formats,
+                        label,
+                        compression,
+                        state_aggregation,
+                        plan,
+                    )
+                    if paths is not None:
+                        results[entity_id] = paths
+
+        self._log_memory(label, [plan], rss)
+        return results
+
+    def _memory_plan(
+        self,
+        start_ts: datetime,
+        end_ts: datetime,
+        resolution_seconds: int,
+        entities_held: int = 1,
+    ) -> ExportMemoryPlan:
+        return ExportMemoryPlan(
+            self._memory_budget, start_ts, end_ts, resolution_seconds, entities_held
+        )
+
+    async def _async_spill(self, plan: ExportMemoryPlan, table: pa.Table) -> pa.Table:
+        """Move ``table`` to a memory-mapped file if the plan calls for spilling."""
+        if not plan.spill:
+            return table
+        plan.spilled_tables += 1
+        return await self._hass.async_add_executor_job(self._spill.spill, table)
+
+    def _log_memory(
+        self, label: str, plans: list[ExportMemoryPlan], rss: PeakRssMonitor
+    ) -> None:
+        _LOGGER.info(
+            "Export %s: %s; estimated %.1f MB of a %.0f MB budget, %s tables spilled",
+            label,
+            rss.summary(),
+            sum(plan.estimated_bytes for plan in plans) / 1048576,
+            self._memory_budget / 1048576,
+            sum(plan.spilled_tables for plan in plans),
+        )
+
+    async def async_export_entity(
+        self,
+        entity_id: str,
+        start_ts: datetime,
+        end_ts: datetime,
+        resolution_seconds: int,
+        formats: list[str],
+        label: str,
+        compression: str | None = None,
+        state_aggregation: str = STATE_AGGREGATION_LAST,
+        plan: ExportMemoryPlan | None = None,
+    ) -> dict[str, str] | None:
+        """Write the per-entity files of one entity; None when it has no data."""
+        if plan is None:
+            plan = self._memory_plan(start_ts, end_ts, resolution_seconds)
+        table = await self._async_entity_table(
+            entity_id, start_ts, end_ts, resolution_seconds, state_aggregation
+        )
+        if table is None:
+            return None
+        table = await self._async_spill(plan, table)
+
+        # Metadata block
+        meta = await self._build_metadata_block(
+            entity_id,
+            async_get_device_registry(self._hass),
+            async_get_entity_registry(self._hass),
+        )
+
+        # Write formats
+        base_name = f"{label}_{entity_id.replace('.', '_')}_{start_ts.date()}_{end_ts.date()}"
+        return await self._hass.async_add_executor_job(
+            self._write_files,
+            formats,
+            base_name,
+            table,
+            meta,
+            compression,
+            plan.chunk_rows(table.num_columns),
+        )
+
+    async def async_stage_entity(
+        self,
+        entity_id: str,
+        start_ts: datetime,
+        end_ts: datetime,
+        resolution_seconds: int,
+        state_aggregation: str,
+        path: str,
+    ) -> bool:
+        """Downsample one entity into an Arrow IPC file for ``async_write_staged``.
+
+        Returns False, writing nothing, when the entity has no data.
+        """
+        table = await self._async_entity_table(
+            entity_id, start_ts, end_ts, resolution_seconds, state_aggregation
+        )
+        if table is None:
+            return False
+        await self._hass.async_add_executor_job(_write_ipc, path, table)
+        return True
+
+    async def async_write_staged(
+        self,
+        layout: str,
+        staged: dict[str, str],
+        start_ts: datetime,
+        end_ts: datetime,
+        formats: list[str],
+        label: str,
+        compression: str | None = None,
+    ) -> dict[str, Any]:
+        """Assemble a consolidated or wide export from staged entity tables.
+
+        ``staged`` maps entity_id -> staged file, in the requested entity order.
+        """
+        dev_reg = async_get_device_registry(self._hass)
+        ent_reg = async_get_entity_registry(self._hass)
+        if not staged:
+            return {}
+
+        if layout == EXPORT_LAYOUT_WIDE:
+            tables = {
+                entity_id: await self._hass.async_add_executor_job(_read_ipc, path)
+                for entity_id, path in staged.items()
+            }
+            meta: list[str] = []
+            for entity_id in staged:
+                meta.extend(await self._build_metadata_block(entity_id, dev_reg, ent_reg))
+            base_name = f"{label}_wide_{start_ts.date()}_{end_ts.date()}"
+            table = self._wide_table(tables, list(staged))
+            paths = await self._hass.async_add_executor_job(
+                self._write_files,
+                formats,
+                base_name,
+                table,
+                meta,
+                compression,
+                chunk_rows(self._memory_budget, table.num_columns),
+            )
+            return {"wide": paths}
+
+        entities = sorted(staged)
+        meta = []
+        for entity_id in entities:
+            meta.extend(await self._build_metadata_block(entity_id, dev_reg, ent_reg))
+        base_path = os.path.join(
+            self._export_path, f"{label}_consolidated_{start_ts.date()}_{end_ts.date()}"
+        )
+        writers = await self._hass.async_add_executor_job(
+            self._open_writers, formats, base_path, CONSOLIDATED_SCHEMA, meta, compression
+        )
+        rows = chunk_rows(self._memory_budget, len(CONSOLIDATED_SCHEMA))
+        try:
+            for entity_id in entities:
+                table = await self._hass.async_add_executor_job(_read_ipc, staged[entity_id])
+                keyed = self._with_entity_column(table, entity_id)
+                await self._hass.async_add_executor_job(
+                    self._write_to_all, writers, keyed, rows
+                )
+        finally:
+            await self._hass.async_add_executor_job(self._close_writers, writers)
+        return {"consolidated": {fmt: writer.path for fmt, writer in writers.items()}}
+
+    @staticmethod
+    def _wide_table(tables: dict[str, pa.Table], entities: list[str]) -> pa.Table:
+        """Join per-entity tables on their shared grid into one wide table."""
+        names = ["timestamp"]
+        arrays = [tables[entities[0]].column("timestamp")]
+        for entity_id in entities:
+            table = tables[entity_id]
+            series = "value" if "value" in table.schema.names else "state"
+            names.extend([entity_id, f"{entity_id}{WIDE_ACCURACY_SUFFIX}"])
+            arrays.extend([table.column(series), table.column("data_accuracy")])
+        return pa.Table.from_arrays(arrays, names=names)
+
+    @staticmethod
+    def validate_options(
+        formats: list[str],
+        compression: str | None,
+        layout: str,
+        state_aggregation: str,
+    ) -> list[str]:
+        """Return the supported formats, raising ValueError on invalid options."""
         formats = [f for f in formats if f in SUPPORTED_EXPORT_FORMATS]
         if not formats:
             raise ValueError("No valid export formats selected")
+        if compression is not None and compression not in SUPPORTED_EXPORT_COMPRESSIONS:
+            raise ValueError(f"Unsupported compression: {compression}")
+        if layout not in SUPPORTED_EXPORT_LAYOUTS:
+            raise ValueError(f"Unsupported export layout: {layout}")
+        if state_aggregation not in SUPPORTED_STATE_AGGREGATIONS:
+            raise ValueError(f"Unsupported state aggregation: {state_aggregation}")
+        return formats
+
+    async def async_export_batch(self, jobs: list[ExportJob]) -> list[dict[str, Any]]:
+        """Run several exports together, computing each shared series once.
+
+        Every distinct (entity, range, resolution) is fetched and downsampled a
+        single time and fanned out to the writers of all jobs that request it.
+        Returns one result per job, shaped like ``async_export``'s.
+        """
+        formats = [
+            self.validate_options(
+                job.formats, job.compression, job.layout, job.state_aggregation
+            )
+            for job in jobs
+        ]
+        plans = [
+            self._memory_plan(
+                job.start_ts,
+                job.end_ts,
+                job.resolution_seconds,
+                len(job.entities) if job.layout == EXPORT_LAYOUT_WIDE else 1,
+            )
+            for job in jobs
+        ]
+        units = plan_units(jobs)
+        _LOGGER.debug(
+            "Export batch of %s jobs needs %s of %s requested series",
+            len(jobs),
+            len(units),
+            sum(len(unit.jobs) for unit in units),
+        )
 
         dev_reg = async_get_device_registry(self._hass)
         ent_reg = async_get_entity_registry(self._hass)
+        metadata: dict[str, list[str]] = {}
 
-        start_iso = start_ts.isoformat()
-        end_iso = end_ts.isoformat()
+        async def _async_metadata(entity_id: str) -> list[str]:
+            if entity_id not in metadata:
+                metadata[entity_id] = await self._build_metadata_block(
+                    entity_id, dev_reg, ent_reg
+                )
+            return metadata[entity_id]
+
+        async with PeakRssMonitor(self._hass) as rss:
+            results: list[dict[str, Any]] = [{} for _ in jobs]
+            consolidated: dict[int, dict[str, ExportWriter]] = {}
+            wide: dict[int, dict[str, pa.Table]] = {}
+            try:
+                for index, job in enumerate(jobs):
+                    if job.layout == EXPORT_LAYOUT_CONSOLIDATED:
+                        meta: list[str] = []
+                        for entity_id in sorted(job.entities):
+                            meta.extend(await _async_metadata(entity_id))
+                        base_path = os.path.join(
+                            self._export_path,
+                            f"{job.label}_consolidated_{job.start_ts.date()}_{job.end_ts.date()}",
+                        )
+                        consolidated[index] = await self._hass.async_add_executor_job(
+                            self._open_writers,
+                            formats[index],
+                            base_path,
+                            CONSOLIDATED_SCHEMA,
+                            meta,
+                            job.compression,
+                        )
+                    elif job.layout == EXPORT_LAYOUT_WIDE:
+                        wide[index] = {}
+
+                for unit in units:
+                    table = await self._async_entity_table(
+                        unit.entity_id,
+                        unit.start_ts,
+                        unit.end_ts,
+                        unit.resolution_seconds,
+                        unit.state_aggregation,
+                    )
+                    if table is None:
+                        continue
+                    # Spill once if any job sharing this series needs it
+                    spilling = next(
+                        (plans[index] for index in unit.jobs if plans[index].spill), None
+                    )
+                    if spilling is not None:
+                        table = await self._async_spill(spilling, table)
+                    for index in unit.jobs:
+                        job = jobs[index]
+                        if index in consolidated:
+                            keyed = self._with_entity_column(table, unit.entity_id)
+                            await self._hass.async_add_executor_job(
+                                self._write_to_all,
+                                consolidated[index],
+                                keyed,
+                                plans[index].chunk_rows(len(CONSOLIDATED_SCHEMA)),
+                            )
+                        elif index in wide:
+                            wide[index][unit.entity_id] = table
+                        else:
+                            base_name = (
+                                f"{job.label}_{unit.entity_id.replace('.', '_')}"
+                                f"_{job.start_ts.date()}_{job.end_ts.date()}"
+                            )
+                            paths = await self._hass.async_add_executor_job(
+                                self._write_files,
+                                formats[index],
+                                base_name,
+                                table,
+                                await _async_metadata(unit.entity_id),
+                                job.compression,
+                                plans[index].chunk_rows(table.num_columns),
+                            )
+                            results[index][unit.entity_id] = paths
+            finally:
+                for writers in consolidated.values():
+                    await self._hass.async_add_executor_job(self._close_writers, writers)
+
+            for index, writers in consolidated.items():
+                results[index]["consolidated"] = {
+                    fmt: writer.path for fmt, writer in writers.items()
+                }
+
+            for index, tables in wide.items():
+                job = jobs[index]
+                entities = [entity_id for entity_id in job.entities if entity_id in tables]
+                if not entities:
+                    continue
+                meta = []
+                for entity_id in entities:
+                    meta.extend(await _async_metadata(entity_id))
+                base_name = f"{job.label}_wide_{job.start_ts.date()}_{job.end_ts.date()}"
+                table = self._wide_table(tables, entities)
+                results[index] = {
+                    "wide": await self._hass.async_add_executor_job(
+                        self._write_files,
+                        formats[index],
+                        base_name,
+                        table,
+                        meta,
+                        job.compression,
+                        plans[index].chunk_rows(table.num_columns),
+                    )
+                }
+
+        self._log_memory(f"batch of {len(jobs)} jobs", plans, rss)
+        return results
+
+    async def _async_export_consolidated(
+        self,
+        entities: list[str],
+        start_ts: datetime,
+        end_ts: datetime,
+        resolution_seconds: int,
+        formats: list[str],
+        label: str,
+        compression: str | None,
+        state_aggregation: str,
+        plan: ExportMemoryPlan,
+    ) -> dict[str, Any]:
+        """Write every entity into one file per format, sorted by entity."""
+        dev_reg = async_get_device_registry(self._hass)
+        ent_reg = async_get_entity_registry(self._hass)
+        entities = sorted(dict.fromkeys(entities))
+
+        meta: list[str] = []
+        for entity_id in entities:
+            meta.extend(await self._build_metadata_block(entity_id, dev_reg, ent_reg))
+
+        base_path = os.path.join(
+            self._export_path, f"{label}_consolidated_{start_ts.date()}_{end_ts.date()}"
+        )
+        writers = await self._hass.async_add_executor_job(
+            self._open_writers, formats, base_path, CONSOLIDATED_SCHEMA, meta, compression
+        )
 
         results: dict[str, Any] = {}
+        rows = plan.chunk_rows(len(CONSOLIDATED_SCHEMA))
+        try:
+            for entity_id in entities:
+                table = await self._async_entity_table(
+                    entity_id, start_ts, end_ts, resolution_seconds, state_aggregation
+                )
+                if table is None:
+                    continue
+                table = await self._async_spill(plan, table)
+                keyed = self._with_entity_column(table, entity_id)
+                await self._hass.async_add_executor_job(
+                    self._write_to_all, writers, keyed, rows
+                )
+        finally:
+            await self._hass.async_add_executor_job(self._close_writers, writers)
+
+        results["consolidated"] = {fmt: writer.path for fmt, writer in writers.items()}
+        return results
 
+    async def _async_export_wide(
+        self,
+        entities: list[str],
+        start_ts: datetime,
+        end_ts: datetime,
+        resolution_seconds: int,
+        formats: list[str],
+        label: str,
+        compression: str | None,
+        state_aggregation: str,
+        plan: ExportMemoryPlan,
+    ) -> dict[str, Any]:
+        """Write all entities as columns of one table on a shared grid.
+
+        Numeric entities become float columns, non-numeric ones string columns.
+        Over the memory budget, entities are downsampled one at a time and
+        spilled instead of fetching every series at once.
+        """
+        dev_reg = async_get_device_registry(self._hass)
+        ent_reg = async_get_entity_registry(self._hass)
+        entities = list(dict.fromkeys(entities))
+        base_name = f"{label}_wide_{start_ts.date()}_{end_ts.date()}"
+
+        if plan.spill:
+            tables: dict[str, pa.Table] = {}
+            meta: list[str] = []
+            for entity_id in entities:
+                table = await self._async_entity_table(
+                    entity_id, start_ts, end_ts, resolution_seconds, state_aggregation
+                )
+                if table is None:
+                    continue
+                tables[entity_id] = await self._async_spill(plan, table)
+                meta.extend(await self._build_metadata_block(entity_id, dev_reg, ent_reg))
+            if not tables:
+                return {}
+            table = self._wide_table(tables, list(tables))
+            paths = await self._hass.async_add_executor_job(
+                self._write_files,
+                formats,
+                base_name,
+                table,
+                meta,
+                compression,
+                plan.chunk_rows(table.num_columns),
+            )
+            return {"wide": paths}
+
+        lookbacks = await self._async_hold_lookbacks(entities)
+        series = await self._async_fetch_many(
+            [entity_id for entity_id in entities if entity_id not in lookbacks],
+            start_ts,
+            end_ts,
+        )
+        if lookbacks:
+            series.update(
+                await self._async_fetch_many(
+                    list(lookbacks), start_ts - max(lookbacks.values()), end_ts
+                )
+            )
+        grid = build_grid(start_ts, end_ts, resolution_seconds)
+
+        names = ["timestamp"]
+        arrays = [pa.array(grid, type=pa.int64()).cast(EXPORT_SCHEMA.field("timestamp").type)]
+        meta: list[str] = []
         for entity_id in entities:
-            # Fetch raw samples
-            rows = await self._db.async_fetchall(
+            sample_us, values = series.get(entity_id, (None, None))
+            if sample_us is not None and len(sample_us):
+                aligned, codes = downsample(
+                    sample_us, values, grid, hold=entity_id in lookbacks
+                )
+                column = pa.array(aligned, type=pa.float64())
+            else:
+                lookback = lookbacks.get(entity_id)
+                states = await self._async_fetch_states(
+                    entity_id, start_ts - lookback if lookback else start_ts, end_ts
+                )
+                if states is None:
+                    continue
+                state_us, state_codes, dictionary = states
+                aligned, codes = downsample_states(
+                    state_us, state_codes, grid, resolution_seconds, state_aggregation
+                )
+                column = dictionary.take(pa.array(aligned))
+            names.append(entity_id)
+            arrays.append(column)
+            names.append(f"{entity_id}{WIDE_ACCURACY_SUFFIX}")
+            arrays.append(
+                pa.DictionaryArray.from_arrays(pa.array(codes), _ACCURACY_DICTIONARY)
+            )
+            meta.extend(await self._build_metadata_block(entity_id, dev_reg, ent_reg))
+
+        if len(names) == 1:
+            return {}
+
+        table = pa.Table.from_arrays(arrays, names=names)
+        paths = await self._hass.async_add_executor_job(
+            self._write_files,
+            formats,
+            base_name,
+            table,
+            meta,
+            compression,
+            plan.chunk_rows(table.num_columns),
+        )
+        return {"wide": paths}
+
+    async def async_iter_consolidated(
+        self,
+        entities: list[str],
+        start_ts: datetime,
+        end_ts: datetime,
+        resolution_seconds: int,
+        state_aggregation: str = STATE_AGGREGATION_LAST,
+        window_rows: int | None = None,
+    ) -> AsyncIterator[pa.RecordBatch]:
+        """Yield the consolidated layout as record batches, for streaming.
+
+        Each entity's grid is downsampled one window of ``window_rows`` points
+        at a time, from that window's samples plus their nearest neighbours,
+        so the values equal a single pass over the range while memory stays
+        bounded by the window. The next window is only computed once the
+        consumer asks for it.
+        """
+        if window_rows is None:
+            window_rows = chunk_rows(self._memory_budget, len(CONSOLIDATED_SCHEMA))
+        for entity_id in sorted(dict.fromkeys(entities)):
+            lookback = (await self._async_hold_lookbacks([entity_id])).get(entity_id)
+            fetch_start = start_ts - lookback if lookback is not None else start_ts
+            if await self._async_has_samples(entity_id, fetch_start, end_ts):
+                windows = self._async_iter_value_windows(
+                    entity_id,
+                    fetch_start,
+                    start_ts,
+                    end_ts,
+                    resolution_seconds,
+                    window_rows,
+                    lookback is not None,
+                )
+            else:
+                windows = self._async_iter_state_windows(
+                    entity_id,
+                    fetch_start,
+                    start_ts,
+                    end_ts,
+                    resolution_seconds,
+                    window_rows,
+                    state_aggregation,
+                )
+            async for table in windows:
+                for batch in self._with_entity_column(table, entity_id).to_batches():
+                    yield batch
+
+    async def _async_has_samples(
+        self, entity_id: str, start_ts: datetime, end_ts: datetime
+    ) -> bool:
+        if self._archive is not None and self._archive.has_data(entity_id, start_ts, end_ts):
+            return True
+        row = await self._db.async_fetchone(
+            f"""
+            SELECT 1 FROM {self._db.read_source("state_samples")}
+            WHERE entity_id = ? AND ts >= ? AND ts <= ?
+            LIMIT 1
+            """,
+            (entity_id, start_ts.isoformat(), end_ts.isoformat()),
+        )
+        return row is not None
+
+    async def _async_iter_value_windows(
+        self,
+        entity_id: str,
+        fetch_start: datetime,
+        start_ts: datetime,
+        end_ts: datetime,
+        resolution_seconds: int,
+        window_rows: int,
+        hold: bool,
+    ) -> AsyncIterator[pa.Table]:
+        step_us = int(resolution_seconds) * 1_000_000
+        window_us = step_us * window_rows
+        stop_us = to_epoch_us(end_ts) + 1
+
+        # Change-only entities are seeded with the value held at the range start
+        prev: tuple[int, float] | None = None
+        if fetch_start < start_ts:
+            lead_in = await self._async_fetch_many(
+                [entity_id], fetch_start, _from_epoch_us(to_epoch_us(start_ts) - 1)
+            )
+            if entity_id in lead_in:
+                lead_us, lead_values = lead_in[entity_id]
+                prev = (int(lead_us[-1]), float(lead_values[-1]))
+
+        pending_us = np.empty(0, dtype=np.int64)
+        pending_values = np.empty(0, dtype=np.float64)
+        fetched_us = lo = to_epoch_us(start_ts)
+        while lo < stop_us:
+            hi = min(lo + window_us, stop_us)
+            # Points near the window end interpolate towards the next two samples
+            while fetched_us < stop_us and (
+                fetched_us < hi or np.count_nonzero(pending_us >= hi) < 2
+            ):
+                upto = min(fetched_us + window_us, stop_us)
+                series = await self._async_fetch_many(
+                    [entity_id], _from_epoch_us(fetched_us), _from_epoch_us(upto - 1)
+                )
+                if entity_id in series:
+                    fetched, values = series[entity_id]
+                    pending_us = np.concatenate([pending_us, fetched])
+                    pending_values = np.concatenate([pending_values, values])
+                fetched_us = upto
+
+            split = int(np.searchsorted(pending_us, hi))
+            known_us = pending_us[: split + 2]
+            known_values = pending_values[: split + 2]
+            if prev is not None:
+                known_us = np.concatenate([[prev[0]], known_us])
+                known_values = np.concatenate([[prev[1]], known_values])
+            if len(known_us):
+                grid = np.arange(lo, hi, step_us, dtype=np.int64)
+                values, codes = await self._hass.async_add_executor_job(
+                    downsample, known_us, known_values, grid, hold
+                )
+                yield self._value_table(grid, values, codes)
+            if split:
+                prev = (int(pending_us[split - 1]), float(pending_values[split - 1]))
+                pending_us = pending_us[split:]
+                pending_values = pending_values[split:]
+            lo = hi
+
+    async def _async_iter_state_windows(
+        self,
+        entity_id: str,
+        fetch_start: datetime,
+        start_ts: datetime,
+        end_ts: datetime,
+        resolution_seconds: int,
+        window_rows: int,
+        state_aggregation: str,
+    ) -> AsyncIterator[pa.Table]:
+        step_us = int(resolution_seconds) * 1_000_000
+        window_us = step_us * window_rows
+        stop_us = to_epoch_us(end_ts) + 1
+        fetch_start_us = to_epoch_us(fetch_start)
+
+        lo = to_epoch_us(start_ts)
+        while lo < stop_us:
+            hi = min(lo + window_us, stop_us)
+            # Mode buckets reach one resolution back from each point
+            lower = _from_epoch_us(max(fetch_start_us, lo - step_us))
+            upper = _from_epoch_us(hi - 1)
+            states = await self._async_fetch_states(entity_id, lower, upper)
+            if states is None:
+                sample_us = np.empty(0, dtype=np.int64)
+                sample_codes = np.empty(0, dtype=np.int32)
+                dictionary = None
+            else:
+                sample_us, sample_codes, dictionary = states
+
+            # The state in effect at the window start, or else the first one
+            # after it, which a single pass holds back to the range start
+            neighbour = await self._db.async_fetchone(
                 """
-                SELECT ts, value FROM state_samples
-                WHERE entity_id = ? AND ts >= ? AND ts <= ?
-                ORDER BY ts
+                SELECT ts, code FROM state_coded_samples
+                WHERE entity_id = ? AND ts >= ? AND ts < ?
+                ORDER BY ts DESC LIMIT 1
                 """,
-                (entity_id, start_iso, end_iso),
+                (entity_id, fetch_start.isoformat(), lower.isoformat()),
             )
-            if not rows:
-                continue
+            if neighbour is not None:
+                sample_us = np.concatenate([parse_iso_us([neighbour[0]]), sample_us])
+                sample_codes = np.concatenate([[neighbour[1]], sample_codes])
+            elif not len(sample_us):
+                neighbour = await self._db.async_fetchone(
+                    """
+                    SELECT ts, code FROM state_coded_samples
+                    WHERE entity_id = ? AND ts > ? AND ts <= ?
+                    ORDER BY ts LIMIT 1
+                    """,
+                    (entity_id, upper.isoformat(), end_ts.isoformat()),
+                )
+                if neighbour is None:
+                    # No states in the range at all
+                    return
+                sample_us = parse_iso_us([neighbour[0]])
+                sample_codes = np.array([neighbour[1]], dtype=np.int32)
 
-            samples = [(datetime.fromisoformat(ts), float(value)) for ts, value in rows]
+            if dictionary is None:
+                values = await self._db.async_fetchall(
+                    "SELECT code, value FROM state_values WHERE entity_id = ? ORDER BY code",
+                    (entity_id,),
+                )
+                dictionary = pa.array([value for _, value in values], type=pa.string())
+            grid = np.arange(lo, hi, step_us, dtype=np.int64)
+            aligned, codes = await self._hass.async_add_executor_job(
+                downsample_states,
+                sample_us,
+                sample_codes.astype(np.int32),
+                grid,
+                resolution_seconds,
+                state_aggregation,
+            )
+            yield pa.Table.from_arrays(
+                [
+                    pa.array(grid, type=pa.int64()).cast(EXPORT_SCHEMA.field("timestamp").type),
+                    dictionary.take(pa.array(aligned)),
+                    pa.DictionaryArray.from_arrays(pa.array(codes), _ACCURACY_DICTIONARY),
+                ],
+                schema=STATE_EXPORT_SCHEMA,
+            )
+            lo = hi
 
-            # Build target timestamps
-            current = start_ts
-            target_points: list[datetime] = []
-            while current <= end_ts:
-                target_points.append(current)
-                current = current + pd.Timedelta(seconds=resolution_seconds)
+    async def _async_fetch_many(
+        self,
+        entities: list[str],
+        start_ts: datetime,
+        end_ts: datetime,
+    ) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+        """Fetch raw samples of many entities with one query.
 
-            # Downsample
-            downsampled = self._downsample(samples, target_points)
+        Returns entity_id -> (epoch microseconds, float64 values), sorted by time.
+        Entities whose range is fully held by the sample buffer skip the database.
+        """
+        series: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        if not entities:
+            return series
+        if self._sample_buffer is not None:
+            for entity_id in entities:
+                buffered = self._sample_buffer.get_range(entity_id, start_ts, end_ts)
+                if buffered is not None:
+                    series[entity_id] = buffered
+            entities = [entity_id for entity_id in entities if entity_id not in series]
+            if not entities:
+                return series
 
-            # Build DataFrame
-            df = pd.DataFrame(
-                [
-                    {
-                        "timestamp": ts.isoformat(),
-                        "value": value,
-                        "data_accuracy": accuracy,
-                    }
-                    for ts, value, accuracy in downsampled
-                ]
+        placeholders = ", ".join("?" for _ in entities)
+        rows = await self._db.async_fetchall(
+            f"""
+            SELECT entity_id, ts, value FROM {self._db.read_source("state_samples")}
+            WHERE entity_id IN ({placeholders}) AND ts >= ? AND ts <= ?
+            ORDER BY entity_id, ts
+            """,
+            (*entities, start_ts.isoformat(), end_ts.isoformat()),
+        )
+
+        if rows:
+            entity_ids, timestamps, values = zip(*rows)
+            sample_us = parse_iso_us(list(timestamps))
+            sample_values = np.array(values, dtype=np.float64)
+            # Rows arrive grouped by entity; split at every change of entity_id
+            bounds = [0]
+            bounds.extend(
+                i for i in range(1, len(entity_ids)) if entity_ids[i] != entity_ids[i - 1]
             )
+            bounds.append(len(entity_ids))
+            for lo, hi in zip(bounds, bounds[1:]):
+                series[entity_ids[lo]] = (sample_us[lo:hi], sample_values[lo:hi])
 
-            # Metadata block
-            meta = await self._build_metadata_block(entity_id, dev_reg, ent_reg)
+        # Closed months may live in the Parquet archive tier
+        if self._archive is not None:
+            for entity_id in entities:
+                if not self._archive.has_data(entity_id, start_ts, end_ts):
+                    continue
+                cold = await self._hass.async_add_executor_job(
+                    self._archive.read_table, entity_id, start_ts, end_ts
+                )
+                if cold is None or not cold.num_rows:
+                    continue
+                cold_us = cold.column("ts").cast(pa.int64()).to_numpy()
+                cold_values = cold.column("value").to_numpy(zero_copy_only=False)
+                hot_us, hot_values = series.get(
+                    entity_id, (np.empty(0, np.int64), np.empty(0, np.float64))
+                )
+                merged_us = np.concatenate([cold_us, hot_us])
+                merged_values = np.concatenate([cold_values, hot_values])
+                order = np.argsort(merged_us, kind="stable")
+                series[entity_id] = (merged_us[order], merged_values[order])
 
-            # Write formats
-            base_name = f"{label}_{entity_id.replace('.', '_')}_{start_ts.date()}_{end_ts.date()}"
-            entity_result: dict[str, str] = {}
+        return series
 
-            for fmt in formats:
-                path = await self._write_format(fmt, base_name, df, meta)
-                entity_result[fmt] = path
+    async def _async_entity_table(
+        self,
+        entity_id: str,
+        start_ts: datetime,
+        end_ts: datetime,
+        resolution_seconds: int,
+        state_aggregation: str = STATE_AGGREGATION_LAST,
+    ) -> pa.Table | None:
+        """Fetch and downsample one entity; None when it has no samples."""
+        # Change-only entities also need the value held when the range starts
+        lookback = (await self._async_hold_lookbacks([entity_id])).get(entity_id)
+        fetch_start = start_ts - lookback if lookback is not None else start_ts
 
-            results[entity_id] = entity_result
+        if end_ts - start_ts > timedelta(days=EXPORT_SPLIT_MIN_DAYS):
+            table = await self._async_split_table(
+                entity_id, fetch_start, start_ts, end_ts, resolution_seconds, lookback is not None
+            )
+            if table is not None:
+                return table
+            return await self._async_state_table(
+                entity_id, fetch_start, start_ts, end_ts, resolution_seconds, state_aggregation
+            )
 
-        return results
+        series = await self._async_fetch_many([entity_id], fetch_start, end_ts)
+        sample_us, values = series.get(
+            entity_id, (np.empty(0, np.int64), np.empty(0, np.float64))
+        )
+        if not len(sample_us):
+            return await self._async_state_table(
+                entity_id, fetch_start, start_ts, end_ts, resolution_seconds, state_aggregation
+            )
+
+        grid = build_grid(start_ts, end_ts, resolution_seconds)
+        aligned, codes = await self._hass.async_add_executor_job(
+            downsample, sample_us, values, grid, lookback is not None
+        )
+        return self._value_table(grid, aligned, codes)
 
-    def _downsample(
+    @staticmethod
+    def _split_ranges(start_ts: datetime, end_ts: datetime) -> list[tuple[int, int]]:
+        """Split [start, end] into half-open day or month ranges in epoch us."""
+        start_us = to_epoch_us(start_ts)
+        stop_us = to_epoch_us(end_ts) + 1
+        day_us = 86_400_000_000
+        bounds = [start_us]
+        if end_ts - start_ts > timedelta(days=EXPORT_SPLIT_MONTHLY_DAYS):
+            current = _EPOCH + timedelta(microseconds=start_us)
+            year, month = current.year, current.month
+            while True:
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+                bound = to_epoch_us(datetime(year, month, 1))
+                if bound >= stop_us:
+                    break
+                bounds.append(bound)
+        else:
+            bound = (start_us // day_us + 1) * day_us
+            while bound < stop_us:
+                bounds.append(bound)
+                bound += day_us
+        bounds.append(stop_us)
+        return list(zip(bounds, bounds[1:]))
+
+    async def _async_split_table(
         self,
-        samples: list[tuple[datetime, float]],
-        targets: list[datetime],
-    ) -> list[tuple[datetime, float, str]]:
-        """Downsample using raw/mean/weighted_mean."""
-        if not samples:
-            return []
+        entity_id: str,
+        fetch_start: datetime,
+        start_ts: datetime,
+        end_ts: datetime,
+        resolution_seconds: int,
+        hold: bool,
+    ) -> pa.Table | None:
+        """Downsample a long range as day/month sub-ranges in parallel.
 
-        result: list[tuple[datetime, float, str]] = []
-        idx = 0
-        n = len(samples)
+        Sub-ranges are fetched concurrently and downsampled in executor
+        workers; closed ones come from and go to the partial-result store.
+        Grid points at sub-range edges are recomputed from the neighbouring
+        samples, so the merged result equals a single pass over the range.
+        None when the entity has no numeric samples in the range.
+        """
+        grid = build_grid(start_ts, end_ts, resolution_seconds)
+        ranges = self._split_ranges(start_ts, end_ts)
+        slices = [
+            (int(np.searchsorted(grid, lo)), int(np.searchsorted(grid, hi))) for lo, hi in ranges
+        ]
+        now_us = to_epoch_us(datetime.utcnow())
+        keys = [
+            PartialResultStore.key(lo, hi, int(grid[a]), resolution_seconds, hold)
+            if self._partials is not None and hi <= now_us and a < b
+            else None
+            for (lo, hi), (a, b) in zip(ranges, slices)
+        ]
 
-        for target in targets:
-            # Move idx so that samples[idx] is the last sample <= target
-            while idx + 1 < n and samples[idx + 1][0] <= target:
-                idx += 1
+        semaphore = asyncio.Semaphore(EXPORT_PARALLEL_WORKERS)
 
-            if samples[idx][0] == target:
-                # Exact match
-                result.append((target, samples[idx][1], DATA_ACCURACY_RAW))
-                continue
+        async def _async_part(index: int) -> PartialResult:
+            lo, hi = ranges[index]
+            a, b = slices[index]
+            key = keys[index]
+            async with semaphore:
+                if key is not None:
+                    cached = await self._hass.async_add_executor_job(
+                        self._partials.load, entity_id, key
+                    )
+                    if cached is not None:
+                        return cached
+                series = await self._async_fetch_many(
+                    [entity_id], _from_epoch_us(lo), _from_epoch_us(hi - 1)
+                )
+                sample_us, values = series.get(
+                    entity_id, (np.empty(0, np.int64), np.empty(0, np.float64))
+                )
+                part = await self._hass.async_add_executor_job(
+                    _interior_part, sample_us, values, grid[a:b], hold
+                )
+                if key is not None:
+                    await self._hass.async_add_executor_job(
+                        self._partials.save, entity_id, key, part
+                    )
+                return part
 
-            if idx + 1 >= n:
-                # No next sample, hold last value as raw
-                result.append((target, samples[idx][1], DATA_ACCURACY_RAW))
-                continue
+        parts = await asyncio.gather(*(_async_part(index) for index in range(len(ranges))))
+        if all(part.first is None for part in parts):
+            return None
 
-            t1, v1 = samples[idx]
-            t2, v2 = samples[idx + 1]
+        # Change-only entities are seeded with the value held at the range start
+        prev = None
+        if fetch_start < start_ts:
+            lead_in = await self._async_fetch_many(
+                [entity_id], fetch_start, _from_epoch_us(to_epoch_us(start_ts) - 1)
+            )
+            if entity_id in lead_in:
+                lead_us, lead_values = lead_in[entity_id]
+                prev = (int(lead_us[-1]), float(lead_values[-1]))
 
-            total = (t2 - t1).total_seconds()
-            if total <= 0:
-                result.append((target, v1, DATA_ACCURACY_RAW))
-                continue
+        # First sample after each sub-range, for its trailing edge points
+        following: list[tuple[int, float] | None] = [None] * len(parts)
+        upcoming = None
+        for index in range(len(parts) - 1, -1, -1):
+            following[index] = upcoming
+            if parts[index].first is not None:
+                upcoming = parts[index].first
 
-            offset = (target - t1).total_seconds()
-            ratio = offset / total
+        # Before the first sample a single pass extrapolates from the first two
+        head = next(index for index, part in enumerate(parts) if part.first is not None)
+        leading = [
+            sample
+            for sample in (parts[head].first, parts[head].second or following[head])
+            if sample is not None
+        ]
 
-            if abs(ratio - 0.5) < 1e-9:
-                # Exact midpoint -> mean
-                value = (v1 + v2) / 2.0
-                accuracy = DATA_ACCURACY_MEAN
+        values_out = np.empty(len(grid), dtype=np.float64)
+        codes_out = np.empty(len(grid), dtype=np.int8)
+        for part, (a, b), nxt in zip(parts, slices, following):
+            points = grid[a:b]
+            if part.first is None:
+                edges = [(points, prev, nxt)]
             else:
-                # Weighted mean
-                value = v1 + (v2 - v1) * ratio
-                accuracy = DATA_ACCURACY_WEIGHTED_MEAN
+                edges = [
+                    (points[points < part.first[0]], prev, part.first),
+                    (points[points > part.last[0]], part.last, nxt),
+                ]
+                lo = a + int(np.searchsorted(points, part.first[0]))
+                values_out[lo : lo + len(part.grid_us)] = part.values
+                codes_out[lo : lo + len(part.grid_us)] = part.codes
+                prev = part.last
+            for edge_points, before, after in edges:
+                if not len(edge_points):
+                    continue
+                if before is None:
+                    known = leading
+                else:
+                    known = [sample for sample in (before, after) if sample is not None]
+                edge_values, edge_codes = downsample(
+                    np.array([ts_us for ts_us, _ in known], dtype=np.int64),
+                    np.array([value for _, value in known], dtype=np.float64),
+                    edge_points,
+                    hold=hold,
+                )
+                lo = int(np.searchsorted(grid, edge_points[0]))
+                values_out[lo : lo + len(edge_points)] = edge_values
+                codes_out[lo : lo + len(edge_points)] = edge_codes
 
-            result.append((target, value, accuracy))
+        return self._value_table(grid, values_out, codes_out)
 
-        return result
+    async def _async_state_table(
+        self,
+        entity_id: str,
+        fetch_start: datetime,
+        start_ts: datetime,
+        end_ts: datetime,
+        resolution_seconds: int,
+        state_aggregation: str,
+    ) -> pa.Table | None:
+        """Downsample a non-numeric entity; None when it has no stored states."""
+        states = await self._async_fetch_states(entity_id, fetch_start, end_ts)
+        if states is None:
+            return None
+        sample_us, sample_codes, dictionary = states
+
+        grid = build_grid(start_ts, end_ts, resolution_seconds)
+        aligned, codes = downsample_states(
+            sample_us, sample_codes, grid, resolution_seconds, state_aggregation
+        )
+        return pa.Table.from_arrays(
+            [
+                pa.array(grid, type=pa.int64()).cast(EXPORT_SCHEMA.field("timestamp").type),
+                dictionary.take(pa.array(aligned)),
+                pa.DictionaryArray.from_arrays(pa.array(codes), _ACCURACY_DICTIONARY),
+            ],
+            schema=STATE_EXPORT_SCHEMA,
+        )
+
+    async def _async_fetch_states(
+        self,
+        entity_id: str,
+        start_ts: datetime,
+        end_ts: datetime,
+    ) -> tuple[np.ndarray, np.ndarray, pa.Array] | None:
+        """Return (epoch us, state codes, code -> text) for a range, or None."""
+        rows = await self._db.async_fetchall(
+            """
+            SELECT ts, code FROM state_coded_samples
+            WHERE entity_id = ? AND ts >= ? AND ts <= ?
+            ORDER BY ts
+            """,
+            (entity_id, start_ts.isoformat(), end_ts.isoformat()),
+        )
+        if not rows:
+            return None
+        values = await self._db.async_fetchall(
+            "SELECT code, value FROM state_values WHERE entity_id = ? ORDER BY code",
+            (entity_id,),
+        )
+        # Codes are assigned densely from 0, so position == code
+        dictionary = pa.array([value for _, value in values], type=pa.string())
+        timestamps, codes = zip(*rows)
+        return parse_iso_us(list(timestamps)), np.array(codes, dtype=np.int32), dictionary
+
+    async def _async_hold_lookbacks(self, entities: list[str]) -> dict[str, timedelta]:
+        """Return entity_id -> heartbeat for entities stored change-only.
+
+        The last stored sample is never older than one heartbeat, so fetching
+        that far before the range start is enough to seed step-hold.
+        """
+        if not entities:
+            return {}
+        placeholders = ", ".join("?" for _ in entities)
+        rows = await self._db.async_fetchall(
+            f"""
+            SELECT entity_id, heartbeat_seconds FROM entities
+            WHERE entity_id IN ({placeholders}) AND stats_mode = ?
+            """,
+            (*entities, STATS_MODE_CHANGE),
+        )
+        return {
+            entity_id: timedelta(seconds=heartbeat or DEFAULT_HEARTBEAT_SECONDS)
+            for entity_id, heartbeat in rows
+        }
+
+    @staticmethod
+    def _with_entity_column(table: pa.Table, entity_id: str) -> pa.Table:
+        """Key a value or state table by entity; the missing column is null."""
+        entity_column = pa.repeat(pa.scalar(entity_id, type=pa.string()), table.num_rows)
+        names = table.schema.names
+        columns = [
+            table.column(field.name)
+            if field.name in names
+            else pa.nulls(table.num_rows, type=field.type)
+            for field in CONSOLIDATED_SCHEMA
+            if field.name != "entity_id"
+        ]
+        return pa.Table.from_arrays(
+            [entity_column, *columns], schema=CONSOLIDATED_SCHEMA
+        )
+
+    @staticmethod
+    def _open_writers(
+        formats: list[str],
+        base_path: str,
+        schema: pa.Schema,
+        metadata_lines: list[str],
+        compression: str | None,
+    ) -> dict[str, ExportWriter]:
+        writers: dict[str, ExportWriter] = {}
+        try:
+            for fmt in formats:
+                writers[fmt] = open_writer(fmt, base_path, schema, metadata_lines, compression)
+        except Exception:
+            ExportEngine._close_writers(writers)
+            raise
+        return writers
+
+    @staticmethod
+    def _write_to_all(
+        writers: dict[str, ExportWriter],
+        table: pa.Table,
+        chunk_rows: int = EXPORT_CHUNK_ROWS,
+    ) -> None:
+        for writer in writers.values():
+            writer.write_table(table, chunk_rows)
+
+    @staticmethod
+    def _close_writers(writers: dict[str, ExportWriter]) -> None:
+        for writer in writers.values():
+            writer.close()
+
+    @staticmethod
+    def _value_table(grid: np.ndarray, values: np.ndarray, codes: np.ndarray) -> pa.Table:
+        """Wrap epoch-us grid points, values and accuracy codes as typed Arrow columns."""
+        return pa.Table.from_arrays(
+            [
+                pa.array(grid, type=pa.int64()).cast(EXPORT_SCHEMA.field("timestamp").type),
+                pa.array(values, type=pa.float64()),
+                pa.DictionaryArray.from_arrays(pa.array(codes), _ACCURACY_DICTIONARY),
+            ],
+            schema=EXPORT_SCHEMA,
+        )
 
     async def _build_metadata_block(self, entity_id, dev_reg, ent_reg) -> list[str]:
         """Build metadata lines based on selected fields."""
@@ -212,68 +1344,25 @@ class ExportEngine:
 
         return lines
 
-    async def _write_format(
+    def _write_files(
         self,
-        fmt: str,
+        formats: list[str],
         base_name: str,
-        df: pd.DataFrame,
+        table: pa.Table,
         metadata_lines: list[str],
-    ) -> str:
+        compression: str | None,
+        chunk_rows: int = EXPORT_CHUNK_ROWS,
+    ) -> dict[str, str]:
+        """Write one table in every format; runs in the executor."""
         os.makedirs(self._export_path, exist_ok=True)
+        base_path = os.path.join(self._export_path, base_name)
+        paths: dict[str, str] = {}
+
+        for fmt in formats:
+            with open_writer(
+                fmt, base_path, table.schema, metadata_lines, compression
+            ) as writer:
+                writer.write_table(table, chunk_rows)
+            paths[fmt] = writer.path
 
-        if fmt == "csv":
-            path = os.path.join(self._export_path, f"{base_name}.csv")
-            with open(path, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                for line in metadata_lines:
-                    writer.writerow([line])
-                df.to_csv(f, index=False)
-            return path
-
-        if fmt == "json":
-            path = os.path.join(self._export_path, f"{base_name}.json")
-            with open(path, "w", encoding="utf-8") as f:
-                if metadata_lines:
-                    f.write("// " + "\n// ".join(metadata_lines) + "\n")
-                json.dump(df.to_dict(orient="records"), f, indent=2)
-            return path
-
-        if fmt == "html":
-            path = os.path.join(self._export_path, f"{base_name}.html")
-            with open(path, "w", encoding="utf-8") as f:
-                if metadata_lines:
-                    f.write("<!--\n" + "\n".join(metadata_lines) + "\n-->\n")
-                f.write(df.to_html(index=False))
-            return path
-
-        if fmt == "xlsx":
-            path = os.path.join(self._export_path, f"{base_name}.xlsx")
-            with pd.ExcelWriter(path, engine="openpyxl") as writer:
-                df.to_excel(writer, index=False, sheet_name="data")
-            return path
-
-        if fmt == "sqlite":
-            path = os.path.join(self._export_path, f"{base_name}.sqlite")
-            conn = f"sqlite:///{path}"
-            df.to_sql("export", conn, if_exists="replace", index=False)
-            return path
-
-        if fmt == "parquet":
-            path = os.path.join(self._export_path, f"{base_name}.parquet")
-            df.to_parquet(path, index=False)
-            return path
-
-        if fmt == "feather":
-            path = os.path.join(self._export_path, f"{base_name}.feather")
-            df.to_feather(path)
-            return path
-
-        if fmt == "arrow":
-            path = os.path.join(self._export_path, f"{base_name}.arrow")
-            table = pa.Table.from_pandas(df)
-            with pa.OSFile(path, "wb") as sink:
-                with pa.ipc.new_file(sink, table.schema) as writer:
-                    writer.write_table(table)
-            return path
-
-        raise ValueError(f"Unsupported format: {fmt}")
+        return paths
@@ -0,0 +1,60 @@
+"""Deferred loading of the export stack (pyarrow, writers) until the first export."""
+
+from __future__ import annotations
+
+import asyncio
+import importlib
+from typing import TYPE_CHECKING
+
+from homeassistant.core import HomeAssistant
+
+from .archive_tier import ArchiveTier
+from .const import DEFAULT_EXPORT_MEMORY_MB
+from .database import Database
+from .partial_store import PartialResultStore
+from .sample_buffer import SampleBuffer
+
+if TYPE_CHECKING:
+    from .export_engine import ExportEngine
+
+
+class ExportEngineLoader:
+    """Creates the ``ExportEngine`` on first use.
+
+    Recording and the database never touch pyarrow or the format writers,
+    so Home Assistant starts without importing them; the first export pays
+    for the import once, in the import executor.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        db: Database,
+        export_path: str,
+        archive: ArchiveTier | None = None,
+        sample_buffer: SampleBuffer | None = None,
+        partials: PartialResultStore | None = None,
+        memory_budget_mb: int = DEFAULT_EXPORT_MEMORY_MB,
+    ) -> None:
+        self._hass = hass
+        self._args = (db, export_path, archive, sample_buffer, partials, memory_budget_mb)
+        self._engine: ExportEngine | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._engine is not None
+
+    async def async_get(self) -> ExportEngine:
+        if self._engine is not None:
+            return self._engine
+        async with self._lock:
+            if self._engine is None:
+                module = await self._hass.async_add_import_executor_job(
+                    importlib.import_module, f"{__package__}.export_engine"
+                )
+                # The constructor prepares export and spill directories
+                self._engine = await self._hass.async_add_executor_job(
+                    module.ExportEngine, self._hass, *self._args
+                )
+        return self._engine
@@ -0,0 +1,139 @@
+"""Memory budgeting for exports: footprint estimates, spilling and RSS tracking."""
+
+from __future__ import annotations
+
+import itertools
+import os
+import shutil
+import sys
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    EXPORT_CELL_OBJECT_BYTES,
+    EXPORT_CHUNK_ROWS,
+    EXPORT_CHUNK_SHARE,
+    EXPORT_MIN_CHUNK_ROWS,
+    EXPORT_ROW_BYTES,
+    EXPORT_SPILL_SHARE,
+)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+
+def peak_rss_bytes() -> int | None:
+    """Highest resident set size this process has reached, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes everywhere but macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def chunk_rows(budget_bytes: int, num_columns: int) -> int:
+    """Rows per writer batch so one batch's Python objects fit the budget."""
+    rows = int(budget_bytes * EXPORT_CHUNK_SHARE // (num_columns * EXPORT_CELL_OBJECT_BYTES))
+    return max(EXPORT_MIN_CHUNK_ROWS, min(EXPORT_CHUNK_ROWS, rows))
+
+
+class ExportMemoryPlan:
+    """Chunk size and spill decision for one export, from its estimated footprint.
+
+    ``entities_held`` is how many downsampled tables the layout keeps alive
+    at once: one for per-entity and consolidated exports, all for wide.
+    """
+
+    def __init__(
+        self,
+        budget_bytes: int,
+        start_ts: datetime,
+        end_ts: datetime,
+        resolution_seconds: int,
+        entities_held: int = 1,
+    ) -> None:
+        self.budget_bytes = budget_bytes
+        grid_rows = int((end_ts - start_ts).total_seconds() // resolution_seconds) + 1
+        self.estimated_bytes = max(grid_rows, 0) * max(entities_held, 1) * EXPORT_ROW_BYTES
+        self.spill = self.estimated_bytes > budget_bytes * EXPORT_SPILL_SHARE
+        self.spilled_tables = 0
+
+    def chunk_rows(self, num_columns: int) -> int:
+        """Rows per writer batch from what the estimated tables leave of the budget."""
+        # Spilled tables are file-backed and leave the budget to the batches
+        held = 0 if self.spill else self.estimated_bytes
+        return chunk_rows(max(self.budget_bytes - held, 0), num_columns)
+
+
+class SpillArea:
+    """Temporary Arrow IPC files that keep large intermediate tables off the heap.
+
+    A spilled table is memory-mapped: its pages are file-backed and can be
+    dropped by the kernel under pressure instead of counting as heap.
+    """
+
+    def __init__(self, root: str) -> None:
+        self._root = root
+        self._names = itertools.count()
+
+    def clear(self) -> None:
+        """Remove files left by an interrupted run; runs in the executor."""
+        shutil.rmtree(self._root, ignore_errors=True)
+
+    def spill(self, table: pa.Table) -> pa.Table:
+        """Write ``table`` to disk and return a memory-mapped copy; runs in the executor."""
+        import pyarrow as pa
+
+        os.makedirs(self._root, exist_ok=True)
+        path = os.path.join(self._root, f"{os.getpid()}_{next(self._names)}.arrow")
+        # Uncompressed, so reading back is zero-copy
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        with pa.memory_map(path) as source:
+            spilled = pa.ipc.open_file(source).read_all()
+        try:
+            # The mapping outlives the directory entry on POSIX
+            os.remove(path)
+        except OSError:
+            pass
+        return spilled
+
+
+class PeakRssMonitor:
+    """Tracks the process RSS peak while an export runs.
+
+    Usage: ``async with PeakRssMonitor(hass) as rss: ...``; afterwards
+    ``rss.peak_bytes`` and ``rss.start_bytes`` are set (None where
+    ``getrusage`` is unavailable). The kernel keeps the high-water mark, so
+    nothing is polled; an export that stays below an earlier peak adds
+    nothing to it. The figure is process-wide, so concurrent work shows up
+    in it too.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self.start_bytes: int | None = None
+        self.peak_bytes: int | None = None
+
+    async def __aenter__(self) -> PeakRssMonitor:
+        self.start_bytes = self.peak_bytes = peak_rss_bytes()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.peak_bytes = peak_rss_bytes()
+
+    def summary(self) -> str:
+        if self.peak_bytes is None:
+            return "peak RSS unavailable"
+        return "peak RSS %.1f MB (+%.1f MB)" % (
+            self.peak_bytes / 1048576,
+            (self.peak_bytes - self.start_bytes) / 1048576,
+        )
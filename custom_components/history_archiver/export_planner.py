@@ -0,0 +1,87 @@
+"""Deduplication of work shared by several exports run together."""
+
+from __future__ import annotations
+
+from datetime import datetime
+
+from .const import EXPORT_LAYOUT_PER_ENTITY, STATE_AGGREGATION_LAST
+
+
+class ExportJob:
+    """One requested export; mirrors the arguments of ``ExportEngine.async_export``."""
+
+    def __init__(
+        self,
+        entities: list[str],
+        start_ts: datetime,
+        end_ts: datetime,
+        resolution_seconds: int,
+        formats: list[str],
+        label: str,
+        compression: str | None = None,
+        layout: str = EXPORT_LAYOUT_PER_ENTITY,
+        state_aggregation: str = STATE_AGGREGATION_LAST,
+    ) -> None:
+        self.entities = list(dict.fromkeys(entities))
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.resolution_seconds = resolution_seconds
+        self.formats = formats
+        self.label = label
+        self.compression = compression
+        self.layout = layout
+        self.state_aggregation = state_aggregation
+
+
+class WorkUnit:
+    """One downsampled series and the indexes of the jobs that need it."""
+
+    __slots__ = (
+        "entity_id",
+        "start_ts",
+        "end_ts",
+        "resolution_seconds",
+        "state_aggregation",
+        "jobs",
+    )
+
+    def __init__(
+        self,
+        entity_id: str,
+        start_ts: datetime,
+        end_ts: datetime,
+        resolution_seconds: int,
+        state_aggregation: str,
+    ) -> None:
+        self.entity_id = entity_id
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.resolution_seconds = resolution_seconds
+        self.state_aggregation = state_aggregation
+        self.jobs: list[int] = []
+
+
+def plan_units(jobs: list[ExportJob]) -> list[WorkUnit]:
+    """Return the distinct units of work behind ``jobs``, ordered by entity.
+
+    Entity order keeps consolidated outputs sorted while each series is
+    computed exactly once, however many jobs share it.
+    """
+    units: dict[tuple, WorkUnit] = {}
+    for index, job in enumerate(jobs):
+        for entity_id in job.entities:
+            key = (
+                entity_id,
+                job.start_ts,
+                job.end_ts,
+                job.resolution_seconds,
+                job.state_aggregation,
+            )
+            unit = units.get(key)
+            if unit is None:
+                unit = units[key] = WorkUnit(*key)
+            unit.jobs.append(index)
+    return sorted(
+        units.values(),
+        key=lambda unit: (unit.entity_id, unit.start_ts, unit.end_ts, unit.resolution_seconds),
+    )
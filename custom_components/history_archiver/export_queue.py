@@ -0,0 +1,400 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    DOMAIN,
+    EVENT_EXPORT_PROGRESS,
+    EXPORT_LAYOUT_PER_ENTITY,
+    EXPORT_RUNS_FOLDER,
+    EXPORT_STATUS_CANCELLED,
+    EXPORT_STATUS_COMPLETED,
+    EXPORT_STATUS_FAILED,
+    EXPORT_STATUS_QUEUED,
+    EXPORT_STATUS_RUNNING,
+    STATE_AGGREGATION_LAST,
+)
+from .database import Database
+from .export_loader import ExportEngineLoader
+from .export_memory import PeakRssMonitor
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ExportQueue:
+    """Persistent export job queue on ``export_runs``, processed one run at a time.
+
+    Every entity is a checkpoint: per-entity outputs are final files, and
+    consolidated/wide runs stage each entity's table under
+    ``history_archiver/runs/<id>`` until all are done. A run interrupted by
+    a restart is picked up again and skips the entities already done.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, db: Database, export_engine: ExportEngineLoader
+    ) -> None:
+        self._hass = hass
+        self._db = db
+        self._export_engine = export_engine
+        self._runs_path = hass.config.path(DOMAIN, EXPORT_RUNS_FOLDER)
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+        self._current_run: int | None = None
+        self._current_task: asyncio.Task | None = None
+        # Runs cancelled by request; any other cancellation is a shutdown
+        self._cancelled: set[int] = set()
+
+    async def async_start(self) -> None:
+        # Anything left running was interrupted by a shutdown
+        await self._db.async_execute(
+            "UPDATE export_runs SET status = ? WHERE status = ?",
+            (EXPORT_STATUS_QUEUED, EXPORT_STATUS_RUNNING),
+        )
+        self._worker = self._hass.async_create_background_task(
+            self._async_worker(), f"{DOMAIN}_export_queue"
+        )
+        self._wakeup.set()
+
+    async def async_stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def async_enqueue(
+        self,
+        entities: list[str],
+        start_ts: datetime,
+        end_ts: datetime,
+        resolution_seconds: int,
+        formats: list[str],
+        label: str,
+        compression: str | None = None,
+        layout: str = EXPORT_LAYOUT_PER_ENTITY,
+        state_aggregation: str = STATE_AGGREGATION_LAST,
+        profile_id: int | None = None,
+        export_type: str = "manual",
+    ) -> int:
+        """Queue an export with ``async_export``'s options; returns the run id."""
+        engine = await self._export_engine.async_get()
+        formats = engine.validate_options(formats, compression, layout, state_aggregation)
+        entities = list(dict.fromkeys(entities))
+        request = {
+            "label": label,
+            "compression": compression,
+            "layout": layout,
+            "state_aggregation": state_aggregation,
+        }
+        run_id = await self._db.async_execute(
+            """
+            INSERT INTO export_runs (
+                profile_id, export_type, start_ts, end_ts, resolution_seconds,
+                formats, created_at, status, request, entities_total
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                profile_id,
+                export_type,
+                start_ts.isoformat(),
+                end_ts.isoformat(),
+                resolution_seconds,
+                ",".join(formats),
+                datetime.utcnow().isoformat(),
+                EXPORT_STATUS_QUEUED,
+                json.dumps(request),
+                len(entities),
+            ),
+        )
+        await self._db.async_executemany(
+            """
+            INSERT INTO export_run_entities (run_id, entity_id, position)
+            VALUES (?, ?, ?)
+            """,
+            [(run_id, entity_id, position) for position, entity_id in enumerate(entities)],
+        )
+        self._wakeup.set()
+        return run_id
+
+    async def async_cancel(self, run_id: int) -> bool:
+        """Cancel a queued or running export; False if it already finished."""
+        row = await self._db.async_fetchone(
+            "SELECT status FROM export_runs WHERE id = ?", (run_id,)
+        )
+        if row is None or row[0] not in (EXPORT_STATUS_QUEUED, EXPORT_STATUS_RUNNING):
+            return False
+        await self._async_finish(run_id, EXPORT_STATUS_CANCELLED)
+        if self._current_run == run_id and self._current_task is not None:
+            self._cancelled.add(run_id)
+            self._current_task.cancel()
+        else:
+            await self._hass.async_add_executor_job(self._remove_staging, run_id)
+        return True
+
+    async def async_get_run(self, run_id: int) -> dict[str, Any] | None:
+        row = await self._db.async_fetchone(
+            """
+            SELECT id, profile_id, export_type, start_ts, end_ts, resolution_seconds,
+                   formats, created_at, status, details, request, entities_total,
+                   entities_done, outputs, started_at, finished_at, peak_rss_bytes
+            FROM export_runs WHERE id = ?
+            """,
+            (run_id,),
+        )
+        if row is None:
+            return None
+        keys = (
+            "id", "profile_id", "export_type", "start_ts", "end_ts", "resolution_seconds",
+            "formats", "created_at", "status", "details", "request", "entities_total",
+            "entities_done", "outputs", "started_at", "finished_at", "peak_rss_bytes",
+        )
+        run = dict(zip(keys, row))
+        run["formats"] = run["formats"].split(",") if run["formats"] else []
+        run["request"] = json.loads(run["request"]) if run["request"] else None
+        run["outputs"] = json.loads(run["outputs"]) if run["outputs"] else None
+        return run
+
+    async def _async_worker(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while True:
+                row = await self._db.async_fetchone(
+                    "SELECT id FROM export_runs WHERE status = ? ORDER BY id LIMIT 1",
+                    (EXPORT_STATUS_QUEUED,),
+                )
+                if row is None:
+                    break
+                run_id = row[0]
+                self._current_run = run_id
+                self._current_task = self._hass.async_create_task(self._async_process(run_id))
+                try:
+                    await self._current_task
+                except asyncio.CancelledError:
+                    if run_id not in self._cancelled:
+                        raise
+                except Exception:  # noqa: BLE001 - keep the queue alive
+                    # Could not even record the failure; retried on the next wakeup
+                    _LOGGER.exception("Export run %s could not be processed", run_id)
+                    break
+                finally:
+                    self._cancelled.discard(run_id)
+                    self._current_run = None
+                    self._current_task = None
+
+    async def _async_process(self, run_id: int) -> None:
+        done = total = resumed_from = 0
+        started = time.monotonic()
+        async with PeakRssMonitor(self._hass) as rss:
+            try:
+                run = await self.async_get_run(run_id)
+                request = run["request"] or {}
+                start_ts = datetime.fromisoformat(run["start_ts"])
+                end_ts = datetime.fromisoformat(run["end_ts"])
+                layout = request.get("layout", EXPORT_LAYOUT_PER_ENTITY)
+                state_aggregation = request.get("state_aggregation", STATE_AGGREGATION_LAST)
+                staging = os.path.join(self._runs_path, str(run_id))
+                engine = await self._export_engine.async_get()
+
+                rows = await self._db.async_fetchall(
+                    """
+                    SELECT entity_id, done FROM export_run_entities
+                    WHERE run_id = ? ORDER BY position
+                    """,
+                    (run_id,),
+                )
+                # Only a run still queued; async_cancel may have finished it already
+                claimed = await self._db.async_executemany(
+                    """
+                    UPDATE export_runs SET status = ?, started_at = COALESCE(started_at, ?)
+                    WHERE id = ? AND status = ?
+                    """,
+                    [
+                        (
+                            EXPORT_STATUS_RUNNING,
+                            datetime.utcnow().isoformat(),
+                            run_id,
+                            EXPORT_STATUS_QUEUED,
+                        )
+                    ],
+                )
+                if not claimed:
+                    return
+
+                total = len(rows)
+                done = sum(1 for _, entity_done in rows if entity_done)
+                resumed_from = done
+                started = time.monotonic()
+                if done:
+                    _LOGGER.info(
+                        "Resuming export run %s at entity %s of %s", run_id, done + 1, total
+                    )
+                self._fire_progress(
+                    run_id, EXPORT_STATUS_RUNNING, done, total, resumed_from, started
+                )
+
+                for entity_id, entity_done in rows:
+                    if entity_done:
+                        continue
+                    if layout == EXPORT_LAYOUT_PER_ENTITY:
+                        outputs = await engine.async_export_entity(
+                            entity_id,
+                            start_ts,
+                            end_ts,
+                            run["resolution_seconds"],
+                            run["formats"],
+                            request.get("label", "export"),
+                            request.get("compression"),
+                            state_aggregation,
+                        )
+                    else:
+                        path = os.path.join(staging, f"{entity_id}.arrow")
+                        staged = await engine.async_stage_entity(
+                            entity_id,
+                            start_ts,
+                            end_ts,
+                            run["resolution_seconds"],
+                            state_aggregation,
+                            path,
+                        )
+                        outputs = {"staged": path} if staged else None
+
+                    # Checkpoint
+                    done += 1
+                    await self._db.async_execute_batch(
+                        [
+                            (
+                                """
+                                UPDATE export_run_entities SET done = 1, outputs = ?
+                                WHERE run_id = ? AND entity_id = ?
+                                """,
+                                (json.dumps(outputs) if outputs else None, run_id, entity_id),
+                            ),
+                            (
+                                "UPDATE export_runs SET entities_done = ? WHERE id = ?",
+                                (done, run_id),
+                            ),
+                        ]
+                    )
+                    self._fire_progress(
+                        run_id,
+                        EXPORT_STATUS_RUNNING,
+                        done,
+                        total,
+                        resumed_from,
+                        started,
+                        entity_id,
+                    )
+
+                rows = await self._db.async_fetchall(
+                    """
+                    SELECT entity_id, outputs FROM export_run_entities
+                    WHERE run_id = ? AND outputs IS NOT NULL ORDER BY position
+                    """,
+                    (run_id,),
+                )
+                outputs = {
+                    entity_id: json.loads(entity_outputs) for entity_id, entity_outputs in rows
+                }
+                if layout != EXPORT_LAYOUT_PER_ENTITY:
+                    outputs = await engine.async_write_staged(
+                        layout,
+                        {entity_id: staged["staged"] for entity_id, staged in outputs.items()},
+                        start_ts,
+                        end_ts,
+                        run["formats"],
+                        request.get("label", "export"),
+                        request.get("compression"),
+                    )
+                    await self._hass.async_add_executor_job(self._remove_staging, run_id)
+            except asyncio.CancelledError:
+                if run_id in self._cancelled:
+                    # The claim above may have committed after async_cancel's finish
+                    await self._async_finish(run_id, EXPORT_STATUS_CANCELLED)
+                    await self._hass.async_add_executor_job(self._remove_staging, run_id)
+                    self._fire_progress(
+                        run_id, EXPORT_STATUS_CANCELLED, done, total, resumed_from, started
+                    )
+                # Otherwise shutting down: the run stays 'running' and resumes on start
+                raise
+            except Exception as err:  # noqa: BLE001 - recorded on the run
+                _LOGGER.exception("Export run %s failed", run_id)
+                await self._async_finish(
+                    run_id, EXPORT_STATUS_FAILED, details=str(err), peak_rss_bytes=rss.peak_bytes
+                )
+                self._fire_progress(
+                    run_id, EXPORT_STATUS_FAILED, done, total, resumed_from, started
+                )
+                return
+
+        await self._async_finish(
+            run_id, EXPORT_STATUS_COMPLETED, outputs=outputs, peak_rss_bytes=rss.peak_bytes
+        )
+        self._fire_progress(run_id, EXPORT_STATUS_COMPLETED, done, total, resumed_from, started)
+
+    async def _async_finish(
+        self,
+        run_id: int,
+        status: str,
+        details: str | None = None,
+        outputs: dict[str, Any] | None = None,
+        peak_rss_bytes: int | None = None,
+    ) -> None:
+        await self._db.async_execute(
+            """
+            UPDATE export_runs
+            SET status = ?, details = COALESCE(?, details),
+                outputs = COALESCE(?, outputs), finished_at = ?,
+                peak_rss_bytes = COALESCE(?, peak_rss_bytes)
+            WHERE id = ?
+            """,
+            (
+                status,
+                details,
+                json.dumps(outputs) if outputs is not None else None,
+                datetime.utcnow().isoformat(),
+                peak_rss_bytes,
+                run_id,
+            ),
+        )
+
+    def _fire_progress(
+        self,
+        run_id: int,
+        status: str,
+        done: int,
+        total: int,
+        resumed_from: int,
+        started: float,
+        entity_id: str | None = None,
+    ) -> None:
+        """Publish progress; rate and ETA only count entities done in this session."""
+        elapsed = time.monotonic() - started
+        processed = done - resumed_from
+        rate = processed / elapsed if elapsed > 0 and processed else None
+        self._hass.bus.async_fire(
+            EVENT_EXPORT_PROGRESS,
+            {
+                "run_id": run_id,
+                "status": status,
+                "entity_id": entity_id,
+                "entities_done": done,
+                "entities_total": total,
+                "elapsed_seconds": round(elapsed, 1),
+                "entities_per_minute": round(rate * 60, 2) if rate else None,
+                "eta_seconds": round((total - done) / rate, 1) if rate else None,
+            },
+        )
+
+    def _remove_staging(self, run_id: int) -> None:
+        shutil.rmtree(os.path.join(self._runs_path, str(run_id)), ignore_errors=True)
@@ -0,0 +1,577 @@
+"""Streaming export writers.
+
+Every writer receives Arrow record batches one at a time, so memory use is
+bounded by the batch size rather than by the number of exported rows.
+Writers are synchronous and meant to run in the executor. Libraries needed
+by a single format (openpyxl, pyarrow.parquet) are imported when a writer
+for that format is opened.
+"""
+
+import csv
+import html
+import io
+import json
+import os
+import shutil
+import sqlite3
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .const import (
+    EXPORT_COMPRESSION_GZIP,
+    EXPORT_COMPRESSION_ZSTD,
+    EXPORT_FORMAT_ARROW,
+    EXPORT_FORMAT_CSV,
+    EXPORT_FORMAT_FEATHER,
+    EXPORT_FORMAT_HTML,
+    EXPORT_FORMAT_JSON,
+    EXPORT_FORMAT_NDJSON,
+    EXPORT_FORMAT_PARQUET,
+    EXPORT_FORMAT_SQLITE,
+    EXPORT_FORMAT_XLSX,
+    EXPORT_HTML_PAGE_ROWS,
+    EXPORT_METADATA_KEY,
+    EXPORT_PARQUET_COMPRESSION,
+    SUPPORTED_EXPORT_COMPRESSIONS,
+    XLSX_MAX_ROWS,
+)
+from .downsampling import format_iso_us
+
+_COMPRESSION_EXTENSIONS = {
+    EXPORT_COMPRESSION_GZIP: ".gz",
+    EXPORT_COMPRESSION_ZSTD: ".zst",
+}
+
+
+def _column_values(column: pa.Array) -> list:
+    """Convert one column to Python values suitable for text output."""
+    if pa.types.is_timestamp(column.type):
+        if not column.null_count:
+            # Format the whole column at once instead of per datetime object
+            return format_iso_us(
+                column.cast(pa.timestamp("us", column.type.tz)).cast(pa.int64()).to_numpy()
+            )
+        return [
+            ts.replace(tzinfo=None).isoformat() if ts is not None else None
+            for ts in column.to_pylist()
+        ]
+    return column.to_pylist()
+
+
+def iter_rows(batch: pa.RecordBatch):
+    """Yield the rows of a batch as tuples of text-friendly Python values."""
+    return zip(*(_column_values(column) for column in batch.columns))
+
+
+def iter_json_rows(batch: pa.RecordBatch):
+    """Like ``iter_rows``, with NaN and infinities (grid gaps) as None.
+
+    JSON has no NaN; ``json.dumps`` would write a bare ``NaN`` that strict
+    parsers reject, so these become ``null``.
+    """
+    return zip(*(_column_values(_finite_or_null(column)) for column in batch.columns))
+
+
+def _finite_or_null(column: pa.Array) -> pa.Array:
+    if not pa.types.is_floating(column.type):
+        return column
+    return pc.if_else(pc.is_finite(column), column, pa.scalar(None, column.type))
+
+
+def text_columns(table: pa.Table | pa.RecordBatch) -> dict[str, list]:
+    """Return the columns of a table as text-friendly Python lists."""
+    return {
+        name: _column_values(column)
+        for name, column in zip(table.schema.names, table.columns)
+    }
+
+
+class ExportWriter:
+    """Base class for a single export file fed with record batches."""
+
+    extension = ""
+    supports_compression = False
+
+    def __init__(
+        self,
+        base_path: str,
+        schema: pa.Schema,
+        metadata_lines: list[str],
+        compression: str | None = None,
+    ) -> None:
+        if compression is not None and not self.supports_compression:
+            compression = None
+        self.path = base_path + self.extension
+        if compression is not None:
+            self.path += _COMPRESSION_EXTENSIONS[compression]
+        self.schema = schema
+        self.metadata_lines = metadata_lines
+        self.compression = compression
+        self.rows_written = 0
+
+    def write_batch(self, batch: pa.RecordBatch) -> None:
+        self._write_batch(batch)
+        self.rows_written += batch.num_rows
+
+    def write_table(self, table: pa.Table, chunk_rows: int) -> None:
+        for batch in table.to_batches(max_chunksize=chunk_rows):
+            self.write_batch(batch)
+
+    def _write_batch(self, batch: pa.RecordBatch) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class _TextWriter(ExportWriter):
+    """Text writer over an optionally compressed byte stream."""
+
+    supports_compression = True
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._stream = pa.output_stream(self.path, compression=self.compression)
+        self._buffer = io.StringIO()
+
+    def _flush(self) -> None:
+        self._stream.write(self._buffer.getvalue().encode("utf-8"))
+        self._buffer.seek(0)
+        self._buffer.truncate()
+
+    def close(self) -> None:
+        self._flush()
+        self._stream.close()
+
+
+class CsvWriter(_TextWriter):
+    extension = ".csv"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._csv = csv.writer(self._buffer)
+        for line in self.metadata_lines:
+            self._csv.writerow([line])
+        self._csv.writerow(self.schema.names)
+        self._flush()
+
+    def _write_batch(self, batch: pa.RecordBatch) -> None:
+        self._csv.writerows(iter_rows(batch))
+        self._flush()
+
+
+class NdjsonWriter(_TextWriter):
+    """One JSON object per line; metadata, if any, is a leading ``_metadata`` line."""
+
+    extension = ".ndjson"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        if self.metadata_lines:
+            self._buffer.write(json.dumps({"_metadata": self.metadata_lines}) + "\n")
+            self._flush()
+
+    def _write_batch(self, batch: pa.RecordBatch) -> None:
+        names = self.schema.names
+        write = self._buffer.write
+        for row in iter_json_rows(batch):
+            write(json.dumps(dict(zip(names, row))))
+            write("\n")
+        self._flush()
+
+
+class JsonWriter(_TextWriter):
+    """A single valid JSON document: ``{"metadata": [...], "data": [...]}``."""
+
+    extension = ".json"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._buffer.write('{"metadata": ')
+        self._buffer.write(json.dumps(self.metadata_lines))
+        self._buffer.write(', "data": [')
+        self._first = True
+        self._flush()
+
+    def _write_batch(self, batch: pa.RecordBatch) -> None:
+        names = self.schema.names
+        write = self._buffer.write
+        for row in iter_json_rows(batch):
+            write("\n" if self._first else ",\n")
+            self._first = False
+            write(json.dumps(dict(zip(names, row))))
+        self._flush()
+
+    def close(self) -> None:
+        self._buffer.write("\n]}\n")
+        super().close()
+
+
+def _with_metadata(schema: pa.Schema, metadata_lines: list[str]) -> pa.Schema:
+    if not metadata_lines:
+        return schema
+    return schema.with_metadata({EXPORT_METADATA_KEY: "\n".join(metadata_lines)})
+
+
+class ParquetWriter(ExportWriter):
+    extension = ".parquet"
+
+    def __init__(self, *args, **kwargs) -> None:
+        import pyarrow.parquet as pq
+
+        super().__init__(*args, **kwargs)
+        self._writer = pq.ParquetWriter(
+            self.path,
+            _with_metadata(self.schema, self.metadata_lines),
+            compression=EXPORT_PARQUET_COMPRESSION,
+        )
+
+    def _write_batch(self, batch: pa.RecordBatch) -> None:
+        self._writer.write_batch(batch)
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+class _IpcFileWriter(ExportWriter):
+    ipc_compression: str | None = None
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._sink = pa.OSFile(self.path, "wb")
+        self._writer = pa.ipc.new_file(
+            self._sink,
+            _with_metadata(self.schema, self.metadata_lines),
+            options=pa.ipc.IpcWriteOptions(compression=self.ipc_compression),
+        )
+
+    def _write_batch(self, batch: pa.RecordBatch) -> None:
+        self._writer.write_batch(batch)
+
+    def close(self) -> None:
+        self._writer.close()
+        self._sink.close()
+
+
+class FeatherWriter(_IpcFileWriter):
+    """Feather V2, i.e. an LZ4-compressed Arrow IPC file."""
+
+    extension = ".feather"
+    ipc_compression = "lz4"
+
+
+class ArrowWriter(_IpcFileWriter):
+    extension = ".arrow"
+
+
+def _sql_type(arrow_type: pa.DataType) -> str:
+    if pa.types.is_floating(arrow_type):
+        return "REAL"
+    if pa.types.is_integer(arrow_type):
+        return "INTEGER"
+    return "TEXT"
+
+
+class SqliteWriter(ExportWriter):
+    """SQLite file with an ``export`` table and a ``metadata`` table.
+
+    All rows go in with executemany inside a single transaction. The
+    ``(entity_id, timestamp)`` index is built once at the end, which is
+    cheaper than maintaining it during the bulk load.
+    """
+
+    extension = ".sqlite"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        # Writers may be fed from different executor threads, one at a time.
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=OFF;")
+        self._conn.execute("PRAGMA synchronous=OFF;")
+        columns = ", ".join(
+            f'"{field.name}" {_sql_type(field.type)}' for field in self.schema
+        )
+        self._conn.execute(f"CREATE TABLE export ({columns})")
+        self._conn.execute("CREATE TABLE metadata (line_no INTEGER PRIMARY KEY, line TEXT)")
+        self._conn.executemany(
+            "INSERT INTO metadata (line_no, line) VALUES (?, ?)",
+            enumerate(self.metadata_lines),
+        )
+        placeholders = ", ".join("?" for _ in self.schema.names)
+        self._insert = f"INSERT INTO export VALUES ({placeholders})"
+
+    def _write_batch(self, batch: pa.RecordBatch) -> None:
+        self._conn.executemany(self._insert, iter_rows(batch))
+
+    def close(self) -> None:
+        key = [name for name in ("entity_id", "timestamp") if name in self.schema.names]
+        if key:
+            self._conn.execute(
+                f"CREATE INDEX idx_export_key ON export ({', '.join(key)})"
+            )
+        self._conn.commit()
+        self._conn.close()
+
+
+class XlsxWriter(ExportWriter):
+    """Write-only workbook that starts a new sheet at Excel's row limit.
+
+    openpyxl's write-only mode streams rows to temporary XML parts, so memory
+    stays flat however many rows are written. Data sheets are named ``data``,
+    ``data_2``, ...; metadata lines go to their own ``metadata`` sheet.
+    """
+
+    extension = ".xlsx"
+
+    def __init__(self, *args, **kwargs) -> None:
+        from openpyxl import Workbook
+
+        super().__init__(*args, **kwargs)
+        self._workbook = Workbook(write_only=True)
+        self._sheet = None
+        self._sheet_count = 0
+        self._sheet_rows = 0
+
+    def _next_sheet(self) -> None:
+        self._sheet_count += 1
+        title = "data" if self._sheet_count == 1 else f"data_{self._sheet_count}"
+        self._sheet = self._workbook.create_sheet(title)
+        self._sheet.append(self.schema.names)
+        self._sheet_rows = 1
+
+    def _write_batch(self, batch: pa.RecordBatch) -> None:
+        for row in iter_rows(batch):
+            if self._sheet is None or self._sheet_rows >= XLSX_MAX_ROWS:
+                self._next_sheet()
+            self._sheet.append(row)
+            self._sheet_rows += 1
+
+    def close(self) -> None:
+        if self._sheet is None:
+            self._next_sheet()
+        if self.metadata_lines:
+            sheet = self._workbook.create_sheet("metadata")
+            for line in self.metadata_lines:
+                sheet.append([line])
+        self._workbook.save(self.path)
+
+
+_HTML_HEAD = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body {{ font-family: sans-serif; margin: 1em; }}
+table {{ border-collapse: collapse; }}
+th, td {{ border: 1px solid #ccc; padding: 2px 6px; text-align: right; }}
+th {{ position: sticky; top: 0; background: #eee; }}
+nav {{ margin: 0.5em 0; }}
+</style></head><body>
+"""
+
+
+class HtmlWriter(ExportWriter):
+    """Paginated HTML: an index page plus fixed-size page files.
+
+    ``<name>.html`` lists every page with its row range and the first/last
+    value of the first column; rows live in ``<name>_pages/page_NNNNN.html``
+    with ``EXPORT_HTML_PAGE_ROWS`` rows each. Pages are streamed as rows
+    arrive, so a browser only ever opens a small file.
+    """
+
+    extension = ".html"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._name = os.path.basename(self.path)[: -len(self.extension)]
+        self._pages_dir = f"{self.path[: -len(self.extension)]}_pages"
+        if os.path.isdir(self._pages_dir):
+            shutil.rmtree(self._pages_dir)
+        os.makedirs(self._pages_dir)
+        self._header = "".join(f"<th>{html.escape(name)}</th>" for name in self.schema.names)
+        # (file name, first row, last row, first key, last key)
+        self._pages: list[tuple[str, int, int, str, str]] = []
+        self._page = None
+        self._page_rows = 0
+        self._rows = 0
+        self._first_key = ""
+        self._last_key = ""
+
+    @staticmethod
+    def _page_name(number: int) -> str:
+        return f"page_{number:05d}.html"
+
+    def _nav(self, number: int, has_next: bool) -> str:
+        links = [f'<a href="../{html.escape(self._name)}.html">index</a>']
+        if number > 1:
+            links.append(f'<a href="{self._page_name(number - 1)}">previous</a>')
+        if has_next:
+            links.append(f'<a href="{self._page_name(number + 1)}">next</a>')
+        return f"<nav>{' | '.join(links)}</nav>\n"
+
+    def _open_page(self) -> None:
+        number = len(self._pages) + 1
+        self._page = open(
+            os.path.join(self._pages_dir, self._page_name(number)), "w", encoding="utf-8"
+        )
+        self._page.write(_HTML_HEAD.format(title=f"{html.escape(self._name)} page {number}"))
+        self._page.write(f"<table><thead><tr>{self._header}</tr></thead><tbody>\n")
+        self._page_rows = 0
+
+    def _close_page(self, has_next: bool) -> None:
+        # Navigation goes below the table, once we know whether a next page exists.
+        number = len(self._pages) + 1
+        first = self._rows - self._page_rows + 1
+        self._page.write("</tbody></table>\n")
+        self._page.write(self._nav(number, has_next))
+        self._page.write("</body></html>\n")
+        self._page.close()
+        self._pages.append(
+            (self._page_name(number), first, self._rows, self._first_key, self._last_key)
+        )
+        self._page = None
+
+    def _write_batch(self, batch: pa.RecordBatch) -> None:
+        for row in iter_rows(batch):
+            if self._page is not None and self._page_rows >= EXPORT_HTML_PAGE_ROWS:
+                self._close_page(has_next=True)
+            if self._page is None:
+                self._open_page()
+            key = "" if row[0] is None else str(row[0])
+            if self._page_rows == 0:
+                self._first_key = key
+            self._last_key = key
+            cells = "".join(
+                f"<td>{'' if value is None else html.escape(str(value))}</td>"
+                for value in row
+            )
+            self._page.write(f"<tr>{cells}</tr>\n")
+            self._page_rows += 1
+            self._rows += 1
+
+    def close(self) -> None:
+        if self._page is not None:
+            self._close_page(has_next=False)
+
+        pages_rel = os.path.basename(self._pages_dir)
+        first_column = html.escape(self.schema.names[0]) if self.schema.names else ""
+        with open(self.path, "w", encoding="utf-8") as index:
+            index.write(_HTML_HEAD.format(title=html.escape(self._name)))
+            index.write(f"<h1>{html.escape(self._name)}</h1>\n")
+            if self.metadata_lines:
+                index.write(
+                    "<pre>" + html.escape("\n".join(self.metadata_lines)) + "</pre>\n"
+                )
+            index.write(f"<p>{self._rows} rows in {len(self._pages)} pages</p>\n")
+            index.write(
+                "<table><thead><tr><th>page</th><th>rows</th>"
+                f"<th>first {first_column}</th><th>last {first_column}</th>"
+                "</tr></thead><tbody>\n"
+            )
+            for number, (name, first, last, first_key, last_key) in enumerate(
+                self._pages, start=1
+            ):
+                index.write(
+                    f'<tr><td><a href="{pages_rel}/{name}">{number}</a></td>'
+                    f"<td>{first}-{last}</td>"
+                    f"<td>{html.escape(first_key)}</td>"
+                    f"<td>{html.escape(last_key)}</td></tr>\n"
+                )
+            index.write("</tbody></table>\n</body></html>\n")
+
+
+WRITERS: dict[str, type[ExportWriter]] = {
+    EXPORT_FORMAT_CSV: CsvWriter,
+    EXPORT_FORMAT_NDJSON: NdjsonWriter,
+    EXPORT_FORMAT_JSON: JsonWriter,
+    EXPORT_FORMAT_PARQUET: ParquetWriter,
+    EXPORT_FORMAT_FEATHER: FeatherWriter,
+    EXPORT_FORMAT_ARROW: ArrowWriter,
+    EXPORT_FORMAT_SQLITE: SqliteWriter,
+    EXPORT_FORMAT_XLSX: XlsxWriter,
+    EXPORT_FORMAT_HTML: HtmlWriter,
+}
+
+
+def open_writer(
+    fmt: str,
+    base_path: str,
+    schema: pa.Schema,
+    metadata_lines: list[str],
+    compression: str | None = None,
+) -> ExportWriter:
+    if compression is not None and compression not in SUPPORTED_EXPORT_COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {compression}")
+    os.makedirs(os.path.dirname(base_path), exist_ok=True)
+    return WRITERS[fmt](base_path, schema, metadata_lines, compression)
+
+
+class StreamEncoder:
+    """Encodes record batches into chunks of a response body, for HTTP streaming.
+
+    Like the writers, encoders are synchronous and meant for the executor.
+    """
+
+    content_type = ""
+
+    def __init__(self, schema: pa.Schema) -> None:
+        self.schema = schema
+
+    def encode(self, batch: pa.RecordBatch) -> bytes:
+        raise NotImplementedError
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _DrainedSink(io.BytesIO):
+    def take(self) -> bytes:
+        data = self.getvalue()
+        self.seek(0)
+        self.truncate()
+        return data
+
+
+class ArrowStreamEncoder(StreamEncoder):
+    """Arrow IPC stream format, readable by ``pyarrow.ipc.open_stream`` and friends."""
+
+    content_type = "application/vnd.apache.arrow.stream"
+
+    def __init__(self, schema: pa.Schema) -> None:
+        super().__init__(schema)
+        self._sink = _DrainedSink()
+        self._writer = pa.ipc.new_stream(self._sink, schema)
+
+    def encode(self, batch: pa.RecordBatch) -> bytes:
+        self._writer.write_batch(batch)
+        return self._sink.take()
+
+    def finish(self) -> bytes:
+        # End-of-stream marker
+        self._writer.close()
+        return self._sink.take()
+
+
+class NdjsonStreamEncoder(StreamEncoder):
+    """One JSON object per line, formatted like ``NdjsonWriter`` rows."""
+
+    content_type = "application/x-ndjson"
+
+    def encode(self, batch: pa.RecordBatch) -> bytes:
+        names = self.schema.names
+        lines = [json.dumps(dict(zip(names, row))) for row in iter_json_rows(batch)]
+        lines.append("")
+        return "\n".join(lines).encode("utf-8")
+
+
+STREAM_ENCODERS: dict[str, type[StreamEncoder]] = {
+    EXPORT_FORMAT_ARROW: ArrowStreamEncoder,
+    EXPORT_FORMAT_NDJSON: NdjsonStreamEncoder,
+}
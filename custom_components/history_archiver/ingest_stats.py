@@ -0,0 +1,316 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import (
+    DOMAIN,
+    INGEST_STATS_FLUSH_INTERVAL,
+    INGEST_STATS_ROW_OVERHEAD,
+    MIGRATION_BATCH_DELAY,
+)
+from .database import Database
+
+_LOGGER = logging.getLogger(__name__)
+
+_HOUR = timedelta(hours=1)
+
+# Stored size of the value column: a REAL, or a small dictionary code
+SAMPLE_VALUE_BYTES = 8
+STATE_CODE_BYTES = 1
+
+_COLUMNS = (
+    "entity_id",
+    "rows",
+    "size_bytes",
+    "archived_rows",
+    "samples_seen",
+    "samples_unchanged",
+    "first_write",
+    "last_write",
+    "hour_start",
+    "hour_rows",
+    "prev_hour_rows",
+)
+
+_UPSERT_SQL = (
+    f"INSERT OR REPLACE INTO entity_stats ({', '.join(_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in _COLUMNS)})"
+)
+
+# What one entity already holds; primary key range reads, same sizes as row_bytes()
+_SEED_SQL = f"""
+    SELECT COUNT(*),
+           SUM(length(entity_id) + length(ts) + value_bytes + {INGEST_STATS_ROW_OVERHEAD}),
+           MIN(ts),
+           MAX(ts),
+           (SELECT COALESCE(SUM(row_count), 0) FROM archive_files WHERE entity_id = :entity_id)
+    FROM (
+        SELECT entity_id, ts, {SAMPLE_VALUE_BYTES} AS value_bytes
+        FROM state_samples WHERE entity_id = :entity_id
+        UNION ALL
+        SELECT entity_id, ts, {STATE_CODE_BYTES} AS value_bytes
+        FROM state_coded_samples WHERE entity_id = :entity_id
+    )
+"""
+
+
+def row_bytes(entity_id: str, ts: str, value_bytes: int) -> int:
+    """Approximate on-disk size of one sample row."""
+    return len(entity_id) + len(ts) + value_bytes + INGEST_STATS_ROW_OVERHEAD
+
+
+class EntityStats:
+    """Running counters of one entity, mirrored in ``entity_stats``."""
+
+    __slots__ = _COLUMNS[1:]
+
+    def __init__(
+        self,
+        rows: int = 0,
+        size_bytes: int = 0,
+        archived_rows: int = 0,
+        samples_seen: int = 0,
+        samples_unchanged: int = 0,
+        first_write: str | None = None,
+        last_write: str | None = None,
+        hour_start: str | None = None,
+        hour_rows: int = 0,
+        prev_hour_rows: int = 0,
+    ) -> None:
+        self.rows = rows
+        self.size_bytes = size_bytes
+        self.archived_rows = archived_rows
+        self.samples_seen = samples_seen
+        self.samples_unchanged = samples_unchanged
+        self.first_write = first_write
+        self.last_write = last_write
+        self.hour_start = hour_start
+        self.hour_rows = hour_rows
+        self.prev_hour_rows = prev_hour_rows
+
+    def roll(self, hour: str) -> None:
+        """Start a new hourly bucket if ``hour`` is past the current one."""
+        if self.hour_start == hour:
+            return
+        previous = (datetime.fromisoformat(hour) - _HOUR).isoformat()
+        self.prev_hour_rows = self.hour_rows if self.hour_start == previous else 0
+        self.hour_start = hour
+        self.hour_rows = 0
+
+
+class IngestStats:
+    """Per-entity storage accounting, updated incrementally by every writer.
+
+    The table is small (one row per entity) and held in memory; the
+    sampler, the recorder backfill and archive tiering update the counters
+    in place, and changed rows are written back every
+    ``INGEST_STATS_FLUSH_INTERVAL``. ``rows`` and ``size_bytes`` track what is
+    held in SQLite, so rows moved to the Parquet archive are subtracted.
+
+    Rows written before the table existed are counted in the background, one
+    entity per transaction, for the entities listed in ``entity_stats_seed``.
+    """
+
+    def __init__(self, hass: HomeAssistant, db: Database) -> None:
+        self._hass = hass
+        self._db = db
+        self._stats: dict[str, EntityStats] = {}
+        self._dirty: set[str] = set()
+        # entity_id -> last observed value or state code, for unchanged samples
+        self._last_seen: dict[str, float | int] = {}
+        self._unsub = None
+        self._seed_task: asyncio.Task | None = None
+
+    async def async_load(self) -> None:
+        rows = await self._db.async_fetchall(
+            f"SELECT {', '.join(_COLUMNS)} FROM entity_stats"
+        )
+        self._stats = {row[0]: EntityStats(*row[1:]) for row in rows}
+        self._dirty = set()
+        self._last_seen = {}
+
+    async def async_start(self) -> None:
+        self._unsub = async_track_time_interval(
+            self._hass,
+            self._async_scheduled_flush,
+            timedelta(seconds=INGEST_STATS_FLUSH_INTERVAL),
+        )
+        self._start_seed()
+
+    async def async_stop(self) -> None:
+        if self._unsub:
+            self._unsub()
+            self._unsub = None
+        if self._seed_task is not None:
+            self._seed_task.cancel()
+            self._seed_task = None
+        await self.async_flush()
+
+    @callback
+    def async_invalidate(self) -> None:
+        """Reload the counters of a restored database."""
+        self._hass.async_create_task(self._async_reload())
+
+    async def _async_reload(self) -> None:
+        await self.async_load()
+        if self._unsub is not None:
+            self._start_seed()
+
+    def _start_seed(self) -> None:
+        if self._seed_task is None or self._seed_task.done():
+            self._seed_task = self._hass.async_create_background_task(
+                self._async_seed(), f"{DOMAIN}_ingest_stats_seed"
+            )
+
+    async def _async_seed(self) -> None:
+        # state_samples is only complete once the v2 copy has finished
+        while self._db.migrations_pending:
+            await asyncio.sleep(INGEST_STATS_FLUSH_INTERVAL)
+        try:
+            while (
+                row := await self._db.async_fetchone(
+                    "SELECT entity_id FROM entity_stats_seed LIMIT 1"
+                )
+            ) is not None:
+                await self._async_seed_entity(row[0])
+                await asyncio.sleep(MIGRATION_BATCH_DELAY)
+        except Exception:  # noqa: BLE001
+            _LOGGER.exception("Counting existing samples failed, will resume on next start")
+
+    async def _async_seed_entity(self, entity_id: str) -> None:
+        rows, size_bytes, first_ts, last_ts, archived_rows = await self._db.async_fetchone(
+            _SEED_SQL, {"entity_id": entity_id}
+        )
+        # Replaces what live writers counted so far, which the query already
+        # includes; the counters of observed samples are kept.
+        stats = self._get(entity_id)
+        stats.rows = rows
+        stats.size_bytes = size_bytes or 0
+        stats.archived_rows = archived_rows
+        if first_ts is not None:
+            stats.first_write = min(first_ts, stats.first_write or first_ts)
+            stats.last_write = max(last_ts, stats.last_write or last_ts)
+        await self._db.async_execute_batch(
+            [
+                (_UPSERT_SQL, self._row(entity_id, stats)),
+                ("DELETE FROM entity_stats_seed WHERE entity_id = ?", (entity_id,)),
+            ]
+        )
+
+    async def _async_scheduled_flush(self, now: datetime) -> None:
+        await self.async_flush()
+
+    async def async_flush(self) -> None:
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        try:
+            await self._db.async_executemany(
+                _UPSERT_SQL,
+                [
+                    self._row(entity_id, stats)
+                    for entity_id in dirty
+                    if (stats := self._stats.get(entity_id)) is not None
+                ],
+            )
+        except Exception:
+            self._dirty |= dirty
+            raise
+
+    @staticmethod
+    def _row(entity_id: str, stats: EntityStats) -> tuple:
+        return (entity_id, *(getattr(stats, name) for name in EntityStats.__slots__))
+
+    def _get(self, entity_id: str) -> EntityStats:
+        self._dirty.add(entity_id)
+        stats = self._stats.get(entity_id)
+        if stats is None:
+            stats = self._stats[entity_id] = EntityStats()
+        return stats
+
+    def _add_rows(self, stats: EntityStats, now: datetime, rows: int, nbytes: int) -> None:
+        ts = now.isoformat()
+        stats.rows += rows
+        stats.size_bytes += nbytes
+        stats.first_write = stats.first_write or ts
+        stats.last_write = ts
+        stats.roll(now.replace(minute=0, second=0, microsecond=0).isoformat())
+        stats.hour_rows += rows
+
+    def record(
+        self,
+        entity_id: str,
+        now: datetime,
+        ts: str,
+        value: float | int,
+        stored: bool,
+        value_bytes: int,
+    ) -> None:
+        """Count one sample the sampler observed, and its row if it was stored."""
+        stats = self._get(entity_id)
+        stats.samples_seen += 1
+        if self._last_seen.get(entity_id) == value:
+            stats.samples_unchanged += 1
+        self._last_seen[entity_id] = value
+        if stored:
+            self._add_rows(stats, now, 1, row_bytes(entity_id, ts, value_bytes))
+
+    def record_import(self, entity_id: str, rows: int, nbytes: int) -> None:
+        """Count rows written in bulk, e.g. by the recorder backfill."""
+        if rows:
+            self._add_rows(self._get(entity_id), datetime.utcnow(), rows, nbytes)
+
+    def record_archived(self, entity_id: str, rows: int, nbytes: int) -> None:
+        """Move rows from the SQLite counters to the archived count."""
+        stats = self._get(entity_id)
+        stats.rows = max(stats.rows - rows, 0)
+        stats.size_bytes = max(stats.size_bytes - nbytes, 0)
+        stats.archived_rows += rows
+
+    def report(self, limit: int | None = None) -> list[dict[str, Any]]:
+        """Per-entity counters, largest share of the database first."""
+        hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0).isoformat()
+        total_bytes = sum(stats.size_bytes for stats in self._stats.values())
+        ranked = sorted(self._stats.items(), key=lambda item: item[1].size_bytes, reverse=True)
+        report = []
+        for entity_id, stats in ranked[:limit]:
+            # Without altering the stored bucket, which only writers roll
+            current = EntityStats(
+                hour_start=stats.hour_start,
+                hour_rows=stats.hour_rows,
+                prev_hour_rows=stats.prev_hour_rows,
+            )
+            current.roll(hour)
+            report.append(
+                {
+                    "entity_id": entity_id,
+                    "rows": stats.rows,
+                    "size_bytes": stats.size_bytes,
+                    "share_of_bytes": round(stats.size_bytes / total_bytes, 4)
+                    if total_bytes
+                    else 0.0,
+                    "archived_rows": stats.archived_rows,
+                    "samples_per_hour": current.prev_hour_rows,
+                    "samples_this_hour": current.hour_rows,
+                    "unchanged_share": round(
+                        stats.samples_unchanged / stats.samples_seen, 4
+                    )
+                    if stats.samples_seen
+                    else None,
+                    "first_write": stats.first_write,
+                    "last_write": stats.last_write,
+                }
+            )
+        return report
+
+    def totals(self) -> dict[str, int]:
+        return {
+            "entities": len(self._stats),
+            "rows": sum(stats.rows for stats in self._stats.values()),
+            "size_bytes": sum(stats.size_bytes for stats in self._stats.values()),
+            "archived_rows": sum(stats.archived_rows for stats in self._stats.values()),
+        }
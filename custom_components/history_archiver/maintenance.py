@@ -0,0 +1,181 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.event import async_track_time_change, async_track_time_interval
+
+from .const import (
+    DB_IDLE_SECONDS,
+    DB_MAINTENANCE_INTERVAL,
+    DB_OPTIMIZE_HOUR,
+    DB_OPTIMIZE_MINUTE,
+    DB_VACUUM_MAX_PAGES,
+    DB_VACUUM_MIN_FREE_PAGES,
+)
+from .database import Database
+
+_LOGGER = logging.getLogger(__name__)
+
+_AUTO_VACUUM_INCREMENTAL = 2
+
+
+class DatabaseMaintenance:
+    """Keeps the SQLite file compact and its query planner statistics fresh.
+
+    Every ``DB_MAINTENANCE_INTERVAL``, if the database is idle, free pages
+    are released in bounded steps and the WAL is checkpointed and
+    truncated. Once a day ``PRAGMA optimize`` refreshes planner statistics.
+    """
+
+    def __init__(self, hass: HomeAssistant, db: Database) -> None:
+        self._hass = hass
+        self._db = db
+        self._unsub: list = []
+        self._running = False
+        self._last_checkpoint: str | None = None
+        self._last_vacuum: str | None = None
+        self._last_optimize: str | None = None
+        self._rebuild_logged = False
+
+    async def async_start(self) -> None:
+        # Analyzes only tables that have never been analyzed or changed a lot,
+        # sampling at most DB_ANALYSIS_LIMIT rows per index
+        await self._db.async_fetchall("PRAGMA optimize=0x10002;")
+        self._unsub.append(
+            async_track_time_interval(
+                self._hass,
+                self._async_idle_window,
+                timedelta(seconds=DB_MAINTENANCE_INTERVAL),
+            )
+        )
+        self._unsub.append(
+            async_track_time_change(
+                self._hass,
+                self._async_daily,
+                hour=DB_OPTIMIZE_HOUR,
+                minute=DB_OPTIMIZE_MINUTE,
+                second=0,
+            )
+        )
+
+    async def async_stop(self) -> None:
+        for unsub in self._unsub:
+            unsub()
+        self._unsub = []
+
+    def _is_idle(self) -> bool:
+        return (
+            not self._running
+            and not self._db.migrations_pending
+            and self._db.idle_seconds >= DB_IDLE_SECONDS
+        )
+
+    async def _async_idle_window(self, now: datetime) -> None:
+        if not self._is_idle():
+            _LOGGER.debug("Skipping DB maintenance, database busy")
+            return
+        self._running = True
+        try:
+            # Vacuum first so the checkpoint also shrinks the database file
+            await self.async_incremental_vacuum()
+            await self.async_checkpoint()
+        finally:
+            self._running = False
+
+    async def _async_daily(self, now: datetime) -> None:
+        if not self._is_idle():
+            _LOGGER.debug("Skipping daily DB optimize, database busy")
+            return
+        self._running = True
+        try:
+            await self.async_optimize()
+            await self._async_check_auto_vacuum()
+        finally:
+            self._running = False
+        _LOGGER.debug("DB maintenance report: %s", await self.async_report())
+
+    async def async_checkpoint(self) -> bool:
+        """Checkpoint the WAL into the database and truncate it to zero bytes."""
+        busy, wal_pages, checkpointed = await self._db.async_fetchone(
+            "PRAGMA wal_checkpoint(TRUNCATE);"
+        )
+        if busy:
+            _LOGGER.debug(
+                "WAL checkpoint incomplete: %s of %s pages", checkpointed, wal_pages
+            )
+            return False
+        self._last_checkpoint = datetime.utcnow().isoformat()
+        return True
+
+    async def async_incremental_vacuum(self) -> int:
+        """Release up to ``DB_VACUUM_MAX_PAGES`` free pages; return how many."""
+        (auto_vacuum,) = await self._db.async_fetchone("PRAGMA auto_vacuum;")
+        (free_pages,) = await self._db.async_fetchone("PRAGMA freelist_count;")
+        if auto_vacuum != _AUTO_VACUUM_INCREMENTAL or free_pages < DB_VACUUM_MIN_FREE_PAGES:
+            return 0
+        pages = min(free_pages, DB_VACUUM_MAX_PAGES)
+        await self._db.async_executescript(f"PRAGMA incremental_vacuum({pages});")
+        self._last_vacuum = datetime.utcnow().isoformat()
+        _LOGGER.debug("Released %s of %s free DB pages", pages, free_pages)
+        return pages
+
+    async def async_optimize(self) -> None:
+        await self._db.async_fetchall("PRAGMA optimize;")
+        self._last_optimize = datetime.utcnow().isoformat()
+
+    async def _async_check_auto_vacuum(self) -> None:
+        """Recommend the one-off rebuild for DBs created before incremental vacuum.
+
+        The rebuild is a full VACUUM: it holds the database for as long as it
+        takes to copy every page and needs about twice the file size on disk,
+        so it is never run from here.
+        """
+        if self._rebuild_logged:
+            return
+        (auto_vacuum,) = await self._db.async_fetchone("PRAGMA auto_vacuum;")
+        if auto_vacuum == _AUTO_VACUUM_INCREMENTAL:
+            return
+        self._rebuild_logged = True
+        _LOGGER.warning(
+            "%s was created without incremental vacuum, so space freed by archiving "
+            "is only reused, never returned. To enable it, stop Home Assistant and run "
+            "sqlite3 %s 'PRAGMA auto_vacuum=INCREMENTAL; VACUUM;' "
+            "(needs free disk space of about twice the file size)",
+            self._db.path,
+            self._db.path,
+        )
+
+    async def async_report(self) -> dict[str, Any]:
+        """Return file sizes, free space and the last maintenance times.
+
+        ``fragmentation`` is the share of pages on the freelist: allocated on
+        disk but holding no data.
+        """
+        (page_size,) = await self._db.async_fetchone("PRAGMA page_size;")
+        (page_count,) = await self._db.async_fetchone("PRAGMA page_count;")
+        (free_pages,) = await self._db.async_fetchone("PRAGMA freelist_count;")
+        (auto_vacuum,) = await self._db.async_fetchone("PRAGMA auto_vacuum;")
+        db_bytes, wal_bytes = await self._hass.async_add_executor_job(self._file_sizes)
+        return {
+            "db_bytes": db_bytes,
+            "wal_bytes": wal_bytes,
+            "page_size": page_size,
+            "page_count": page_count,
+            "freelist_pages": free_pages,
+            "fragmentation": round(free_pages / page_count, 4) if page_count else 0.0,
+            "incremental_vacuum": auto_vacuum == _AUTO_VACUUM_INCREMENTAL,
+            "last_checkpoint": self._last_checkpoint,
+            "last_vacuum": self._last_vacuum,
+            "last_optimize": self._last_optimize,
+        }
+
+    def _file_sizes(self) -> tuple[int, int]:
+        sizes = []
+        for path in (self._db.path, f"{self._db.path}-wal"):
+            try:
+                sizes.append(os.path.getsize(path))
+            except FileNotFoundError:
+                sizes.append(0)
+        return sizes[0], sizes[1]
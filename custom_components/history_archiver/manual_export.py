@@ -3,8 +3,9 @@ from typing import Any
 
 from homeassistant.core import HomeAssistant
 
+from .const import EXPORT_LAYOUT_PER_ENTITY, STATE_AGGREGATION_LAST
 from .database import Database
-from .export_engine import ExportEngine
+from .export_loader import ExportEngineLoader
 from .profile_manager import ProfileManager
 
 
@@ -16,7 +17,7 @@ class ManualExportEngine:
         hass: HomeAssistant,
         db: Database,
         profile_manager: ProfileManager,
-        export_engine: ExportEngine,
+        export_engine: ExportEngineLoader,
     ) -> None:
         self._hass = hass
         self._db = db
@@ -31,12 +32,19 @@ class ManualExportEngine:
         resolution_seconds: int,
         formats: list[str],
         label: str = "manual",
+        compression: str | None = None,
+        layout: str = EXPORT_LAYOUT_PER_ENTITY,
+        state_aggregation: str = STATE_AGGREGATION_LAST,
     ) -> dict[str, Any]:
-        return await self._export_engine.async_export(
+        engine = await self._export_engine.async_get()
+        return await engine.async_export(
             entity_ids,
             start_ts,
             end_ts,
             resolution_seconds,
             formats,
             label,
+            compression=compression,
+            layout=layout,
+            state_aggregation=state_aggregation,
         )
@@ -0,0 +1,201 @@
+"""Versioned schema migrations for the History Archiver DB.
+
+Each migration has a fast ``upgrade_sql`` script that runs at startup inside
+a single transaction, and optionally a ``BackgroundCopy`` that moves existing
+rows in resumable batches while the integration keeps running. While a copy
+is in progress, reads of the affected table go through ``dual_read_sql``,
+which combines the new table with the part of the old one not yet copied.
+"""
+
+from __future__ import annotations
+
+
+class BackgroundCopy:
+    """Batch copy of rows from a retired table into its replacement."""
+
+    def __init__(
+        self,
+        table: str,
+        source: str,
+        copy_sql: str,
+        dual_read_sql: str,
+        finalize_statements: list[str],
+    ) -> None:
+        # Logical table name readers ask for.
+        self.table = table
+        # Table being drained; copied by rowid ranges.
+        self.source = source
+        # Statement with two parameters: (after_rowid, up_to_rowid).
+        self.copy_sql = copy_sql
+        # Subquery used for reads; ``{checkpoint}`` is the last copied rowid.
+        self.dual_read_sql = dual_read_sql
+        # Statements run in the same transaction as the last batch.
+        self.finalize_statements = finalize_statements
+
+
+class Migration:
+    """A single schema version step."""
+
+    def __init__(
+        self,
+        version: int,
+        description: str,
+        upgrade_sql: str,
+        copy: BackgroundCopy | None = None,
+    ) -> None:
+        self.version = version
+        self.description = description
+        self.upgrade_sql = upgrade_sql
+        self.copy = copy
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(
+        version=2,
+        description="Compact state_samples clustered on (entity_id, ts)",
+        upgrade_sql="""
+            ALTER TABLE state_samples RENAME TO state_samples_legacy;
+
+            CREATE TABLE state_samples (
+                entity_id TEXT NOT NULL,
+                ts TEXT NOT NULL,
+                value REAL,
+                PRIMARY KEY (entity_id, ts)
+            ) WITHOUT ROWID;
+        """,
+        copy=BackgroundCopy(
+            table="state_samples",
+            source="state_samples_legacy",
+            copy_sql="""
+                INSERT OR IGNORE INTO state_samples (entity_id, ts, value)
+                SELECT entity_id, ts, value FROM state_samples_legacy
+                WHERE id > ? AND id <= ?
+            """,
+            dual_read_sql="""(
+                SELECT entity_id, ts, value FROM state_samples
+                UNION ALL
+                SELECT entity_id, ts, value FROM state_samples_legacy
+                WHERE id > {checkpoint}
+            )""",
+            finalize_statements=["DROP TABLE state_samples_legacy"],
+        ),
+    ),
+    Migration(
+        version=3,
+        description="Index of Parquet archive files",
+        upgrade_sql="""
+            CREATE TABLE IF NOT EXISTS archive_files (
+                path TEXT PRIMARY KEY,
+                entity_id TEXT NOT NULL,
+                year INTEGER NOT NULL,
+                month INTEGER NOT NULL,
+                row_count INTEGER NOT NULL,
+                min_ts TEXT NOT NULL,
+                max_ts TEXT NOT NULL,
+                archived_at TEXT NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_archive_files_entity
+                ON archive_files(entity_id, min_ts);
+        """,
+    ),
+    Migration(
+        version=4,
+        description="Change-only storage settings per entity",
+        upgrade_sql="""
+            ALTER TABLE entities ADD COLUMN change_epsilon REAL NOT NULL DEFAULT 0;
+            ALTER TABLE entities ADD COLUMN heartbeat_seconds INTEGER;
+
+            UPDATE entities SET stats_mode = 'raw' WHERE stats_mode IS NULL;
+        """,
+    ),
+    Migration(
+        version=5,
+        description="Dictionary-encoded non-numeric states",
+        upgrade_sql="""
+            CREATE TABLE IF NOT EXISTS state_values (
+                entity_id TEXT NOT NULL,
+                code INTEGER NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (entity_id, code),
+                UNIQUE (entity_id, value)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS state_coded_samples (
+                entity_id TEXT NOT NULL,
+                ts TEXT NOT NULL,
+                code INTEGER NOT NULL,
+                PRIMARY KEY (entity_id, ts)
+            ) WITHOUT ROWID;
+        """,
+    ),
+    Migration(
+        version=6,
+        description="Resumable export job queue",
+        upgrade_sql="""
+            ALTER TABLE export_runs ADD COLUMN request TEXT;
+            ALTER TABLE export_runs ADD COLUMN entities_total INTEGER NOT NULL DEFAULT 0;
+            ALTER TABLE export_runs ADD COLUMN entities_done INTEGER NOT NULL DEFAULT 0;
+            ALTER TABLE export_runs ADD COLUMN outputs TEXT;
+            ALTER TABLE export_runs ADD COLUMN started_at TEXT;
+            ALTER TABLE export_runs ADD COLUMN finished_at TEXT;
+
+            CREATE INDEX IF NOT EXISTS idx_export_runs_status
+                ON export_runs(status, id);
+
+            CREATE TABLE IF NOT EXISTS export_run_entities (
+                run_id INTEGER NOT NULL,
+                entity_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                outputs TEXT,
+                PRIMARY KEY (run_id, entity_id),
+                FOREIGN KEY(run_id) REFERENCES export_runs(id) ON DELETE CASCADE
+            ) WITHOUT ROWID;
+        """,
+    ),
+    Migration(
+        version=7,
+        description="Export run peak memory",
+        upgrade_sql="""
+            ALTER TABLE export_runs ADD COLUMN peak_rss_bytes INTEGER;
+        """,
+    ),
+    Migration(
+        version=8,
+        description="Per-entity storage and ingest statistics",
+        # Existing rows are counted afterwards, one entity at a time, by
+        # IngestStats; entity_stats_seed lists the entities still to count.
+        upgrade_sql="""
+            CREATE TABLE IF NOT EXISTS entity_stats (
+                entity_id TEXT PRIMARY KEY,
+                rows INTEGER NOT NULL DEFAULT 0,
+                size_bytes INTEGER NOT NULL DEFAULT 0,
+                archived_rows INTEGER NOT NULL DEFAULT 0,
+                samples_seen INTEGER NOT NULL DEFAULT 0,
+                samples_unchanged INTEGER NOT NULL DEFAULT 0,
+                first_write TEXT,
+                last_write TEXT,
+                hour_start TEXT,
+                hour_rows INTEGER NOT NULL DEFAULT 0,
+                prev_hour_rows INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS entity_stats_seed (
+                entity_id TEXT PRIMARY KEY
+            ) WITHOUT ROWID;
+
+            INSERT OR IGNORE INTO entity_stats_seed (entity_id)
+            SELECT entity_id FROM entities
+            UNION
+            SELECT entity_id FROM archive_files;
+        """,
+    ),
+]
+
+
+def get_migration(version: int) -> Migration:
+    for migration in MIGRATIONS:
+        if migration.version == version:
+            return migration
+    raise KeyError(version)
@@ -0,0 +1,174 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import DOMAIN, EXPORT_PARTIALS_FOLDER, EXPORT_PARTIALS_MAX_AGE_DAYS
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def _partial_schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            ("grid_us", pa.int64()),
+            ("value", pa.float64()),
+            ("code", pa.int8()),
+        ]
+    )
+
+
+class PartialResult:
+    """Downsampled grid points of one sub-range between its first and last sample.
+
+    Points before the first or after the last sample depend on neighbouring
+    sub-ranges and are left out, so a stored result never goes stale when
+    data arrives elsewhere. ``first``/``second``/``last`` are (epoch us,
+    value) samples; None when the sub-range holds no (or only one) sample.
+    """
+
+    __slots__ = ("first", "second", "last", "grid_us", "values", "codes")
+
+    def __init__(
+        self,
+        first: tuple[int, float] | None,
+        second: tuple[int, float] | None,
+        last: tuple[int, float] | None,
+        grid_us: np.ndarray,
+        values: np.ndarray,
+        codes: np.ndarray,
+    ) -> None:
+        self.first = first
+        self.second = second
+        self.last = last
+        self.grid_us = grid_us
+        self.values = values
+        self.codes = codes
+
+
+class PartialResultStore:
+    """Arrow IPC files of partial export results for closed sub-ranges.
+
+    Layout: ``partials/<entity_id>/<key>.arrow``. Files unused for
+    ``EXPORT_PARTIALS_MAX_AGE_DAYS`` are pruned daily.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._root = hass.config.path(DOMAIN, EXPORT_PARTIALS_FOLDER)
+        self._unsub = None
+
+    async def async_start(self) -> None:
+        await self._hass.async_add_executor_job(os.makedirs, self._root, 0o755, True)
+        self._unsub = async_track_time_interval(
+            self._hass, self._async_scheduled_prune, timedelta(days=1)
+        )
+
+    async def async_stop(self) -> None:
+        if self._unsub:
+            self._unsub()
+            self._unsub = None
+
+    async def _async_scheduled_prune(self, now: datetime) -> None:
+        await self._hass.async_add_executor_job(self.prune)
+
+    @staticmethod
+    def key(
+        lo_us: int, hi_us: int, grid_first_us: int, resolution_seconds: int, hold: bool
+    ) -> str:
+        return f"{resolution_seconds}_{int(hold)}_{lo_us}_{hi_us}_{grid_first_us - lo_us}"
+
+    def _path(self, entity_id: str, key: str) -> str:
+        return os.path.join(self._root, entity_id, f"{key}.arrow")
+
+    def load(self, entity_id: str, key: str) -> PartialResult | None:
+        """Read a stored result; runs in the executor."""
+        import pyarrow as pa
+
+        path = self._path(entity_id, key)
+        try:
+            with pa.memory_map(path) as source:
+                table = pa.ipc.open_file(source).read_all()
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        os.utime(path)
+
+        meta = table.schema.metadata or {}
+        first, second, last = (
+            (int(meta[f"{name}_us".encode()]), float(meta[f"{name}_value".encode()]))
+            if f"{name}_us".encode() in meta
+            else None
+            for name in ("first", "second", "last")
+        )
+        return PartialResult(
+            first,
+            second,
+            last,
+            table.column("grid_us").to_numpy(),
+            table.column("value").to_numpy(),
+            table.column("code").to_numpy(),
+        )
+
+    def save(self, entity_id: str, key: str, result: PartialResult) -> None:
+        """Write a result atomically; runs in the executor."""
+        import pyarrow as pa
+
+        meta = {}
+        for name in ("first", "second", "last"):
+            sample = getattr(result, name)
+            if sample is not None:
+                meta[f"{name}_us".encode()] = str(sample[0]).encode()
+                meta[f"{name}_value".encode()] = repr(sample[1]).encode()
+        table = pa.Table.from_arrays(
+            [
+                pa.array(result.grid_us, type=pa.int64()),
+                pa.array(result.values, type=pa.float64()),
+                pa.array(result.codes, type=pa.int8()),
+            ],
+            schema=_partial_schema().with_metadata(meta),
+        )
+        path = self._path(entity_id, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Concurrent exports may compute the same closed sub-range
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(
+                sink,
+                table.schema,
+                options=pa.ipc.IpcWriteOptions(compression="zstd"),
+            ) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+    @callback
+    def async_clear(self) -> None:
+        """Drop every stored result in the background, e.g. after a DB restore."""
+        self._hass.async_add_executor_job(self.clear)
+
+    def clear(self, entity_id: str | None = None) -> None:
+        """Drop stored results of one entity, or all; runs in the executor."""
+        path = self._root if entity_id is None else os.path.join(self._root, entity_id)
+        shutil.rmtree(path, ignore_errors=True)
+
+    def prune(self) -> None:
+        cutoff = time.time() - EXPORT_PARTIALS_MAX_AGE_DAYS * 86400
+        removed = 0
+        for dirpath, _, filenames in os.walk(self._root):
+            for filename in filenames:
+                full = os.path.join(dirpath, filename)
+                if os.path.getmtime(full) < cutoff:
+                    os.remove(full)
+                    removed += 1
+        if removed:
+            _LOGGER.debug("Pruned %s unused partial export results", removed)
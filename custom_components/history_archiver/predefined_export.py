@@ -3,8 +3,10 @@ from typing import Any
 
 from homeassistant.core import HomeAssistant
 
+from .const import EXPORT_LAYOUT_PER_ENTITY, STATE_AGGREGATION_LAST
 from .database import Database
-from .export_engine import ExportEngine
+from .export_loader import ExportEngineLoader
+from .export_planner import ExportJob
 from .profile_manager import ProfileManager
 
 
@@ -16,7 +18,7 @@ class PredefinedExportEngine:
         hass: HomeAssistant,
         db: Database,
         profile_manager: ProfileManager,
-        export_engine: ExportEngine,
+        export_engine: ExportEngineLoader,
     ) -> None:
         self._hass = hass
         self._db = db
@@ -29,11 +31,23 @@ class PredefinedExportEngine:
         day: datetime,
         resolution_seconds: int,
         formats: list[str],
+        compression: str | None = None,
+        layout: str = EXPORT_LAYOUT_PER_ENTITY,
+        state_aggregation: str = STATE_AGGREGATION_LAST,
     ) -> dict[str, Any]:
         start = datetime(day.year, day.month, day.day, 0, 0, 0)
         end = start + timedelta(days=1) - timedelta(seconds=1)
-        return await self._export_engine.async_export(
-            entity_ids, start, end, resolution_seconds, formats, "day"
+        engine = await self._export_engine.async_get()
+        return await engine.async_export(
+            entity_ids,
+            start,
+            end,
+            resolution_seconds,
+            formats,
+            "day",
+            compression=compression,
+            layout=layout,
+            state_aggregation=state_aggregation,
         )
 
     async def async_export_week(
@@ -42,14 +56,26 @@ class PredefinedExportEngine:
         any_day_in_week: datetime,
         resolution_seconds: int,
         formats: list[str],
+        compression: str | None = None,
+        layout: str = EXPORT_LAYOUT_PER_ENTITY,
+        state_aggregation: str = STATE_AGGREGATION_LAST,
     ) -> dict[str, Any]:
         # ISO week: Monday as first day
         weekday = any_day_in_week.weekday()
         monday = any_day_in_week - timedelta(days=weekday)
         start = datetime(monday.year, monday.month, monday.day, 0, 0, 0)
         end = start + timedelta(days=7) - timedelta(seconds=1)
-        return await self._export_engine.async_export(
-            entity_ids, start, end, resolution_seconds, formats, "week"
+        engine = await self._export_engine.async_get()
+        return await engine.async_export(
+            entity_ids,
+            start,
+            end,
+            resolution_seconds,
+            formats,
+            "week",
+            compression=compression,
+            layout=layout,
+            state_aggregation=state_aggregation,
         )
 
     async def async_export_month(
@@ -59,6 +85,9 @@ class PredefinedExportEngine:
         month: int,
         resolution_seconds: int,
         formats: list[str],
+        compression: str | None = None,
+        layout: str = EXPORT_LAYOUT_PER_ENTITY,
+        state_aggregation: str = STATE_AGGREGATION_LAST,
     ) -> dict[str, Any]:
         start = datetime(year, month, 1, 0, 0, 0)
         if month == 12:
@@ -66,8 +95,17 @@ class PredefinedExportEngine:
         else:
             next_month = datetime(year, month + 1, 1)
         end = next_month - timedelta(seconds=1)
-        return await self._export_engine.async_export(
-            entity_ids, start, end, resolution_seconds, formats, "month"
+        engine = await self._export_engine.async_get()
+        return await engine.async_export(
+            entity_ids,
+            start,
+            end,
+            resolution_seconds,
+            formats,
+            "month",
+            compression=compression,
+            layout=layout,
+            state_aggregation=state_aggregation,
         )
 
     async def async_export_year(
@@ -76,9 +114,64 @@ class PredefinedExportEngine:
         year: int,
         resolution_seconds: int,
         formats: list[str],
+        compression: str | None = None,
+        layout: str = EXPORT_LAYOUT_PER_ENTITY,
+        state_aggregation: str = STATE_AGGREGATION_LAST,
     ) -> dict[str, Any]:
         start = datetime(year, 1, 1, 0, 0, 0)
         end = datetime(year + 1, 1, 1, 0, 0, 0) - timedelta(seconds=1)
-        return await self._export_engine.async_export(
-            entity_ids, start, end, resolution_seconds, formats, "year"
+        engine = await self._export_engine.async_get()
+        return await engine.async_export(
+            entity_ids,
+            start,
+            end,
+            resolution_seconds,
+            formats,
+            "year",
+            compression=compression,
+            layout=layout,
+            state_aggregation=state_aggregation,
         )
+
+    async def async_export_profiles(
+        self,
+        profile_ids: list[int],
+        start: datetime,
+        end: datetime,
+        resolution_seconds: int,
+        compression: str | None = None,
+        layout: str = EXPORT_LAYOUT_PER_ENTITY,
+        state_aggregation: str = STATE_AGGREGATION_LAST,
+    ) -> dict[int, dict[str, Any]]:
+        """Export several profiles over one window as a single batch.
+
+        Entities shared between profiles are fetched and downsampled once.
+        Each profile uses its own approved entities and export formats.
+        """
+        profiles = []
+        jobs = []
+        for profile_id in profile_ids:
+            profile = self._profiles.get_profile(profile_id)
+            if profile is None or not profile["export_formats"]:
+                continue
+            entity_ids = await self._profiles.async_get_profile_entities(
+                profile_id, include_unapproved=False
+            )
+            profiles.append(profile_id)
+            jobs.append(
+                ExportJob(
+                    entity_ids,
+                    start,
+                    end,
+                    resolution_seconds,
+                    profile["export_formats"],
+                    f"profile_{profile_id}",
+                    compression=compression,
+                    layout=layout,
+                    state_aggregation=state_aggregation,
+                )
+            )
+
+        engine = await self._export_engine.async_get()
+        results = await engine.async_export_batch(jobs)
+        return dict(zip(profiles, results))
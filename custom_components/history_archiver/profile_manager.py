@@ -1,21 +1,144 @@
 import json
 import logging
+from collections.abc import Callable
 from datetime import datetime
 from typing import Any
 
 from homeassistant.core import HomeAssistant
 
+from .const import RULE_KEYS
 from .database import Database
 
 _LOGGER = logging.getLogger(__name__)
 
+_PROFILE_COLUMNS = (
+    "id, name, description, tags, active, archived, auto_add_entities, "
+    "export_formats, schedule_json, date_active_from, date_active_until, "
+    "created_at, updated_at"
+)
+
 
 class ProfileManager:
-    """Manages profiles, their entities, schedules, and lifecycle."""
+    """Manages profiles, their entities, schedules, and lifecycle.
+
+    Profiles and entity memberships are loaded once by ``async_load`` and kept
+    in memory. Every mutation is written through to the DB before the
+    in-memory copy is updated, so reads never touch SQLite.
+    """
 
     def __init__(self, hass: HomeAssistant, db: Database) -> None:
         self._hass = hass
         self._db = db
+        self._profiles: dict[int, dict[str, Any]] = {}
+        # profile_id -> entity_id -> {"approved": bool, "auto_added": bool}
+        self._members: dict[int, dict[str, dict[str, bool]]] = {}
+        # entity_id -> profile ids including it
+        self._entity_profiles: dict[str, set[int]] = {}
+        self._rules: dict[int, list[dict[str, Any]]] = {}
+        self._listeners: list[Callable[[int], None]] = []
+
+    async def async_load(self) -> None:
+        """Load profiles and memberships into memory."""
+        rows = await self._db.async_fetchall(f"SELECT {_PROFILE_COLUMNS} FROM profiles")
+        self._profiles = {row[0]: self._row_to_profile(row) for row in rows}
+
+        self._members = {pid: {} for pid in self._profiles}
+        self._entity_profiles = {}
+        rows = await self._db.async_fetchall(
+            "SELECT profile_id, entity_id, approved, auto_added FROM profile_entities"
+        )
+        for profile_id, entity_id, approved, auto_added in rows:
+            self._add_member(profile_id, entity_id, bool(approved), bool(auto_added))
+
+        self._rules = {}
+        rows = await self._db.async_fetchall(
+            "SELECT profile_id, rule_json FROM profile_rules ORDER BY id"
+        )
+        for profile_id, rule_json in rows:
+            self._rules.setdefault(profile_id, []).append(json.loads(rule_json))
+
+        _LOGGER.debug(
+            "Loaded %s profiles and %s profile entities",
+            len(self._profiles),
+            sum(len(m) for m in self._members.values()),
+        )
+
+    @staticmethod
+    def _row_to_profile(row) -> dict[str, Any]:
+        (
+            pid,
+            name,
+            description,
+            tags,
+            active,
+            archived,
+            auto_add_entities,
+            export_formats,
+            schedule_json,
+            date_active_from,
+            date_active_until,
+            created_at,
+            updated_at,
+        ) = row
+        return {
+            "id": pid,
+            "name": name,
+            "description": description,
+            "tags": tags.split(",") if tags else [],
+            "active": bool(active),
+            "archived": bool(archived),
+            "auto_add_entities": bool(auto_add_entities),
+            "export_formats": export_formats.split(",") if export_formats else [],
+            "schedule": json.loads(schedule_json) if schedule_json else None,
+            "date_active_from": date_active_from,
+            "date_active_until": date_active_until,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+    @staticmethod
+    def _copy_profile(profile: dict[str, Any]) -> dict[str, Any]:
+        return {
+            **profile,
+            "tags": list(profile["tags"]),
+            "export_formats": list(profile["export_formats"]),
+            "schedule": json.loads(json.dumps(profile["schedule"]))
+            if profile["schedule"] is not None
+            else None,
+        }
+
+    async def _async_reload_profile(self, profile_id: int) -> None:
+        row = await self._db.async_fetchone(
+            f"SELECT {_PROFILE_COLUMNS} FROM profiles WHERE id = ?",
+            (profile_id,),
+        )
+        if row is None:
+            self._profiles.pop(profile_id, None)
+            return
+        self._profiles[profile_id] = self._row_to_profile(row)
+        self._members.setdefault(profile_id, {})
+
+    def add_listener(self, listener: Callable[[int], None]) -> Callable[[], None]:
+        """Call ``listener(profile_id)`` whenever a profile or its rules change."""
+        self._listeners.append(listener)
+
+        def _remove() -> None:
+            self._listeners.remove(listener)
+
+        return _remove
+
+    def _notify(self, profile_id: int) -> None:
+        for listener in list(self._listeners):
+            listener(profile_id)
+
+    def _add_member(
+        self, profile_id: int, entity_id: str, approved: bool, auto_added: bool
+    ) -> None:
+        self._members.setdefault(profile_id, {})[entity_id] = {
+            "approved": approved,
+            "auto_added": auto_added,
+        }
+        self._entity_profiles.setdefault(entity_id, set()).add(profile_id)
 
     async def async_create_profile(
         self,
@@ -33,7 +156,7 @@ class ProfileManager:
         schedule_str = json.dumps(schedule_json) if schedule_json else None
         formats_str = ",".join(export_formats)
 
-        await self._db.async_execute(
+        profile_id = await self._db.async_execute(
             """
             INSERT INTO profiles (
                 name, description, tags, active, archived,
@@ -56,11 +179,10 @@ class ProfileManager:
                 now,
             ),
         )
-        row = await self._db.async_fetchone(
-            "SELECT last_insert_rowid();"
-        )
-        profile_id = int(row[0])
+        profile_id = int(profile_id)
+        await self._async_reload_profile(profile_id)
         _LOGGER.info("Created profile %s (%s)", profile_id, name)
+        self._notify(profile_id)
         return profile_id
 
     async def async_update_profile(
@@ -94,6 +216,8 @@ class ProfileManager:
             """,
             tuple(params),
         )
+        await self._async_reload_profile(profile_id)
+        self._notify(profile_id)
 
     async def async_set_profile_active(self, profile_id: int, active: bool) -> None:
         await self.async_update_profile(profile_id, active=int(active))
@@ -102,46 +226,82 @@ class ProfileManager:
         await self.async_update_profile(profile_id, archived=int(archived))
 
     async def async_get_profiles(self, include_archived: bool = False) -> list[dict[str, Any]]:
-        query = "SELECT id, name, description, tags, active, archived, auto_add_entities, export_formats, schedule_json, date_active_from, date_active_until, created_at, updated_at FROM profiles"
-        if not include_archived:
-            query += " WHERE archived = 0"
-        rows = await self._db.async_fetchall(query)
+        return [
+            self._copy_profile(profile)
+            for profile in self._profiles.values()
+            if include_archived or not profile["archived"]
+        ]
+
+    def get_profile(self, profile_id: int) -> dict[str, Any] | None:
+        profile = self._profiles.get(profile_id)
+        return self._copy_profile(profile) if profile is not None else None
 
-        profiles: list[dict[str, Any]] = []
-        for row in rows:
+    def iter_profiles(self):
+        """Iterate the cached profiles without copying; callers must not mutate."""
+        return iter(self._profiles.values())
+
+    def get_entity_profiles(self, entity_id: str) -> set[int]:
+        """Return the ids of all profiles that include an entity."""
+        return set(self._entity_profiles.get(entity_id, ()))
+
+    def get_profile_rules(self, profile_id: int) -> list[dict[str, Any]]:
+        return [dict(rule) for rule in self._rules.get(profile_id, [])]
+
+    def get_all_rules(self) -> dict[int, list[dict[str, Any]]]:
+        return {pid: self.get_profile_rules(pid) for pid in self._rules}
+
+    async def async_set_profile_rules(
+        self, profile_id: int, rules: list[dict[str, Any]]
+    ) -> None:
+        """Replace the auto-add match rules of a profile."""
+        for rule in rules:
+            unknown = set(rule) - set(RULE_KEYS)
+            if unknown:
+                raise ValueError(f"Unknown rule keys: {', '.join(sorted(unknown))}")
+            if not rule:
+                raise ValueError("Empty rule would match every entity")
+
+        statements: list[tuple[str, tuple]] = [
+            ("DELETE FROM profile_rules WHERE profile_id = ?", (profile_id,))
+        ]
+        statements.extend(
             (
-                pid,
-                name,
-                description,
-                tags,
-                active,
-                archived,
-                auto_add_entities,
-                export_formats,
-                schedule_json,
-                date_active_from,
-                date_active_until,
-                created_at,
-                updated_at,
-            ) = row
-            profiles.append(
-                {
-                    "id": pid,
-                    "name": name,
-                    "description": description,
-                    "tags": tags.split(",") if tags else [],
-                    "active": bool(active),
-                    "archived": bool(archived),
-                    "auto_add_entities": bool(auto_add_entities),
-                    "export_formats": export_formats.split(",") if export_formats else [],
-                    "schedule": json.loads(schedule_json) if schedule_json else None,
-                    "date_active_from": date_active_from,
-                    "date_active_until": date_active_until,
-                    "created_at": created_at,
-                    "updated_at": updated_at,
-                }
+                "INSERT INTO profile_rules (profile_id, rule_json) VALUES (?, ?)",
+                (profile_id, json.dumps(rule, sort_keys=True)),
             )
-        return profiles
+            for rule in rules
+        )
+        await self._db.async_execute_batch(statements)
+
+        if rules:
+            self._rules[profile_id] = [dict(rule) for rule in rules]
+        else:
+            self._rules.pop(profile_id, None)
+        self._notify(profile_id)
+
+    async def async_add_auto_entities(self, matches: list[tuple[int, str]]) -> int:
+        """Add auto-matched (profile_id, entity_id) pairs not yet in a profile.
+
+        Existing memberships are left untouched. Returns the number added.
+        """
+        new = [
+            (profile_id, entity_id)
+            for profile_id, entity_id in dict.fromkeys(matches)
+            if entity_id not in self._members.get(profile_id, {})
+        ]
+        if not new:
+            return 0
+        await self._db.async_executemany(
+            """
+            INSERT INTO profile_entities (profile_id, entity_id, approved, auto_added)
+            VALUES (?, ?, 0, 1)
+            ON CONFLICT(profile_id, entity_id) DO NOTHING
+            """,
+            new,
+        )
+        for profile_id, entity_id in new:
+            self._add_member(profile_id, entity_id, False, True)
+        return len(new)
 
     async def async_set_profile_entities(
         self,
@@ -150,34 +310,28 @@ class ProfileManager:
         approved: bool,
         auto_added: bool,
     ) -> None:
+        entity_ids = list(dict.fromkeys(entity_ids))
+        await self._db.async_executemany(
+            """
+            INSERT INTO profile_entities (profile_id, entity_id, approved, auto_added)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(profile_id, entity_id)
+            DO UPDATE SET approved = excluded.approved, auto_added = excluded.auto_added
+            """,
+            [
+                (profile_id, entity_id, int(approved), int(auto_added))
+                for entity_id in entity_ids
+            ],
+        )
         for entity_id in entity_ids:
-            await self._db.async_execute(
-                """
-                INSERT INTO profile_entities (profile_id, entity_id, approved, auto_added)
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT(profile_id, entity_id)
-                DO UPDATE SET approved = excluded.approved, auto_added = excluded.auto_added
-                """,
-                (profile_id, entity_id, int(approved), int(auto_added)),
-            )
+            self._add_member(profile_id, entity_id, approved, auto_added)
 
     async def async_get_profile_entities(
         self, profile_id: int, include_unapproved: bool
     ) -> list[str]:
-        if include_unapproved:
-            rows = await self._db.async_fetchall(
-                """
-                SELECT entity_id FROM profile_entities
-                WHERE profile_id = ?
-                """,
-                (profile_id,),
-            )
-        else:
-            rows = await self._db.async_fetchall(
-                """
-                SELECT entity_id FROM profile_entities
-                WHERE profile_id = ? AND approved = 1
-                """,
-                (profile_id,),
-            )
-        return [r[0] for r in rows]
+        members = self._members.get(profile_id, {})
+        return [
+            entity_id
+            for entity_id, flags in members.items()
+            if include_unapproved or flags["approved"]
+        ]
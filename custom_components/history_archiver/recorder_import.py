@@ -0,0 +1,336 @@
+"""Backfill of state_samples from the Home Assistant recorder database.
+
+Only the recorder's SQLite layout since 2023.4 is supported: ``states``
+keyed by ``states_meta`` with ``last_updated_ts`` epoch seconds, and hourly
+``statistics`` keyed by ``statistics_meta``.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+from datetime import datetime
+from itertools import repeat
+
+import numpy as np
+
+from homeassistant.const import STATE_UNAVAILABLE, STATE_UNKNOWN
+from homeassistant.core import HomeAssistant
+
+from .archive_tier import ArchiveTier
+from .const import (
+    DEFAULT_RECORDER_DB_PATH,
+    DOMAIN,
+    RECORDER_IMPORT_BATCH_DELAY,
+    RECORDER_IMPORT_BATCH_SIZE,
+)
+from .database import Database
+from .downsampling import format_iso_us, to_epoch_us
+from .ingest_stats import SAMPLE_VALUE_BYTES, IngestStats, row_bytes
+from .partial_store import PartialResultStore
+
+_LOGGER = logging.getLogger(__name__)
+
+_US_PER_SECOND = 1_000_000
+
+# Newest first, so an interrupted import leaves a contiguous range behind.
+# Paged on (timestamp, rowid) so rows sharing a timestamp across a batch
+# boundary are not skipped; the rowid is the last column of both indexes.
+_STATES_SQL = """
+    SELECT last_updated_ts, rowid, state FROM states
+    WHERE metadata_id = ? AND last_updated_ts >= ? AND (last_updated_ts, rowid) < (?, ?)
+      AND state NOT IN (?, ?, '')
+    ORDER BY last_updated_ts DESC, rowid DESC
+    LIMIT ?
+"""
+
+_STATISTICS_SQL = """
+    SELECT start_ts, rowid, COALESCE(mean, state) FROM statistics
+    WHERE metadata_id = ? AND start_ts >= ? AND (start_ts, rowid) < (?, ?)
+      AND COALESCE(mean, state) IS NOT NULL
+    ORDER BY start_ts DESC, rowid DESC
+    LIMIT ?
+"""
+
+
+def _parse_values(raw: tuple) -> np.ndarray:
+    """Float array of recorder states, NaN where a state is not a number."""
+    try:
+        return np.asarray(raw, dtype=np.float64)
+    except (TypeError, ValueError):
+        pass
+    # Entities that changed between numeric and text states
+    values = np.empty(len(raw), dtype=np.float64)
+    for i, state in enumerate(raw):
+        try:
+            values[i] = float(state)
+        except (TypeError, ValueError):
+            values[i] = np.nan
+    return values
+
+
+class _RecorderReader:
+    """Read-only connection to the recorder DB; every method runs in the executor."""
+
+    def __init__(self, path: str) -> None:
+        if not os.path.isfile(path):
+            raise ValueError(f"Recorder database not found: {path}")
+        self._conn = sqlite3.connect(
+            f"file:{path}?mode=ro", uri=True, check_same_thread=False
+        )
+        tables = {
+            name
+            for (name,) in self._conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+        if not {"states", "states_meta"} <= tables:
+            self._conn.close()
+            raise ValueError(
+                "Recorder database predates states_meta (Home Assistant 2023.4)"
+            )
+        self.has_statistics = {"statistics", "statistics_meta"} <= tables
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def metadata_ids(self, entity_id: str) -> tuple[int | None, int | None]:
+        row = self._conn.execute(
+            "SELECT metadata_id FROM states_meta WHERE entity_id = ?", (entity_id,)
+        ).fetchone()
+        states_id = row[0] if row else None
+        statistics_id = None
+        if self.has_statistics:
+            row = self._conn.execute(
+                "SELECT id FROM statistics_meta WHERE statistic_id = ?", (entity_id,)
+            ).fetchone()
+            statistics_id = row[0] if row else None
+        return states_id, statistics_id
+
+    def first_state(self, metadata_id: int) -> float | None:
+        (first,) = self._conn.execute(
+            "SELECT MIN(last_updated_ts) FROM states WHERE metadata_id = ?",
+            (metadata_id,),
+        ).fetchone()
+        return first
+
+    def read_batch(
+        self,
+        statistics: bool,
+        metadata_id: int,
+        lower: float,
+        before: tuple[float, int],
+    ) -> tuple[int, tuple[float, int], np.ndarray, np.ndarray]:
+        """Read the newest batch at or after ``lower`` and before ``before``.
+
+        ``before`` is a (timestamp, rowid) position; (upper, 0) starts at
+        ``upper`` epoch seconds. Returns (rows read, position of the oldest
+        row read, epoch us, values) with non-numeric states dropped; the
+        position is the next ``before``.
+        """
+        upper, before_rowid = before
+        if statistics:
+            rows = self._conn.execute(
+                _STATISTICS_SQL,
+                (metadata_id, lower, upper, before_rowid, RECORDER_IMPORT_BATCH_SIZE),
+            ).fetchall()
+        else:
+            rows = self._conn.execute(
+                _STATES_SQL,
+                (
+                    metadata_id,
+                    lower,
+                    upper,
+                    before_rowid,
+                    STATE_UNKNOWN,
+                    STATE_UNAVAILABLE,
+                    RECORDER_IMPORT_BATCH_SIZE,
+                ),
+            ).fetchall()
+        if not rows:
+            return 0, before, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        ts, rowids, raw = zip(*rows)
+        ts_us = np.rint(np.asarray(ts, dtype=np.float64) * _US_PER_SECOND).astype(np.int64)
+        values = _parse_values(raw)
+        keep = np.isfinite(values)
+        return len(rows), (ts[-1], rowids[-1]), ts_us[keep], values[keep]
+
+
+class RecorderImporter:
+    """Backfills history for entities from the Home Assistant recorder DB.
+
+    Per entity, only the time before the oldest sample we already hold is
+    imported: numeric ``states`` rows first, then hourly ``statistics`` means
+    for the time before the recorder's own state history begins. Rows are
+    read newest first and inserted with ``INSERT OR IGNORE``, so re-running
+    an interrupted import continues where it stopped without duplicates.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        db: Database,
+        partials: PartialResultStore | None = None,
+        archive: ArchiveTier | None = None,
+        recorder_db_path: str = DEFAULT_RECORDER_DB_PATH,
+        stats: IngestStats | None = None,
+    ) -> None:
+        self._hass = hass
+        self._db = db
+        self._partials = partials
+        self._archive = archive
+        self._stats = stats
+        self._path = hass.config.path(recorder_db_path)
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    async def async_import(
+        self,
+        entity_ids: list[str] | None = None,
+        start_ts: datetime | None = None,
+        end_ts: datetime | None = None,
+    ) -> dict[str, int]:
+        """Import recorder history for ``entity_ids`` (default: all tracked entities)."""
+        if self._running:
+            raise ValueError("A recorder import is already running")
+        if entity_ids is None:
+            rows = await self._db.async_fetchall("SELECT entity_id FROM entities")
+            entity_ids = [row[0] for row in rows]
+        lower_us = to_epoch_us(start_ts) if start_ts is not None else 0
+        upper_us = to_epoch_us(end_ts or datetime.utcnow())
+
+        self._running = True
+        reader = None
+        totals = {"entities": 0, "read": 0, "inserted": 0}
+        try:
+            reader = await self._hass.async_add_executor_job(_RecorderReader, self._path)
+            _LOGGER.info(
+                "Importing recorder history for %s entities from %s",
+                len(entity_ids),
+                self._path,
+            )
+            for entity_id in entity_ids:
+                read, inserted = await self._async_import_entity(
+                    reader, entity_id, lower_us, upper_us
+                )
+                totals["read"] += read
+                totals["inserted"] += inserted
+                if inserted:
+                    totals["entities"] += 1
+                    if self._partials is not None:
+                        # Cached sub-range results no longer match the samples
+                        await self._hass.async_add_executor_job(
+                            self._partials.clear, entity_id
+                        )
+        finally:
+            if reader is not None:
+                await self._hass.async_add_executor_job(reader.close)
+            self._running = False
+
+        _LOGGER.info(
+            "Recorder import finished: %s samples for %s entities (%s rows read)",
+            totals["inserted"],
+            totals["entities"],
+            totals["read"],
+        )
+        if totals["inserted"] and self._archive is not None:
+            # Imported closed months move to Parquet now rather than at the next run
+            self._hass.async_create_background_task(
+                self._archive.async_run_tiering(), f"{DOMAIN}_archive_tiering"
+            )
+        return totals
+
+    async def _async_first_sample_us(self, entity_id: str) -> int | None:
+        """Epoch us of the oldest sample held in SQLite or the archive."""
+        (db_first,) = await self._db.async_fetchone(
+            f"SELECT MIN(ts) FROM {self._db.read_source('state_samples')} "
+            "WHERE entity_id = ?",
+            (entity_id,),
+        )
+        (archive_first,) = await self._db.async_fetchone(
+            "SELECT MIN(min_ts) FROM archive_files WHERE entity_id = ?",
+            (entity_id,),
+        )
+        firsts = [
+            to_epoch_us(datetime.fromisoformat(ts))
+            for ts in (db_first, archive_first)
+            if ts is not None
+        ]
+        return min(firsts) if firsts else None
+
+    async def _async_import_entity(
+        self, reader: _RecorderReader, entity_id: str, lower_us: int, upper_us: int
+    ) -> tuple[int, int]:
+        first_us = await self._async_first_sample_us(entity_id)
+        if first_us is not None:
+            upper_us = min(upper_us, first_us)
+        if upper_us <= lower_us:
+            return 0, 0
+        states_id, statistics_id = await self._hass.async_add_executor_job(
+            reader.metadata_ids, entity_id
+        )
+
+        lower = lower_us / _US_PER_SECOND
+        upper = upper_us / _US_PER_SECOND
+        read = inserted = 0
+        if states_id is not None:
+            batch_read, batch_inserted = await self._async_import_range(
+                reader, entity_id, False, states_id, lower, upper
+            )
+            read += batch_read
+            inserted += batch_inserted
+            first_state = await self._hass.async_add_executor_job(
+                reader.first_state, states_id
+            )
+            if first_state is not None:
+                upper = min(upper, first_state)
+        if statistics_id is not None and upper > lower:
+            batch_read, batch_inserted = await self._async_import_range(
+                reader, entity_id, True, statistics_id, lower, upper
+            )
+            read += batch_read
+            inserted += batch_inserted
+        if inserted:
+            _LOGGER.debug("Imported %s recorder samples for %s", inserted, entity_id)
+        return read, inserted
+
+    async def _async_import_range(
+        self,
+        reader: _RecorderReader,
+        entity_id: str,
+        statistics: bool,
+        metadata_id: int,
+        lower: float,
+        upper: float,
+    ) -> tuple[int, int]:
+        read = inserted = 0
+        before = (upper, 0)
+        while True:
+            count, before, ts_us, values = await self._hass.async_add_executor_job(
+                reader.read_batch, statistics, metadata_id, lower, before
+            )
+            if not count:
+                return read, inserted
+            read += count
+            if len(ts_us):
+                timestamps = format_iso_us(ts_us)
+                changed = await self._db.async_executemany(
+                    """
+                    INSERT OR IGNORE INTO state_samples (entity_id, ts, value)
+                    VALUES (?, ?, ?)
+                    """,
+                    zip(repeat(entity_id), timestamps, values.tolist()),
+                )
+                inserted += changed
+                if self._stats is not None:
+                    # Timestamps of one batch share a format, so any is typical
+                    self._stats.record_import(
+                        entity_id,
+                        changed,
+                        changed * row_bytes(entity_id, timestamps[0], SAMPLE_VALUE_BYTES),
+                    )
+            await asyncio.sleep(RECORDER_IMPORT_BATCH_DELAY)
@@ -0,0 +1,172 @@
+import logging
+from array import array
+from datetime import datetime
+
+import numpy as np
+
+from .downsampling import to_epoch_us
+
+_LOGGER = logging.getLogger(__name__)
+
+# Bytes per buffered sample: one int64 timestamp plus one float64 value.
+_SAMPLE_BYTES = 16
+_MIN_CAPACITY = 64
+
+
+class SampleRingBuffer:
+    """Fixed-capacity ring of the most recent samples of one entity.
+
+    ``coverage_start_us`` is the earliest timestamp from which the buffer
+    holds *every* persisted sample: the first sample it ever saw, or the
+    oldest one still retained once something has been evicted.
+    """
+
+    __slots__ = ("capacity", "_ts", "_values", "_head", "_size", "_evicted", "_first_us")
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._ts = array("q", bytes(8 * capacity))
+        self._values = array("d", bytes(8 * capacity))
+        self._head = 0  # index of the oldest sample
+        self._size = 0
+        self._evicted = False
+        self._first_us: int | None = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def coverage_start_us(self) -> int | None:
+        if self._size == 0:
+            return self._first_us
+        if self._evicted:
+            return self._ts[self._head]
+        return self._first_us
+
+    @property
+    def last_us(self) -> int | None:
+        if self._size == 0:
+            return None
+        return self._ts[(self._head + self._size - 1) % self.capacity]
+
+    def append(self, ts_us: int, value: float) -> None:
+        last = self.last_us
+        if last is not None and ts_us <= last:
+            if ts_us == last:
+                # Mirrors INSERT OR IGNORE on the (entity_id, ts) key
+                return
+            # Clock went backwards; restart so the ring stays sorted.
+            self.clear()
+        if self._first_us is None:
+            self._first_us = ts_us
+        if self._size < self.capacity:
+            index = (self._head + self._size) % self.capacity
+            self._size += 1
+        else:
+            index = self._head
+            self._head = (self._head + 1) % self.capacity
+            self._evicted = True
+        self._ts[index] = ts_us
+        self._values[index] = value
+
+    def clear(self) -> None:
+        self._head = 0
+        self._size = 0
+        self._evicted = False
+        self._first_us = None
+
+    def arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return (timestamps, values) in time order as new numpy arrays."""
+        ts = np.frombuffer(self._ts, dtype=np.int64)
+        values = np.frombuffer(self._values, dtype=np.float64)
+        end = self._head + self._size
+        if end <= self.capacity:
+            return ts[self._head : end].copy(), values[self._head : end].copy()
+        wrap = end - self.capacity
+        return (
+            np.concatenate((ts[self._head :], ts[:wrap])),
+            np.concatenate((values[self._head :], values[:wrap])),
+        )
+
+    def covers(self, start_us: int) -> bool:
+        coverage = self.coverage_start_us
+        return coverage is not None and start_us >= coverage
+
+    def range(self, start_us: int, end_us: int) -> tuple[np.ndarray, np.ndarray]:
+        ts, values = self.arrays()
+        lo = np.searchsorted(ts, start_us, side="left")
+        hi = np.searchsorted(ts, end_us, side="right")
+        return ts[lo:hi], values[lo:hi]
+
+    def resized(self, capacity: int) -> "SampleRingBuffer":
+        """Return a copy with a new capacity, keeping the newest samples."""
+        ts, values = self.arrays()
+        buffer = SampleRingBuffer(capacity)
+        buffer._first_us = self._first_us
+        buffer._evicted = self._evicted or len(ts) > capacity
+        for ts_us, value in zip(ts[-capacity:].tolist(), values[-capacity:].tolist()):
+            buffer._ts[buffer._size] = ts_us
+            buffer._values[buffer._size] = value
+            buffer._size += 1
+        return buffer
+
+
+class SampleBuffer:
+    """Recent-sample ring buffers for every tracked entity, within a memory budget.
+
+    Each entity gets an equal share of the budget. When more entities show up
+    than the current share allows for, all rings shrink (keeping their newest
+    samples); the planned entity count doubles each time so this stays rare.
+    """
+
+    def __init__(self, memory_budget_bytes: int) -> None:
+        self._budget = memory_budget_bytes
+        self._buffers: dict[str, SampleRingBuffer] = {}
+        self._planned_entities = 64
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(buffer.capacity for buffer in self._buffers.values()) * _SAMPLE_BYTES
+
+    def _capacity(self) -> int:
+        return max(_MIN_CAPACITY, self._budget // (_SAMPLE_BYTES * self._planned_entities))
+
+    def append(self, entity_id: str, ts: datetime, value: float) -> None:
+        buffer = self._buffers.get(entity_id)
+        if buffer is None:
+            if len(self._buffers) >= self._planned_entities:
+                self._rebalance(self._planned_entities * 2)
+            buffer = self._buffers[entity_id] = SampleRingBuffer(self._capacity())
+        buffer.append(to_epoch_us(ts), value)
+
+    def _rebalance(self, planned_entities: int) -> None:
+        self._planned_entities = planned_entities
+        capacity = self._capacity()
+        _LOGGER.debug(
+            "Resizing sample buffers to %s samples for %s entities",
+            capacity,
+            planned_entities,
+        )
+        self._buffers = {
+            entity_id: buffer.resized(capacity) if buffer.capacity > capacity else buffer
+            for entity_id, buffer in self._buffers.items()
+        }
+
+    def covers(self, entity_id: str, start_ts: datetime) -> bool:
+        """True when every persisted sample at or after ``start_ts`` is buffered."""
+        buffer = self._buffers.get(entity_id)
+        return buffer is not None and buffer.covers(to_epoch_us(start_ts))
+
+    def get_range(
+        self, entity_id: str, start_ts: datetime, end_ts: datetime
+    ) -> tuple[np.ndarray, np.ndarray] | None:
+        """Return (epoch us, values) within the range, or None if not covered."""
+        if not self.covers(entity_id, start_ts):
+            return None
+        return self._buffers[entity_id].range(to_epoch_us(start_ts), to_epoch_us(end_ts))
+
+    def discard(self, entity_id: str) -> None:
+        self._buffers.pop(entity_id, None)
+
+    def clear(self) -> None:
+        self._buffers = {}
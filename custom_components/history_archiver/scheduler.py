@@ -1,6 +1,7 @@
 import logging
 from datetime import datetime, timedelta
 
+from homeassistant.const import STATE_UNAVAILABLE, STATE_UNKNOWN
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.event import async_track_time_interval
 
@@ -54,7 +55,16 @@ class Scheduler:
             if state is None:
                 continue
             try:
-                value = float(state.state)
-            except (ValueError, TypeError):
-                continue
-            await self._entity_manager.async_record_sample(entity_id, value)
+                await self._async_record(entity_id, state.state)
+            except Exception as err:  # noqa: BLE001 - keep sampling the others
+                _LOGGER.warning("Could not record a sample of %s: %s", entity_id, err)
+
+    async def _async_record(self, entity_id: str, state: str) -> None:
+        try:
+            value = float(state)
+        except (ValueError, TypeError):
+            # Non-numeric states are stored dictionary-encoded
+            if state not in (STATE_UNAVAILABLE, STATE_UNKNOWN):
+                await self._entity_manager.async_record_state(entity_id, state)
+            return
+        await self._entity_manager.async_record_sample(entity_id, value)
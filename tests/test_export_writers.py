@@ -0,0 +1,53 @@
+"""JSON outputs stay valid for grids with gaps."""
+
+import json
+
+import pyarrow as pa
+import pytest
+
+from custom_components.history_archiver.const import EXPORT_FORMAT_JSON, EXPORT_FORMAT_NDJSON
+from custom_components.history_archiver.export_writers import NdjsonStreamEncoder, open_writer
+
+SCHEMA = pa.schema([("ts", pa.timestamp("us", tz="UTC")), ("value", pa.float64())])
+
+BATCH = pa.record_batch(
+    [
+        pa.array([0, 60_000_000, 120_000_000, 180_000_000], pa.timestamp("us", tz="UTC")),
+        pa.array([1.5, float("nan"), None, float("inf")]),
+    ],
+    schema=SCHEMA,
+)
+
+EXPECTED = [
+    {"ts": "1970-01-01T00:00:00", "value": 1.5},
+    {"ts": "1970-01-01T00:01:00", "value": None},
+    {"ts": "1970-01-01T00:02:00", "value": None},
+    {"ts": "1970-01-01T00:03:00", "value": None},
+]
+
+
+def _strict_loads(text: str):
+    def reject(constant):
+        raise ValueError(f"not valid JSON: {constant}")
+
+    return json.loads(text, parse_constant=reject)
+
+
+@pytest.mark.parametrize("fmt", [EXPORT_FORMAT_JSON, EXPORT_FORMAT_NDJSON])
+def test_writers_emit_null_for_non_finite_values(tmp_path, fmt):
+    with open_writer(fmt, str(tmp_path / "export"), SCHEMA, []) as writer:
+        writer.write_batch(BATCH)
+        path = writer.path
+    with open(path, encoding="utf-8") as file:
+        text = file.read()
+
+    if fmt == EXPORT_FORMAT_JSON:
+        rows = _strict_loads(text)["data"]
+    else:
+        rows = [_strict_loads(line) for line in text.splitlines()]
+    assert rows == EXPECTED
+
+
+def test_ndjson_stream_emits_null_for_non_finite_values():
+    text = NdjsonStreamEncoder(SCHEMA).encode(BATCH).decode("utf-8")
+    assert [_strict_loads(line) for line in text.splitlines()] == EXPECTED
@@ -0,0 +1,206 @@
+"""Upgrades of databases written before versioned migrations existed."""
+
+import asyncio
+import sqlite3
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from custom_components.history_archiver import database
+from custom_components.history_archiver.const import (
+    DB_FILENAME,
+    DB_SCHEMA_VERSION,
+    DOMAIN,
+    INGEST_STATS_ROW_OVERHEAD,
+)
+from custom_components.history_archiver.database import Database
+from custom_components.history_archiver.ingest_stats import SAMPLE_VALUE_BYTES, IngestStats
+
+# Tables as the first release created them, without user_version
+BASELINE_SCHEMA = """
+    CREATE TABLE entities (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity_id TEXT NOT NULL UNIQUE,
+        device_id TEXT,
+        area_id TEXT,
+        stats_mode TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+    CREATE TABLE state_samples (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity_id TEXT NOT NULL,
+        ts TEXT NOT NULL,
+        value REAL,
+        created_at TEXT NOT NULL
+    );
+    CREATE INDEX idx_state_samples_entity_ts ON state_samples(entity_id, ts);
+"""
+
+SAMPLES = [
+    ("sensor.power", "2024-01-01T00:00:00", 1.0),
+    ("sensor.power", "2024-01-01T00:01:00", 2.0),
+    ("sensor.power", "2024-01-01T00:02:00", 3.0),
+    ("sensor.temperature_outdoor", "2024-01-01T00:00:30", 4.5),
+    ("sensor.temperature_outdoor", "2024-01-02T00:00:30", 5.5),
+]
+
+
+def _hass(tmp_path):
+    return SimpleNamespace(
+        config=SimpleNamespace(path=lambda *parts: str(tmp_path.joinpath(*parts))),
+        async_create_background_task=lambda coro, name: asyncio.ensure_future(coro),
+    )
+
+
+def _write_baseline_db(tmp_path) -> None:
+    (tmp_path / DOMAIN).mkdir()
+    conn = sqlite3.connect(tmp_path / DOMAIN / DB_FILENAME)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany(
+        "INSERT OR IGNORE INTO entities (entity_id, created_at, updated_at) VALUES (?, ?, ?)",
+        [(entity_id, ts, ts) for entity_id, ts, _ in SAMPLES],
+    )
+    conn.executemany(
+        "INSERT INTO state_samples (entity_id, ts, value, created_at) VALUES (?, ?, ?, ?)",
+        [(entity_id, ts, value, ts) for entity_id, ts, value in SAMPLES],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _expected_stats() -> dict[str, tuple]:
+    expected: dict[str, tuple] = {}
+    for entity_id, ts, _ in SAMPLES:
+        rows, size_bytes, first, last = expected.get(entity_id, (0, 0, ts, ts))
+        expected[entity_id] = (
+            rows + 1,
+            size_bytes
+            + len(entity_id)
+            + len(ts)
+            + SAMPLE_VALUE_BYTES
+            + INGEST_STATS_ROW_OVERHEAD,
+            min(first, ts),
+            max(last, ts),
+        )
+    return expected
+
+
+async def _fetch_stats(db: Database) -> dict[str, tuple]:
+    rows = await db.async_fetchall(
+        "SELECT entity_id, rows, size_bytes, first_write, last_write FROM entity_stats"
+    )
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+
+async def _finish_copies(db: Database) -> None:
+    while db.migrations_pending:
+        await db._async_copy_batch(min(db._pending_copies))
+
+
+def test_upgrade_counts_existing_rows_in_the_background(tmp_path):
+    _write_baseline_db(tmp_path)
+
+    async def run():
+        db = Database(_hass(tmp_path))
+        await db.async_initialize()
+        try:
+            (version,) = await db.async_fetchone("PRAGMA user_version;")
+            assert version == DB_SCHEMA_VERSION
+            # Nothing is counted inside the startup migration
+            assert await _fetch_stats(db) == {}
+
+            await _finish_copies(db)
+            (rows,) = await db.async_fetchone("SELECT COUNT(*) FROM state_samples")
+            assert rows == len(SAMPLES)
+
+            stats = IngestStats(_hass(tmp_path), db)
+            await stats.async_load()
+            # A sample written before the pass reaches its entity is counted once
+            now = datetime.utcnow()
+            await db.async_execute(
+                "INSERT INTO state_samples (entity_id, ts, value) VALUES (?, ?, ?)",
+                ("sensor.power", now.isoformat(), 4.0),
+            )
+            stats.record("sensor.power", now, now.isoformat(), 4.0, True, SAMPLE_VALUE_BYTES)
+            await stats._async_seed()
+            await stats.async_flush()
+
+            seeded = await _fetch_stats(db)
+            rows, _, first_write, last_write = seeded.pop("sensor.power")
+            assert (rows, first_write, last_write) == (4, SAMPLES[0][1], now.isoformat())
+            expected = _expected_stats()
+            del expected["sensor.power"]
+            assert seeded == expected
+            assert await db.async_fetchall("SELECT * FROM entity_stats_seed") == []
+        finally:
+            await db.async_close()
+
+    asyncio.run(run())
+
+
+def test_upgrade_counts_rows_of_a_partial_copy(tmp_path, monkeypatch):
+    _write_baseline_db(tmp_path)
+    monkeypatch.setattr(database, "MIGRATION_BATCH_SIZE", 2)
+
+    async def run():
+        # A previous release stopped at v7 with the v2 copy part way through
+        with monkeypatch.context() as patch:
+            patch.setattr(
+                database,
+                "MIGRATIONS",
+                [migration for migration in database.MIGRATIONS if migration.version < 8],
+            )
+            db = Database(_hass(tmp_path))
+            await db.async_initialize()
+            await db._async_copy_batch(2)
+            await db.async_close()
+
+        db = Database(_hass(tmp_path))
+        await db.async_initialize()
+        try:
+            assert db._pending_copies[2][0] == 2
+            await _finish_copies(db)
+
+            stats = IngestStats(_hass(tmp_path), db)
+            await stats.async_load()
+            await stats._async_seed()
+            assert await _fetch_stats(db) == _expected_stats()
+        finally:
+            await db.async_close()
+
+    asyncio.run(run())
+
+
+def test_failed_migration_rolls_back_and_releases_the_file(tmp_path, monkeypatch):
+    _write_baseline_db(tmp_path)
+    broken = database.Migration(
+        version=DB_SCHEMA_VERSION + 1,
+        description="Broken step",
+        upgrade_sql="""
+            CREATE TABLE half_done (id INTEGER PRIMARY KEY);
+            INSERT INTO no_such_table VALUES (1);
+        """,
+    )
+    monkeypatch.setattr(database, "MIGRATIONS", [*database.MIGRATIONS, broken])
+
+    async def run():
+        db = Database(_hass(tmp_path))
+        with pytest.raises(Exception, match="no_such_table"):
+            await db.async_initialize()
+
+    asyncio.run(run())
+
+    conn = sqlite3.connect(tmp_path / DOMAIN / DB_FILENAME, timeout=0)
+    try:
+        (version,) = conn.execute("PRAGMA user_version").fetchone()
+        assert version == DB_SCHEMA_VERSION
+        assert conn.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'half_done'"
+        ).fetchall() == []
+        # Not left write-locked
+        conn.execute("CREATE TABLE probe (id INTEGER)")
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,246 @@
+"""Recorder backfill against a generated recorder-format SQLite file."""
+
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from custom_components.history_archiver import recorder_import
+from custom_components.history_archiver.database import Database
+from custom_components.history_archiver.recorder_import import RecorderImporter
+
+RECORDER_DB = "home-assistant_v2.db"
+
+# The parts of the recorder schema (2023.4+) the importer reads
+RECORDER_SCHEMA = """
+    CREATE TABLE states_meta (
+        metadata_id INTEGER NOT NULL PRIMARY KEY,
+        entity_id VARCHAR(255)
+    );
+    CREATE TABLE states (
+        state_id INTEGER NOT NULL PRIMARY KEY,
+        state VARCHAR(255),
+        last_updated_ts FLOAT,
+        metadata_id INTEGER
+    );
+    CREATE INDEX ix_states_metadata_id_last_updated_ts
+        ON states (metadata_id, last_updated_ts);
+    CREATE TABLE statistics_meta (
+        id INTEGER NOT NULL PRIMARY KEY,
+        statistic_id VARCHAR(255),
+        source VARCHAR(32),
+        has_mean BOOLEAN,
+        has_sum BOOLEAN
+    );
+    CREATE TABLE statistics (
+        id INTEGER NOT NULL PRIMARY KEY,
+        created_ts FLOAT,
+        metadata_id INTEGER,
+        start_ts FLOAT,
+        mean FLOAT,
+        min FLOAT,
+        max FLOAT,
+        state FLOAT,
+        sum FLOAT
+    );
+    CREATE UNIQUE INDEX ix_statistics_statistic_id_start_ts
+        ON statistics (metadata_id, start_ts);
+"""
+
+BASE = datetime(2024, 1, 1)
+
+
+def _epoch(value: datetime) -> float:
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _hass(tmp_path):
+    async def async_add_executor_job(target, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, target, *args)
+
+    return SimpleNamespace(
+        config=SimpleNamespace(path=lambda *parts: str(tmp_path.joinpath(*parts))),
+        async_add_executor_job=async_add_executor_job,
+        async_create_background_task=lambda coro, name: asyncio.ensure_future(coro),
+    )
+
+
+def _write_recorder_db(tmp_path, states=(), statistics=()) -> None:
+    """``states``: (entity_id, datetime, state); ``statistics``: (entity_id, datetime, mean)."""
+    conn = sqlite3.connect(tmp_path / RECORDER_DB)
+    conn.executescript(RECORDER_SCHEMA)
+    meta: dict[str, int] = {}
+    for entity_id, ts, state in states:
+        if entity_id not in meta:
+            meta[entity_id] = conn.execute(
+                "INSERT INTO states_meta (entity_id) VALUES (?)", (entity_id,)
+            ).lastrowid
+        conn.execute(
+            "INSERT INTO states (state, last_updated_ts, metadata_id) VALUES (?, ?, ?)",
+            (state, _epoch(ts), meta[entity_id]),
+        )
+    statistics_meta: dict[str, int] = {}
+    for entity_id, ts, mean in statistics:
+        if entity_id not in statistics_meta:
+            statistics_meta[entity_id] = conn.execute(
+                """
+                INSERT INTO statistics_meta (statistic_id, source, has_mean, has_sum)
+                VALUES (?, 'recorder', 1, 0)
+                """,
+                (entity_id,),
+            ).lastrowid
+        conn.execute(
+            """
+            INSERT INTO statistics (created_ts, metadata_id, start_ts, mean, min, max)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (_epoch(ts), statistics_meta[entity_id], _epoch(ts), mean, mean, mean),
+        )
+    conn.commit()
+    conn.close()
+
+
+def _run(tmp_path, test):
+    async def run():
+        hass = _hass(tmp_path)
+        db = Database(hass)
+        await db.async_initialize()
+        try:
+            await test(db, RecorderImporter(hass, db, recorder_db_path=RECORDER_DB))
+        finally:
+            await db.async_close()
+
+    asyncio.run(run())
+
+
+async def _samples(db: Database, entity_id: str) -> list[tuple[str, float]]:
+    return await db.async_fetchall(
+        f"SELECT ts, value FROM {db.read_source('state_samples')} "
+        "WHERE entity_id = ? ORDER BY ts",
+        (entity_id,),
+    )
+
+
+def test_rerun_inserts_no_duplicates(tmp_path):
+    _write_recorder_db(
+        tmp_path,
+        states=[("sensor.power", BASE + timedelta(minutes=i), str(i)) for i in range(10)],
+    )
+
+    async def test(db, importer):
+        first = await importer.async_import(["sensor.power"])
+        assert first["inserted"] == 10
+        second = await importer.async_import(["sensor.power"])
+        assert second["inserted"] == 0
+        assert len(await _samples(db, "sensor.power")) == 10
+
+    _run(tmp_path, test)
+
+
+def test_interrupted_import_resumes_below_the_newest_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(recorder_import, "RECORDER_IMPORT_BATCH_SIZE", 4)
+    _write_recorder_db(
+        tmp_path,
+        states=[("sensor.power", BASE + timedelta(minutes=i), str(i)) for i in range(10)],
+    )
+
+    async def test(db, importer):
+        original = db.async_executemany
+        calls = 0
+
+        async def fail_second_batch(query, params_seq):
+            nonlocal calls
+            calls += 1
+            if calls == 2:
+                raise sqlite3.OperationalError("disk I/O error")
+            return await original(query, params_seq)
+
+        db.async_executemany = fail_second_batch
+        with pytest.raises(sqlite3.OperationalError):
+            await importer.async_import(["sensor.power"])
+        # Only the newest batch landed, so the gap is entirely older
+        assert [value for _, value in await _samples(db, "sensor.power")] == [6, 7, 8, 9]
+
+        db.async_executemany = original
+        totals = await importer.async_import(["sensor.power"])
+        assert totals["inserted"] == 6
+        assert [value for _, value in await _samples(db, "sensor.power")] == list(range(10))
+
+    _run(tmp_path, test)
+
+
+def test_statistics_fill_the_time_before_the_first_state(tmp_path):
+    first_state = BASE + timedelta(hours=3)
+    _write_recorder_db(
+        tmp_path,
+        states=[
+            ("sensor.temperature", first_state, "20.5"),
+            ("sensor.temperature", first_state + timedelta(minutes=30), "21.0"),
+        ],
+        # Hourly means, two of them overlapping the state history
+        statistics=[
+            ("sensor.temperature", BASE + timedelta(hours=hour), 10.0 + hour)
+            for hour in range(5)
+        ],
+    )
+
+    async def test(db, importer):
+        await importer.async_import(["sensor.temperature"])
+        assert await _samples(db, "sensor.temperature") == [
+            ("2024-01-01T00:00:00", 10.0),
+            ("2024-01-01T01:00:00", 11.0),
+            ("2024-01-01T02:00:00", 12.0),
+            ("2024-01-01T03:00:00", 20.5),
+            ("2024-01-01T03:30:00", 21.0),
+        ]
+
+    _run(tmp_path, test)
+
+
+def test_non_numeric_and_unknown_states_are_skipped(tmp_path):
+    states = ["1.5", "unknown", "on", "unavailable", "", "2.5", "abc"]
+    _write_recorder_db(
+        tmp_path,
+        states=[
+            ("sensor.mixed", BASE + timedelta(minutes=i), state)
+            for i, state in enumerate(states)
+        ],
+    )
+
+    async def test(db, importer):
+        totals = await importer.async_import(["sensor.mixed"])
+        # unknown, unavailable and empty states are not even read
+        assert totals["read"] == 4
+        assert totals["inserted"] == 2
+        assert await _samples(db, "sensor.mixed") == [
+            ("2024-01-01T00:00:00", 1.5),
+            ("2024-01-01T00:05:00", 2.5),
+        ]
+
+    _run(tmp_path, test)
+
+
+def test_rows_sharing_a_timestamp_across_batches_are_not_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr(recorder_import, "RECORDER_IMPORT_BATCH_SIZE", 2)
+    last = BASE + timedelta(minutes=5)
+    _write_recorder_db(
+        tmp_path,
+        states=[
+            ("sensor.power", BASE, "1.0"),
+            # Same timestamp; the newest two rows are text and fill a batch
+            ("sensor.power", last, "3.0"),
+            ("sensor.power", last, "overload"),
+            ("sensor.power", last, "overload"),
+        ],
+    )
+
+    async def test(db, importer):
+        await importer.async_import(["sensor.power"])
+        assert await _samples(db, "sensor.power") == [
+            ("2024-01-01T00:00:00", 1.0),
+            ("2024-01-01T00:05:00", 3.0),
+        ]
+
+    _run(tmp_path, test)
@@ -0,0 +1,109 @@
+"""Measure what History Archiver costs Home Assistant at startup.
+
+Run from the repository root, in an environment with Home Assistant and the
+integration's requirements installed:
+
+    python tools/bench_startup.py [--repeat 5]
+
+Every scenario imports modules in a fresh interpreter after Home Assistant's
+own modules are loaded, and reports the median import time, the RSS growth
+and which heavy libraries ended up loaded. "setup" is what the integration
+imports at boot; "eager" imports the whole export stack the way setup did
+before it was deferred.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PACKAGE = "custom_components.history_archiver"
+HEAVY = ("pyarrow", "pandas", "openpyxl", "sqlalchemy")
+
+PRELOAD = [
+    "homeassistant.core",
+    "homeassistant.config_entries",
+    "homeassistant.helpers.area_registry",
+    "homeassistant.helpers.device_registry",
+    "homeassistant.helpers.entity_registry",
+    "homeassistant.helpers.event",
+]
+
+SCENARIOS = {
+    "setup": [PACKAGE],
+    "first export": [PACKAGE, f"{PACKAGE}.export_engine"],
+    "first export, parquet": [PACKAGE, f"{PACKAGE}.export_engine", "pyarrow.parquet"],
+    "first export, xlsx": [PACKAGE, f"{PACKAGE}.export_engine", "openpyxl"],
+    "eager": [
+        "pandas",
+        "pyarrow",
+        "pyarrow.dataset",
+        "pyarrow.parquet",
+        "openpyxl",
+        PACKAGE,
+        f"{PACKAGE}.export_engine",
+    ],
+}
+
+CHILD = """
+import importlib, json, os, sys, time
+
+def rss():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+preload, modules, heavy = json.loads(sys.argv[1])
+for name in preload:
+    importlib.import_module(name)
+before_rss = rss()
+start = time.perf_counter()
+for name in modules:
+    try:
+        importlib.import_module(name)
+    except ImportError as err:
+        print(json.dumps({"error": str(err)}))
+        sys.exit(0)
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "ms": elapsed * 1000,
+    "rss_mb": (rss() - before_rss) / 1048576,
+    "heavy": sorted({name.split(".")[0] for name in sys.modules} & set(heavy)),
+}))
+"""
+
+
+def run(modules: list[str]) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, json.dumps([PRELOAD, modules, HEAVY])],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'scenario':<24}{'import ms':>11}{'RSS MB':>9}  heavy modules")
+    for scenario, modules in SCENARIOS.items():
+        results = [run(modules) for _ in range(args.repeat)]
+        if "error" in results[0]:
+            print(f"{scenario:<24}  skipped: {results[0]['error']}")
+            continue
+        print(
+            f"{scenario:<24}"
+            f"{statistics.median(r['ms'] for r in results):>11.0f}"
+            f"{statistics.median(r['rss_mb'] for r in results):>9.1f}"
+            f"  {', '.join(results[0]['heavy']) or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
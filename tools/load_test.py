@@ -0,0 +1,564 @@
+"""Load-test sampling against concurrent long-range exports.
+
+Run from the repository root, in an environment with Home Assistant and the
+integration's requirements installed:
+
+    python tools/load_test.py --entities 100,500,2000 [--interval 10]
+
+Every run replays synthetic states of N entities into the ``Scheduler`` on a
+fixed interval, through a fake ``hass`` with its own executor and a copy of
+one seeded database, and fires concurrent year-long
+``ManualExportEngine.async_export_custom`` calls once sampling has warmed up.
+States, seeded history and export ranges all derive from ``--seed``, so runs
+on two machines differ only by the hardware.
+
+Reported per configuration and entity count: tick duration percentiles
+before and during the exports, event loop lag, waits for the database lock
+by sampling and by exports, and export throughput in grid rows per second.
+A tick that takes longer than the interval is a stall; the largest entity
+count without one is the configuration's breaking point.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from custom_components.history_archiver import (  # noqa: E402
+    entity_manager as entity_manager_module,
+    export_engine as export_engine_module,
+)
+from custom_components.history_archiver.archive_tier import ArchiveTier  # noqa: E402
+from custom_components.history_archiver.const import (  # noqa: E402
+    DEFAULT_BUFFER_MEMORY_MB,
+    DEFAULT_DB_CACHE_MB,
+    DEFAULT_DB_MMAP_MB,
+    DEFAULT_DB_SYNCHRONOUS,
+    DEFAULT_EXPORT_MEMORY_MB,
+    DEFAULT_GLOBAL_INTERVAL,
+    EXPORT_PARALLEL_WORKERS,
+    SUPPORTED_EXPORT_FORMATS,
+)
+from custom_components.history_archiver.database import Database  # noqa: E402
+from custom_components.history_archiver.downsampling import format_iso_us  # noqa: E402
+from custom_components.history_archiver.entity_manager import EntityManager  # noqa: E402
+from custom_components.history_archiver.export_loader import ExportEngineLoader  # noqa: E402
+from custom_components.history_archiver.ingest_stats import IngestStats  # noqa: E402
+from custom_components.history_archiver.manual_export import ManualExportEngine  # noqa: E402
+from custom_components.history_archiver.partial_store import PartialResultStore  # noqa: E402
+from custom_components.history_archiver.profile_manager import ProfileManager  # noqa: E402
+from custom_components.history_archiver.sample_buffer import SampleBuffer  # noqa: E402
+from custom_components.history_archiver.scheduler import Scheduler  # noqa: E402
+
+EXPORT_DIR = "load_test_exports"
+SEED_BATCH_ROWS = 100_000
+LAG_PROBE_SECONDS = 0.05
+
+# Knobs a configuration may set, with Home Assistant's and our defaults
+CONFIG_DEFAULTS = {
+    "synchronous": DEFAULT_DB_SYNCHRONOUS,
+    "cache_mb": DEFAULT_DB_CACHE_MB,
+    "mmap_mb": DEFAULT_DB_MMAP_MB,
+    "executor_workers": 64,
+    "export_workers": EXPORT_PARALLEL_WORKERS,
+    "export_memory_mb": DEFAULT_EXPORT_MEMORY_MB,
+    "buffer_mb": DEFAULT_BUFFER_MEMORY_MB,
+}
+
+DEFAULT_CONFIGS = {
+    "default": {},
+    "sync-full": {"synchronous": "full"},
+    "1-export-worker": {"export_workers": 1},
+    "4-executor-threads": {"executor_workers": 4},
+}
+
+# Who is waiting on the database lock: the sampler, an export, or setup
+ACTOR: contextvars.ContextVar[str] = contextvars.ContextVar("actor", default="other")
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile, None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def entity_ids(count: int) -> list[str]:
+    return [f"sensor.load_{index:05d}" for index in range(count)]
+
+
+class TimedLock(asyncio.Lock):
+    """asyncio.Lock recording how long each actor waited for and held it."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.reset()
+
+    def reset(self) -> None:
+        self.waits: dict[str, list[float]] = {}
+        self.held: dict[str, float] = {}
+        self._holder: tuple[str, float] | None = None
+
+    async def acquire(self) -> bool:
+        start = time.perf_counter()
+        await super().acquire()
+        acquired = time.perf_counter()
+        actor = ACTOR.get()
+        self.waits.setdefault(actor, []).append(acquired - start)
+        self._holder = (actor, acquired)
+        return True
+
+    def release(self) -> None:
+        if self._holder is not None:
+            actor, acquired = self._holder
+            self.held[actor] = self.held.get(actor, 0.0) + time.perf_counter() - acquired
+            self._holder = None
+        super().release()
+
+
+class SyntheticStates:
+    """Deterministic state machine standing in for ``hass.states``.
+
+    Numeric entities follow a random walk and are reported with two decimals;
+    every ``1 / state_share``-th entity toggles between on and off instead.
+    """
+
+    def __init__(self, entities: list[str], state_share: float, seed: int) -> None:
+        self._rng = random.Random(seed)
+        every = round(1 / state_share) if state_share > 0 else 0
+        self._values: dict[str, float] = {}
+        self._on: dict[str, bool] = {}
+        for index, entity_id in enumerate(entities):
+            if every and index % every == every - 1:
+                self._on[entity_id] = self._rng.random() < 0.5
+            else:
+                self._values[entity_id] = self._rng.uniform(0, 100)
+        self._states: dict[str, SimpleNamespace] = {}
+        self.advance()
+
+    def advance(self) -> None:
+        for entity_id, value in self._values.items():
+            value += self._rng.gauss(0, 0.5)
+            self._values[entity_id] = value
+            self._states[entity_id] = SimpleNamespace(entity_id=entity_id, state=f"{value:.2f}")
+        for entity_id, on in self._on.items():
+            if self._rng.random() < 0.1:
+                on = self._on[entity_id] = not on
+            self._states[entity_id] = SimpleNamespace(
+                entity_id=entity_id, state="on" if on else "off"
+            )
+
+    def get(self, entity_id: str) -> SimpleNamespace | None:
+        return self._states.get(entity_id)
+
+
+class FakeConfig:
+    def __init__(self, config_dir: str) -> None:
+        self.config_dir = config_dir
+
+    def path(self, *parts: str) -> str:
+        return os.path.join(self.config_dir, *parts)
+
+
+class FakeHass:
+    """Just enough of ``HomeAssistant`` for the database, sampler and exports."""
+
+    def __init__(
+        self,
+        config_dir: str,
+        executor_workers: int,
+        entities: list[str],
+        states: SyntheticStates | None = None,
+    ) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.config = FakeConfig(config_dir)
+        self.data: dict = {}
+        self.states = states
+        self.executor = ThreadPoolExecutor(executor_workers, thread_name_prefix="load_test")
+        self.entity_registry = SimpleNamespace(
+            entities={
+                entity_id: SimpleNamespace(
+                    entity_id=entity_id,
+                    device_id=None,
+                    area_id=None,
+                    platform="load_test",
+                    original_name=entity_id,
+                )
+                for entity_id in entities
+            }
+        )
+        self.device_registry = SimpleNamespace(devices={})
+
+    def async_add_executor_job(self, target, *args):
+        return self.loop.run_in_executor(self.executor, target, *args)
+
+    async_add_import_executor_job = async_add_executor_job
+
+    def async_create_task(self, target, name=None, eager_start=True):
+        return self.loop.create_task(target, name=name)
+
+    def async_create_background_task(self, target, name, eager_start=True):
+        return self.loop.create_task(target, name=name)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
+
+
+def _patch_registries() -> None:
+    """Serve the fake registries to modules that look them up on hass."""
+    for module in (entity_manager_module, export_engine_module):
+        module.async_get_entity_registry = lambda hass: hass.entity_registry
+        module.async_get_device_registry = lambda hass: hass.device_registry
+
+
+async def _async_open_db(hass: FakeHass, config: dict) -> tuple[Database, TimedLock]:
+    db = Database(hass, config["synchronous"], config["cache_mb"], config["mmap_mb"])
+    # Every statement goes through this lock, so its waits are the contention
+    lock = db._lock = TimedLock()
+    await db.async_initialize()
+    db.async_start_migrations()
+    while db.migrations_pending:
+        await asyncio.sleep(0.1)
+    return db, lock
+
+
+async def async_seed(template_dir: str, args: argparse.Namespace) -> None:
+    """Write the history every run exports into a template config dir."""
+    history = entity_ids(args.export_entities)
+    hass = FakeHass(template_dir, CONFIG_DEFAULTS["executor_workers"], history)
+    try:
+        db, _ = await _async_open_db(hass, CONFIG_DEFAULTS)
+        rng = np.random.default_rng(args.seed)
+        step_us = args.history_step * 1_000_000
+        end_us = (time.time_ns() // 1000) // step_us * step_us
+        start_us = end_us - args.history_days * 86_400_000_000
+        sample_us = np.arange(start_us, end_us, step_us, dtype=np.int64)
+        hours = (sample_us - start_us) / 3_600_000_000
+        for entity_id in history:
+            values = (
+                20
+                + 5 * np.sin(hours * 2 * np.pi / 24 + rng.uniform(0, 2 * np.pi))
+                + rng.normal(0, 0.3, len(sample_us))
+            )
+            for lo in range(0, len(sample_us), SEED_BATCH_ROWS):
+                hi = lo + SEED_BATCH_ROWS
+                await db.async_executemany(
+                    "INSERT OR IGNORE INTO state_samples (entity_id, ts, value) VALUES (?, ?, ?)",
+                    zip(
+                        [entity_id] * (min(hi, len(sample_us)) - lo),
+                        format_iso_us(sample_us[lo:hi]),
+                        values[lo:hi].tolist(),
+                    ),
+                )
+        if args.archive:
+            moved = await ArchiveTier(hass, db).async_run_tiering()
+            print(f"archived {moved} seeded samples to Parquet")
+        await db.async_close()
+    finally:
+        hass.shutdown()
+
+
+async def _async_lag_monitor(lags: list[float], stop: asyncio.Event) -> None:
+    """Record how late the loop wakes a short sleep: time spent blocked."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + LAG_PROBE_SECONDS
+        await asyncio.sleep(LAG_PROBE_SECONDS)
+        lags.append(max(loop.time() - expected, 0.0))
+
+
+async def async_run(
+    template_dir: str, name: str, config: dict, entity_count: int, args: argparse.Namespace
+) -> dict:
+    """Sample ``entity_count`` entities while the exports run; return the metrics."""
+    config_dir = tempfile.mkdtemp(prefix="history_archiver_load_")
+    shutil.copytree(template_dir, config_dir, dirs_exist_ok=True)
+    entities = entity_ids(entity_count)
+    states = SyntheticStates(entities, args.state_share, args.seed)
+    hass = FakeHass(config_dir, config["executor_workers"], entities, states)
+    export_engine_module.EXPORT_PARALLEL_WORKERS = config["export_workers"]
+    try:
+        db, lock = await _async_open_db(hass, config)
+        stats = IngestStats(hass, db)
+        await stats.async_load()
+        buffer_mb = config["buffer_mb"]
+        sample_buffer = SampleBuffer(buffer_mb * 1024 * 1024) if buffer_mb > 0 else None
+        entity_manager = EntityManager(hass, db, sample_buffer, stats)
+        await entity_manager.async_load()
+        # Registering N entities is a one-off cost, not part of a steady tick
+        await entity_manager.async_sync_entities()
+
+        archive = ArchiveTier(hass, db, stats)
+        # async_start would also schedule tiering runs; only the index is needed
+        await archive._async_load_index()
+        loader = ExportEngineLoader(
+            hass,
+            db,
+            EXPORT_DIR,
+            archive,
+            sample_buffer,
+            PartialResultStore(hass),
+            config["export_memory_mb"],
+        )
+        # The first export's pyarrow import would otherwise count as throughput
+        await loader.async_get()
+        profile_manager = ProfileManager(hass, db)
+        await profile_manager.async_load()
+        manual_export = ManualExportEngine(hass, db, profile_manager, loader)
+        scheduler = Scheduler(hass, db, entity_manager, args.interval)
+
+        end_ts = datetime.utcnow().replace(microsecond=0)
+        start_ts = end_ts - timedelta(days=args.export_days)
+        export_entities = entity_ids(args.export_entities)
+        grid_rows = len(export_entities) * (
+            int((end_ts - start_ts).total_seconds()) // args.resolution + 1
+        )
+
+        loop = asyncio.get_running_loop()
+        ticks: list[dict] = []
+        exports: list[dict] = []
+        exporting = asyncio.Event()
+        exports_done = asyncio.Event()
+        stop = asyncio.Event()
+        lags: list[float] = []
+
+        async def _async_tick(index: int, scheduled: float) -> None:
+            ACTOR.set("tick")
+            started = loop.time()
+            phase = "export" if exporting.is_set() and not exports_done.is_set() else "idle"
+            states.advance()
+            await scheduler._async_tick(datetime.utcnow())
+            ticks.append(
+                {
+                    "index": index,
+                    "phase": phase,
+                    "late": started - scheduled,
+                    "duration": loop.time() - started,
+                }
+            )
+
+        async def _async_export(index: int) -> None:
+            ACTOR.set("export")
+            started = time.perf_counter()
+            await manual_export.async_export_custom(
+                export_entities,
+                start_ts,
+                end_ts,
+                args.resolution,
+                args.formats,
+                label=f"load_{index}",
+            )
+            exports.append({"index": index, "seconds": time.perf_counter() - started})
+
+        async def _async_exports() -> None:
+            exporting.set()
+            started = time.perf_counter()
+            try:
+                await asyncio.gather(*(_async_export(index) for index in range(args.exports)))
+            finally:
+                exports_done.set()
+            exports.append({"index": "all", "seconds": time.perf_counter() - started})
+
+        lock.reset()
+        monitor = asyncio.create_task(_async_lag_monitor(lags, stop))
+        tick_tasks: list[asyncio.Task] = []
+        export_task = None
+        deadline = loop.time() + args.max_seconds
+        scheduled = loop.time()
+        index = 0
+        after_exports = 0
+        # Like async_track_time_interval: a tick fires on time even if the
+        # previous one is still running
+        while loop.time() < deadline:
+            await asyncio.sleep(max(scheduled - loop.time(), 0))
+            tick_tasks.append(asyncio.create_task(_async_tick(index, scheduled)))
+            index += 1
+            if index == args.warmup_ticks:
+                export_task = asyncio.create_task(_async_exports())
+            if exports_done.is_set():
+                after_exports += 1
+                if after_exports > args.warmup_ticks:
+                    break
+            scheduled += args.interval
+        await asyncio.gather(*tick_tasks)
+        timed_out = export_task is None or not export_task.done()
+        if export_task is not None:
+            if timed_out:
+                export_task.cancel()
+                await asyncio.gather(export_task, return_exceptions=True)
+            else:
+                # Raises if an export failed rather than reporting a stall
+                export_task.result()
+        stop.set()
+        await monitor
+
+        output_bytes = sum(
+            entry.stat().st_size
+            for entry in Path(hass.config.path(EXPORT_DIR)).rglob("*")
+            if entry.is_file()
+        )
+        await db.async_close()
+    finally:
+        hass.shutdown()
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+    def _durations(phase: str) -> list[float]:
+        return [tick["duration"] for tick in ticks if tick["phase"] == phase]
+
+    makespan = next((e["seconds"] for e in exports if e["index"] == "all"), None)
+    return {
+        "config": name,
+        "settings": config,
+        "entities": entity_count,
+        "interval": args.interval,
+        "ticks": len(ticks),
+        "stalled_ticks": sum(tick["duration"] > args.interval for tick in ticks),
+        "tick_idle_p50": percentile(_durations("idle"), 50),
+        "tick_idle_p99": percentile(_durations("idle"), 99),
+        "tick_export_p50": percentile(_durations("export"), 50),
+        "tick_export_p95": percentile(_durations("export"), 95),
+        "tick_export_p99": percentile(_durations("export"), 99),
+        "tick_max": max((tick["duration"] for tick in ticks), default=None),
+        "tick_late_max": max((tick["late"] for tick in ticks), default=None),
+        "loop_lag_p99": percentile(lags, 99),
+        "loop_lag_max": max(lags, default=None),
+        "lock_wait_tick_p99": percentile(lock.waits.get("tick", []), 99),
+        "lock_wait_tick_max": max(lock.waits.get("tick", []), default=None),
+        "lock_wait_export_p99": percentile(lock.waits.get("export", []), 99),
+        "lock_held_tick_s": lock.held.get("tick", 0.0),
+        "lock_held_export_s": lock.held.get("export", 0.0),
+        "exports_timed_out": timed_out,
+        "export_seconds": makespan,
+        "export_rows": grid_rows * args.exports,
+        "export_rows_per_s": grid_rows * args.exports / makespan if makespan else None,
+        "export_bytes": output_bytes,
+    }
+
+
+def _ms(value: float | None) -> str:
+    return "-" if value is None else f"{value * 1000:.0f}"
+
+
+def print_report(results: list[dict]) -> None:
+    print(
+        f"{'config':<20}{'entities':>9}{'stalls':>7}"
+        f"{'idle p99':>9}{'exp p50':>8}{'exp p99':>8}{'max':>7}"
+        f"{'lag max':>8}{'lock p99':>9}{'rows/s':>10}  (times in ms)"
+    )
+    for result in results:
+        rate = result["export_rows_per_s"]
+        throughput = "timeout" if result["exports_timed_out"] else f"{rate:,.0f}"
+        print(
+            f"{result['config']:<20}{result['entities']:>9}{result['stalled_ticks']:>7}"
+            f"{_ms(result['tick_idle_p99']):>9}{_ms(result['tick_export_p50']):>8}"
+            f"{_ms(result['tick_export_p99']):>8}{_ms(result['tick_max']):>7}"
+            f"{_ms(result['loop_lag_max']):>8}{_ms(result['lock_wait_tick_p99']):>9}"
+            f"{throughput:>10}"
+        )
+
+    print("\nbreaking point (most entities without a stalled tick):")
+    for name in dict.fromkeys(result["config"] for result in results):
+        healthy = [
+            result["entities"]
+            for result in results
+            if result["config"] == name
+            and not result["stalled_ticks"]
+            and not result["exports_timed_out"]
+        ]
+        print(f"  {name:<20}{max(healthy) if healthy else 'below the smallest count'}")
+
+
+def parse_config(value: str) -> tuple[str, dict]:
+    """Parse ``name:key=value,key=value`` into a configuration."""
+    name, _, settings = value.partition(":")
+    config = {}
+    for pair in filter(None, settings.split(",")):
+        key, _, raw = pair.partition("=")
+        if key not in CONFIG_DEFAULTS:
+            raise argparse.ArgumentTypeError(
+                f"unknown setting {key!r}, expected one of {', '.join(CONFIG_DEFAULTS)}"
+            )
+        default = CONFIG_DEFAULTS[key]
+        config[key] = type(default)(raw)
+    return name, config
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entities", default="100,500,2000", help="comma-separated counts")
+    parser.add_argument("--interval", type=int, default=DEFAULT_GLOBAL_INTERVAL)
+    parser.add_argument(
+        "--config",
+        type=parse_config,
+        action="append",
+        help="name:key=value,... over "
+        + ", ".join(CONFIG_DEFAULTS)
+        + "; repeatable (default: a built-in comparison)",
+    )
+    parser.add_argument("--exports", type=int, default=2, help="concurrent exports")
+    parser.add_argument("--export-entities", type=int, default=5)
+    parser.add_argument("--export-days", type=int, default=365)
+    parser.add_argument("--resolution", type=int, default=300)
+    parser.add_argument("--formats", default="parquet")
+    parser.add_argument("--history-days", type=int, default=365)
+    parser.add_argument("--history-step", type=int, default=60, help="seconds between seeded samples")
+    parser.add_argument("--archive", action="store_true", help="move closed months to Parquet first")
+    parser.add_argument("--state-share", type=float, default=0.1, help="share of on/off entities")
+    parser.add_argument("--warmup-ticks", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    counts = sorted({int(count) for count in args.entities.split(",")})
+    args.formats = args.formats.split(",")
+    unknown = [fmt for fmt in args.formats if fmt not in SUPPORTED_EXPORT_FORMATS]
+    if unknown:
+        parser.error(f"unsupported formats: {', '.join(unknown)}")
+    if counts[0] < args.export_entities:
+        parser.error("every entity count must include the exported entities")
+    configs = dict(args.config or DEFAULT_CONFIGS.items())
+
+    _patch_registries()
+    template_dir = tempfile.mkdtemp(prefix="history_archiver_seed_")
+    results = []
+    try:
+        print(
+            f"seeding {args.export_entities} entities with {args.history_days} days "
+            f"at {args.history_step}s"
+        )
+        asyncio.run(async_seed(template_dir, args))
+        for name, overrides in configs.items():
+            config = {**CONFIG_DEFAULTS, **overrides}
+            for count in counts:
+                print(f"running {name} with {count} entities", flush=True)
+                results.append(asyncio.run(async_run(template_dir, name, config, count, args)))
+    finally:
+        shutil.rmtree(template_dir, ignore_errors=True)
+
+    print()
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()